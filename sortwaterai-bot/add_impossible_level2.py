@@ -43,10 +43,18 @@ def main():
             print("Уровень с id=2 не найден.")
             return
 
+        # BYTEA‑копии (ai_functions/level_codec.py) после смены уровня
+        # устарели — обнуляем, migrate пересчитает
+        cur.execute(
+            "SELECT count(*) AS n FROM information_schema.columns "
+            "WHERE table_name = 'Levels' AND column_name IN ('state_bin', 'solution_bin')"
+        )
+        reset_blob = ', state_bin = NULL, solution_bin = NULL' if cur.fetchone()["n"] == 2 else ''
+
         # Выполняем UPDATE
         cur.execute(
             'UPDATE "Levels" '
-            'SET level_data = %s, "updatedAt" = %s '
+            'SET level_data = %s, "updatedAt" = %s' + reset_blob + ' '
             'WHERE id = %s',
             (level_data_json, datetime.utcnow(), 2)
         )
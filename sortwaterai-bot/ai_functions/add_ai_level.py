@@ -5,9 +5,10 @@ AI‑INGEST — сервис добавления сгенерированных
 import os
 import sys
 import json
-import random
-import hashlib
+import functools
 import psycopg2
+from psycopg2.extras import execute_values
+from collections import Counter, deque
 from datetime import datetime
 from dotenv import load_dotenv
 from typing import List, Dict
@@ -17,7 +18,8 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 if SCRIPT_DIR not in sys.path:
     sys.path.insert(0, SCRIPT_DIR)
 
-from get_generated_levels import get_generated_levels
+from ai_functions import metrics, level_reserve, trajectories, level_codec
+from ai_functions.trajectories import fingerprint
 
 # ------------------------- settings (.env) ---------------------------------
 load_dotenv()
@@ -30,55 +32,136 @@ DB_CFG = {
     "port":     int(os.getenv("POSTGRES_PORT", 5432)),
 }
 
-TARGET_DISTRIB   = json.loads(os.getenv("TARGET_DISTRIB"))
-STEPS_THRESHOLDS = json.loads(os.getenv("STEPS_THRESHOLDS"))
 WINDOW_LEVELS    = int(os.getenv("WINDOW_LEVELS", 10))
 MAX_ATTEMPTS     = int(os.getenv("MAX_GENERATE_ATTEMPTS", 5))
 
+# TARGET_DISTRIB / STEPS_THRESHOLDS читаются при первом использовании,
+# чтобы импорт модуля (например, из api.py) не падал без них
+def _json_setting(name: str):
+    raw = os.getenv(name)
+    if not raw:
+        raise RuntimeError(f"Не задана переменная окружения {name}")
+    return json.loads(raw)
+
+@functools.lru_cache(maxsize=None)
+def target_distrib() -> Dict[str, float]:
+    return _json_setting("TARGET_DISTRIB")
+
+@functools.lru_cache(maxsize=None)
+def steps_thresholds() -> Dict[str, List[int]]:
+    return _json_setting("STEPS_THRESHOLDS")
+
 # ------------------------- helpers ----------------------------------------
 def classify(ai_steps: int) -> str:
-    for diff, (lo, hi) in STEPS_THRESHOLDS.items():
+    for diff, (lo, hi) in steps_thresholds().items():
         if lo <= ai_steps <= hi:
             return diff
     return "unknown"
 
-def fetch_stats(cur) -> Dict[str, int]:
+def fetch_window(cur) -> List[str]:
+    """
+    Сложности последних WINDOW_LEVELS уровней, от старых к новым.
+    """
     cur.execute(f"""
-        SELECT difficulty, COUNT(*) FROM (
-          SELECT difficulty
-          FROM "Levels"
-          ORDER BY id DESC
-          LIMIT {WINDOW_LEVELS}
-        ) sub
-        GROUP BY difficulty
+        SELECT difficulty
+        FROM "Levels"
+        ORDER BY id DESC
+        LIMIT {WINDOW_LEVELS}
     """)
-    return {d: n for d, n in cur.fetchall()}
+    return [d for (d,) in cur.fetchall()][::-1]
 
 def l1_distance(stats: Dict[str, int]) -> float:
     total = sum(stats.values()) or 1
     return sum(
-        abs(stats.get(k, 0)/total - TARGET_DISTRIB.get(k, 0))
-        for k in TARGET_DISTRIB
+        abs(stats.get(k, 0)/total - target_distrib().get(k, 0))
+        for k in target_distrib()
     )
 
-def fingerprint(state) -> str:
-    norm = json.dumps(state, separators=(",", ":"), sort_keys=True)
-    return hashlib.sha1(norm.encode()).hexdigest()
+def plan_quotas(window: List[str], add_count: int) -> Dict[str, int]:
+    """
+    Раскладывает add_count уровней по сложностям заранее: по одному
+    добавляем в ту корзину, которая сильнее всего приближает окно
+    последних WINDOW_LEVELS уровней к TARGET_DISTRIB (старые уровни
+    при этом выпадают из окна, как и при реальной вставке).
+    """
+    win = deque(window, maxlen=WINDOW_LEVELS)
+    quotas = {d: 0 for d in target_distrib()}
+    for _ in range(add_count):
+        best, best_dist = None, float("inf")
+        for d in target_distrib():
+            trial = deque(win, maxlen=WINDOW_LEVELS)
+            trial.append(d)
+            dist = l1_distance(Counter(trial))
+            if dist < best_dist:
+                best, best_dist = d, dist
+        win.append(best)
+        quotas[best] += 1
+    return {d: q for d, q in quotas.items() if q}
 
 def existing_hashes(cur) -> set:
-    cur.execute('SELECT level_data FROM "Levels"')
+    # после миграции (level_codec.py) JSON читаем только у строк без state_bin
+    if level_codec.has_blob_columns(cur):
+        cur.execute('SELECT state_bin, CASE WHEN state_bin IS NULL THEN level_data END FROM "Levels"')
+    else:
+        cur.execute('SELECT NULL, level_data FROM "Levels"')
     hashes = set()
-    for (raw,) in cur.fetchall():
+    for blob, raw in cur.fetchall():
         try:
-            st = json.loads(raw).get("state")
+            st = level_codec.state_from_row(blob, raw)
             if st is None: continue
             hashes.add(fingerprint(st))
         except Exception:
             continue
     return hashes
 
+def insert_levels(cur, model_name: str, levels: List[Dict]) -> List[int]:
+    """
+    Один INSERT … VALUES на весь список уровней; заодно индексирует
+    состояния вдоль решений (trajectories.py). Возвращает id уровней.
+    Если миграция level_codec.py прошла, пишет и BYTEA‑копии.
+    """
+    now = datetime.utcnow()
+    rows = [
+        (
+            json.dumps({"state": lvl["state"]}),
+            model_name,                  # <-- сюда записываем формат
+            lvl["difficulty"],
+            lvl["ai_steps"],
+            json.dumps([[int(src), int(dst)] for src, dst in lvl["solution"]])
+            if lvl.get("solution") is not None else None,
+            now,
+            now,
+        )
+        for lvl in levels
+    ]
+    columns = 'level_data, level_format, difficulty, ai_steps, solution, "createdAt", "updatedAt"'
+    if level_codec.has_blob_columns(cur):
+        columns += ", state_bin, solution_bin"
+        rows = [
+            row + (level_codec.encode_state(lvl["state"]),
+                   level_codec.encode_solution(lvl.get("solution")))
+            for row, lvl in zip(rows, levels)
+        ]
+    ids = [r[0] for r in execute_values(
+        cur,
+        f'INSERT INTO "Levels" ({columns}) VALUES %s RETURNING id',
+        rows,
+        fetch=True,
+    )]
+    trajectories.index_levels(cur, (
+        (level_id, lvl["state"], lvl.get("solution")) for level_id, lvl in zip(ids, levels)
+    ))
+    return ids
+
 # ------------------------- main routine -----------------------------------
 def run_ingest(model_name: str, add_count: int):
+    with metrics.INGEST_SECONDS.time(model=model_name):
+        _run_ingest(model_name, add_count)
+
+def _run_ingest(model_name: str, add_count: int):
+    # генератор тянет за собой torch — только когда действительно генерируем
+    from get_generated_levels import get_generated_levels, get_levels_by_quota
+
     conn = psycopg2.connect(**DB_CFG)
     cur  = conn.cursor()
 
@@ -89,83 +172,72 @@ def run_ingest(model_name: str, add_count: int):
     if simple_mode:
         print(f"⚠️  Only {total} levels (<{WINDOW_LEVELS}), random mode.")
 
-    db_hashes     = existing_hashes(cur)
-    in_run_hashes = set()
-    pool: List[Dict] = []
+    trajectories.ensure_table(cur)
+    conn.commit()
+
+    db_hashes = existing_hashes(cur)
+    quotas = None if simple_mode else plan_quotas(fetch_window(cur), add_count)
+    if quotas:
+        print(f"🎯 Quotas: {quotas}")
+    added = {d: 0 for d in (quotas or {})}
     attempts = 0
     inserted = 0
 
-    while inserted < add_count and attempts < MAX_ATTEMPTS:
-        if not pool:
-            batch = add_count * 3
-            pool = get_generated_levels(model_name, batch)
-            random.shuffle(pool)
-            for lvl in pool:
-                lvl["difficulty"] = classify(lvl["ai_steps"])
-            attempts += 1
+    def need() -> Dict[str, int]:
+        return {d: q - added[d] for d, q in quotas.items() if added[d] < q}
 
-        if not pool:
-            break
+    def accept(levels: List[Dict], source: str):
+        nonlocal inserted
+        batch = []
+        for lvl in levels:
+            if inserted + len(batch) >= add_count:
+                break
+            fph = fingerprint(lvl["state"])
+            if fph in db_hashes:
+                continue
+            if quotas is not None:
+                if added[lvl["difficulty"]] >= quotas[lvl["difficulty"]]:
+                    continue
+                added[lvl["difficulty"]] += 1
+            db_hashes.add(fph)
+            batch.append(lvl)
+        if not batch:
+            return
+        insert_levels(cur, model_name, batch)
+        conn.commit()
+        if source == "reserve":
+            # из запаса убираем только то, что уже закоммичено
+            level_reserve.discard(model_name, {fingerprint(lvl["state"]) for lvl in batch})
+        inserted += len(batch)
+        metrics.INGEST_LEVELS.inc(len(batch), model=model_name, source=source)
+        for i, lvl in enumerate(batch, start=inserted - len(batch) + 1):
+            tag = "[random]" if simple_mode else f"[{source}]"
+            print(f"#{i:>3}: {lvl['difficulty']:6} steps={lvl['ai_steps']:>3} {tag}")
 
-        # выбираем лучший по Δ или просто первый уникальный
-        best_idx = None
-        best_delta = float("inf")
+    # 1) готовые уровни из запаса на диске (см. level_reserve.py): они арендованы
+    #    нами, закоммиченные accept убирает из запаса, остальные возвращаем
+    reserved = level_reserve.lease(model_name, classify,
+                                   quotas=quotas,
+                                   count=None if quotas else add_count,
+                                   exclude=db_hashes)
+    try:
+        accept(reserved, "reserve")
+    finally:
+        if reserved:
+            level_reserve.release(model_name, {lvl["fingerprint"] for lvl in reserved})
 
-        if simple_mode:
-            for i, lvl in enumerate(pool):
-                fph = fingerprint(lvl["state"])
-                if fph not in db_hashes and fph not in in_run_hashes:
-                    best_idx = i
-                    break
+    # 2) недостающее — генерируем сейчас
+    while inserted < add_count and attempts < MAX_ATTEMPTS:
+        attempts += 1
+        if quotas is None:
+            pool = get_generated_levels(model_name, add_count - inserted)
+            for lvl in pool:
+                lvl["difficulty"] = classify(lvl["ai_steps"])
         else:
-            stats_now = fetch_stats(cur)
-            dist_now = l1_distance(stats_now)
-            for i, lvl in enumerate(pool):
-                fph = fingerprint(lvl["state"])
-                if fph in db_hashes or fph in in_run_hashes:
-                    continue
-                tmp = stats_now.copy()
-                tmp[lvl["difficulty"]] = tmp.get(lvl["difficulty"],0) + 1
-                delta = l1_distance(tmp) - dist_now
-                if delta < best_delta:
-                    best_delta, best_idx = delta, i
-                    if delta < 0:
-                        break
-
-        if best_idx is None:
-            pool.clear()
-            continue
-
-        lvl = pool.pop(best_idx)
-        fph = fingerprint(lvl["state"])
-
-        # вытаскиваем и нормализуем данные
-        state = lvl["state"]
-        solution = lvl.get("solution")
-        if solution is not None:
-            solution = [[int(src), int(dst)] for src, dst in solution]
-
-        # Теперь INSERT с новым полем level_format
-        cur.execute(
-            """INSERT INTO "Levels"
-               (level_data, level_format, difficulty, ai_steps, solution, "createdAt", "updatedAt")
-               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-            (
-                json.dumps({"state": state}),
-                model_name,                  # <-- сюда записываем формат
-                lvl["difficulty"],
-                lvl["ai_steps"],
-                json.dumps(solution) if solution is not None else None,
-                datetime.utcnow(),
-                datetime.utcnow(),
-            ),
-        )
-        conn.commit()
-        inserted += 1
-        db_hashes.add(fph)
-        in_run_hashes.add(fph)
-        tag = "[random]" if simple_mode else f"Δ={best_delta:+.4f}"
-        print(f"#{inserted:>3}: {lvl['difficulty']:6} steps={lvl['ai_steps']:>3} {tag}")
+            pool = get_levels_by_quota(model_name, need(), classify,
+                                       is_known=lambda st: fingerprint(st) in db_hashes)
+        metrics.INGEST_CANDIDATES.inc(len(pool), model=model_name)
+        accept(pool, "live")
 
     cur.close()
     conn.close()
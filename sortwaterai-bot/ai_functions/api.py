@@ -1,11 +1,16 @@
 # sortwaterai-bot/ai_functions/api.py
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any
 
-from ai_functions.solver import solve_level
-from ai_functions.add_ai_level import run_ingest
+# solver и add_ai_level (torch, gymnasium) импортируются при первом запросе
+# к своему эндпоинту: сервис стартует за доли секунды, модели грузятся
+# в фоне (warmup.py), а /health отвечает сразу
+from ai_functions import metrics, level_reserve, scheduler, warmup
+from ai_functions.singleflight import SingleFlight
+from ai_functions.hashing import state_hash
 
 
 app = FastAPI(
@@ -14,6 +19,34 @@ app = FastAPI(
     description="API для запуска генерации новых уровней и решения уровней через DQN‑агента"
 )
 
+_producer = None
+
+# одинаковые одновременные /solve_level считаются один раз
+_solves = SingleFlight()
+
+@app.on_event("startup")
+def start_warmup():
+    """
+    AI_WARMUP=1 (по умолчанию) — грузим модели в фоне, пока сервис уже отвечает.
+    """
+    if warmup.AI_WARMUP:
+        warmup.start()
+
+@app.on_event("startup")
+def start_reserve_producer():
+    """
+    LEVEL_RESERVE=1 — в простое держим запас готовых уровней (level_reserve.py).
+    """
+    global _producer
+    if level_reserve.LEVEL_RESERVE:
+        _producer = level_reserve.ReserveProducer()
+        _producer.start()
+
+@app.on_event("shutdown")
+def stop_reserve_producer():
+    if _producer is not None:
+        _producer.stop()
+
 class AddLevelsRequest(BaseModel):
     model_name: str
     count: int
@@ -28,23 +61,60 @@ def add_levels(req: AddLevelsRequest):
     """
     Запуск скрипта добавления новых уровней из указанной модели.
     """
-    try:
-        run_ingest(req.model_name, req.count)
-        return {
-            "status": "success",
-            "model_name": req.model_name,
-            "requested_count": req.count
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    with metrics.track_request("add_levels", req.model_name), scheduler.slot(scheduler.BULK):
+        try:
+            from ai_functions.add_ai_level import run_ingest
+            run_ingest(req.model_name, req.count)
+            return {
+                "status": "success",
+                "model_name": req.model_name,
+                "requested_count": req.count
+            }
+        except Exception as e:
+            metrics.ERRORS.inc(where="add_levels", model=req.model_name)
+            raise HTTPException(status_code=500, detail=str(e))
+
+def _solve_interactive(req: SolveRequest) -> Dict[str, Any]:
+    # слот занимает только реально считающий запрос, а не ждущие его дубли
+    from ai_functions.solver import solve_level
+    with scheduler.slot(scheduler.INTERACTIVE):
+        return solve_level(req.level_id, req.state, req.user_moves)
 
 @app.post("/solve_level", response_model=Dict[str, Any])
 def solve_level_endpoint(req: SolveRequest):
     """
     Решение уровня: возвращает {"solvable": bool, "ai_steps": int, "solution": List[List[int]]}
     """
-    try:
-        result = solve_level(req.level_id, req.state, req.user_moves)
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    with metrics.track_request("solve_level"):
+        try:
+            # от user_moves ответ зависит только через «ходил ли игрок»
+            key = (req.level_id, state_hash(req.state), req.user_moves == 0)
+            result, shared = _solves.do(key, lambda: _solve_interactive(req))
+            if shared:
+                metrics.SOLVE_SHARED.inc()
+            return result
+        except Exception as e:
+            metrics.ERRORS.inc(where="solve_level_endpoint", model="-")
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/health")
+def health():
+    """
+    Liveness: процесс жив и принимает запросы (модели могут ещё грузиться).
+    """
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    """
+    Readiness: 200, когда модели загружены и прогреты, иначе 503 с ходом прогрева.
+    """
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["done"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """
+    Метрики сервиса в формате Prometheus.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
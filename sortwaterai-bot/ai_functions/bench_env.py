@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/bench_env.py
+"""
+Микробенчмарки примитивов WaterSortEnvFixed по конфигурациям N_K_L.
+
+Кейсы (время одного вызова, мкс):
+  step             – env.step на валидном ходе (вместе с восстановлением состояния),
+  valid_actions    – fast_get_valid_actions,
+  pour             – _pour на валидном ходе,
+  reset            – reset со случайной раскладкой,
+  reset_rejection  – одна попытка цикла отбраковки в reset
+                     (1 цвет на N-K пробирок: каждая раскладка «уже решена»),
+  recent_states    – tuple(obs.flatten()) + проверка/добавление в recent_states.
+
+Базовая линия лежит в bench_baselines/env_primitives.json;
+без --save печатается отношение к ней, --fail-over X завершает с кодом 1,
+если какой-то кейс медленнее базы больше чем в X раз.
+
+Пример:
+  python -m ai_functions.bench_env                 # сравнить с базой
+  python -m ai_functions.bench_env --save          # обновить базу
+  python -m ai_functions.bench_env 7_2_5 --fail-over 1.3
+"""
+import io
+import sys
+import itertools
+import json
+import timeit
+import random
+import argparse
+import platform
+import contextlib
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from ai_functions.water_sort_env import WaterSortEnvFixed
+
+BASELINE_PATH = Path(__file__).parent / "bench_baselines" / "env_primitives.json"
+
+CONFIGS = [
+    "3_1_4", "3_1_5", "4_1_4", "4_1_5", "4_2_4", "4_2_5", "5_1_4",
+    "5_1_5", "5_2_4", "5_2_5", "6_2_4", "6_2_5", "7_2_4", "7_2_5",
+]
+
+
+def make_env(N: int, K: int, L: int) -> WaterSortEnvFixed:
+    return WaterSortEnvFixed(num_tubes=N, max_layers=L, num_empty=K, num_colors=N-K, max_steps=100)
+
+
+def sample_moves(env: WaterSortEnvFixed, count: int, seed: int) -> List[Tuple[np.ndarray, Tuple[int, int]]]:
+    """
+    Пары (состояние, валидный ход) из случайных прогонов — общий вход для step/pour.
+    """
+    rng = random.Random(seed)
+    N = env.num_tubes
+    moves = []
+    episode = 0
+    obs, _ = env.reset(seed=seed)
+    while len(moves) < count:
+        valid = env.fast_get_valid_actions(obs.flatten(), ignore_prev=True)
+        if not valid or env._is_solved():
+            episode += 1
+            obs, _ = env.reset(seed=seed + episode)
+            continue
+        act = rng.choice(valid)
+        moves.append((env.state.copy(), (act // N, act % N)))
+        env.prev_action = None
+        obs, _, done, truncated, _ = env.step((act // N, act % N))
+    return moves
+
+
+def per_call_us(fn: Callable[[], None], calls: int, repeat: int) -> float:
+    """
+    Лучшее из repeat прогонов по calls вызовов, мкс на вызов.
+    """
+    fn()                                              # прогрев
+    return min(timeit.repeat(fn, number=calls, repeat=repeat)) / calls * 1e6
+
+
+def bench_config(cfg: str, calls: int, repeat: int, seed: int) -> Dict[str, float]:
+    N, K, L = map(int, cfg.split("_"))
+    env = make_env(N, K, L)
+    moves = sample_moves(env, 256, seed)
+    flat_states = [s.flatten() for s, _ in moves]
+    results = {}
+
+    it = itertools.count()
+
+    def step():
+        s, a = moves[next(it) % len(moves)]
+        env.state = s.copy()
+        env.prev_action = None
+        env.step(a)
+    results["step"] = per_call_us(step, calls, repeat)
+
+    def valid_actions():
+        env.fast_get_valid_actions(flat_states[next(it) % len(flat_states)])
+    results["valid_actions"] = per_call_us(valid_actions, calls, repeat)
+
+    def pour():
+        s, (fr, to) = moves[next(it) % len(moves)]
+        env.state = s.copy()
+        env._pour(fr, to)
+    results["pour"] = per_call_us(pour, calls, repeat)
+
+    def reset():
+        env.reset()
+    results["reset"] = per_call_us(reset, calls, repeat)
+
+    # один цвет → любая раскладка решена, reset делает все max_tries=100 попыток
+    solved_env = WaterSortEnvFixed(num_tubes=N, max_layers=L, num_empty=K, num_colors=1, max_steps=100)
+
+    def reset_rejection():
+        with contextlib.redirect_stdout(io.StringIO()):
+            solved_env.reset()
+    results["reset_rejection"] = per_call_us(reset_rejection, max(1, calls // 100), repeat) / 100
+
+    def recent_states():
+        # ровно то, что делает step после хода
+        obs, _ = moves[next(it) % len(moves)]
+        obs_tuple = tuple(obs.flatten())
+        _ = obs_tuple in env.recent_states
+        env.recent_states.append(obs_tuple)
+    # заполненный deque, как в середине эпизода
+    env.recent_states.extend(tuple(s) for s in flat_states[:env.recent_states.maxlen])
+    results["recent_states"] = per_call_us(recent_states, calls, repeat)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки примитивов окружения")
+    parser.add_argument("configs", nargs="*", help="N_K_L (по умолчанию все)")
+    parser.add_argument("--calls", type=int, default=2000, help="вызовов в одном замере")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", action="store_true", help="записать результат как новую базу")
+    parser.add_argument("--fail-over", type=float, help="порог регрессии (×база) для кода выхода 1")
+    args = parser.parse_args()
+
+    configs = args.configs or CONFIGS
+    baseline = {}
+    if BASELINE_PATH.exists():
+        with open(BASELINE_PATH, "r") as fp:
+            baseline = json.load(fp).get("results", {})
+
+    results = {}
+    regressions = []
+    for cfg in configs:
+        res = bench_config(cfg, args.calls, args.repeat, args.seed)
+        results[cfg] = {k: round(v, 3) for k, v in res.items()}
+        parts = []
+        for case, us in res.items():
+            base = baseline.get(cfg, {}).get(case)
+            if base:
+                ratio = us / base
+                parts.append(f"{case} {us:7.2f}us (×{ratio:.2f})")
+                if args.fail_over and ratio > args.fail_over:
+                    regressions.append(f"{cfg}/{case} ×{ratio:.2f}")
+            else:
+                parts.append(f"{case} {us:7.2f}us")
+        print(f"{cfg:>6}: " + "  ".join(parts))
+
+    if args.save:
+        merged = {**baseline, **results}
+        BASELINE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(BASELINE_PATH, "w") as fp:
+            json.dump({
+                "meta": {
+                    "python":  platform.python_version(),
+                    "numpy":   np.__version__,
+                    "machine": platform.machine(),
+                    "calls":   args.calls,
+                    "repeat":  args.repeat,
+                },
+                "results": merged,
+            }, fp, indent=2, sort_keys=True)
+        print(f"✅  База обновлена: {BASELINE_PATH}")
+
+    if regressions:
+        print("🚫 Регрессии: " + ", ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
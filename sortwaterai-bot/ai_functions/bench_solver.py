@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/bench_solver.py
+"""
+Воспроизводимый бенчмарк солвера по всем конфигурациям N_K_L.
+
+Для каждой модели на фиксированном наборе уровней (level_sets.seeded_levels)
+меряем:
+  - env_steps_per_s           – скорость env.step на случайных валидных ходах,
+  - move_p50/p95/p99_us       – задержка одного хода агента,
+  - solve_rate                – доля решённых агентом уровней,
+  - solvable_rate             – доля уровней, решаемых вообще (BFS),
+  - agent_steps / opt_steps   – средние длины решений на уровнях, решённых обоими,
+  - step_gap                  – agent_steps - opt_steps,
+  - load_ms, model_kb, rss_mb – загрузка и память.
+
+Результаты пишутся в <out>/solver_bench.csv и <out>/solver_bench.json;
+--compare <старый json> печатает изменения относительно прошлого прогона.
+
+Пример:
+  python -m ai_functions.bench_solver --levels 200 --out bench_results
+  python -m ai_functions.bench_solver 7_2_4 --runtime onnx --compare bench_results/solver_bench.json
+"""
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import subprocess
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import torch
+
+from ai_functions.solver       import create_env, load_agent
+from ai_functions.level_sets   import parse_model_name, seeded_levels, replay_levels
+from ai_functions.exact_search import bfs_solve
+
+MODELS_DIR = Path(__file__).parent / "ai_models"
+
+# метрики, по которым --compare считает изменения (True — чем больше, тем лучше)
+KEY_METRICS = {
+    "env_steps_per_s": True,
+    "move_p50_us":     False,
+    "move_p95_us":     False,
+    "move_p99_us":     False,
+    "solve_rate":      True,
+    "step_gap":        False,
+    "rss_mb":          False,
+}
+
+
+class TimedAgent:
+    """
+    Прокси над агентом, который запоминает длительность инференса на каждом ходу.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.epsilon = 0
+        self.durations: List[float] = []
+
+    def predict_qvalues(self, obs):
+        t0 = time.perf_counter()
+        qvals = self.agent.predict_qvalues(obs)
+        self.durations.append(time.perf_counter() - t0)
+        return qvals
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as fp:
+            pages = int(fp.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def model_kb(agent) -> float:
+    if not isinstance(agent, torch.nn.Module):
+        return float("nan")
+    return sum(t.numel() * t.element_size() for t in agent.q_net.state_dict().values()
+               if isinstance(t, torch.Tensor)) / 1024
+
+
+def env_steps_per_s(model_name: str, n_steps: int, seed: int) -> float:
+    N, K, L = parse_model_name(model_name)
+    env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K)
+    rng = random.Random(seed)
+    obs, _ = env.reset(seed=seed)
+    episode = 0
+    t0 = time.perf_counter()
+    for _ in range(n_steps):
+        valid = env.fast_get_valid_actions(obs)
+        act = rng.choice(valid) if valid else 0
+        obs, _, done, truncated, _ = env.step(act)
+        if done or truncated:
+            episode += 1
+            obs, _ = env.reset(seed=seed + episode)
+    return n_steps / (time.perf_counter() - t0)
+
+
+def bench_model(model_name: str, n_levels: int, seed: int, env_steps: int,
+                bfs_expansions: int, runtime: str, quantize: bool) -> Dict:
+    N, K, L = parse_model_name(model_name)
+    levels = seeded_levels(model_name, n_levels, seed)
+
+    env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K)
+    t0 = time.perf_counter()
+    agent = load_agent(model_name, env, N, runtime=runtime, quantize=quantize)
+    load_ms = (time.perf_counter() - t0) * 1e3
+
+    timed = TimedAgent(agent)
+    res = replay_levels(timed, model_name, levels)
+    moves_us = np.array(timed.durations) * 1e6
+
+    optimal = [bfs_solve(state, bfs_expansions) for state in levels]
+    opt_steps = [len(p) if p is not None else None for p in optimal]
+    both = [(a, o) for a, o in zip(res["steps"], opt_steps) if a is not None and o is not None]
+
+    return {
+        "cfg":             model_name,
+        "levels":          n_levels,
+        "env_steps_per_s": env_steps_per_s(model_name, env_steps, seed),
+        "move_p50_us":     float(np.percentile(moves_us, 50)) if len(moves_us) else float("nan"),
+        "move_p95_us":     float(np.percentile(moves_us, 95)) if len(moves_us) else float("nan"),
+        "move_p99_us":     float(np.percentile(moves_us, 99)) if len(moves_us) else float("nan"),
+        "solve_rate":      res["solve_rate"],
+        "solvable_rate":   sum(o is not None for o in opt_steps) / max(1, n_levels),
+        "agent_steps":     float(np.mean([a for a, _ in both])) if both else float("nan"),
+        "opt_steps":       float(np.mean([o for _, o in both])) if both else float("nan"),
+        "step_gap":        float(np.mean([a - o for a, o in both])) if both else float("nan"),
+        "load_ms":         load_ms,
+        "model_kb":        model_kb(agent),
+        "rss_mb":          rss_mb(),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_baseline(path: str) -> Dict[str, Dict]:
+    with open(path, "r") as fp:
+        return {r["cfg"]: r for r in json.load(fp)["results"]}
+
+
+def compare(rows: List[Dict], baseline: Dict[str, Dict]):
+    for row in rows:
+        old = baseline.get(row["cfg"])
+        if old is None:
+            continue
+        parts = []
+        for key, higher_better in KEY_METRICS.items():
+            a, b = old.get(key), row.get(key)
+            if a is None or b is None or not np.isfinite(a) or not np.isfinite(b) or a == 0:
+                continue
+            change = (b - a) / abs(a)
+            worse = change < 0 if higher_better else change > 0
+            mark = "⚠️ " if worse and abs(change) > 0.05 else ""
+            parts.append(f"{mark}{key} {change:+.1%}")
+        print(f'{row["cfg"]:>6}: ' + ", ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк солвера по конфигурациям N_K_L")
+    parser.add_argument("models", nargs="*", help="N_K_L (по умолчанию все ai_models/*.pth)")
+    parser.add_argument("--levels", type=int, default=200, help="уровней на конфигурацию")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--env-steps", type=int, default=5000, help="шагов для замера env.step")
+    parser.add_argument("--bfs-expansions", type=int, default=200_000)
+    parser.add_argument("--runtime", default="eager", choices=["eager", "torchscript", "onnx"])
+    parser.add_argument("--quantize", action="store_true", help="int8, если модель одобрена quantize.py")
+    parser.add_argument("--threads", type=int, default=1, help="torch.set_num_threads")
+    parser.add_argument("--out", default="bench_results", help="каталог для CSV/JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    # читаем заранее: --compare может указывать на файл, который сейчас перезапишем
+    baseline = load_baseline(args.compare) if args.compare else None
+    models = args.models or sorted(p.stem for p in MODELS_DIR.glob("*.pth"))
+
+    rows = []
+    for name in models:
+        if not (MODELS_DIR / f"{name}.pth").exists():
+            print(f"Модель не найдена: {name}", file=sys.stderr)
+            continue
+        row = bench_model(name, args.levels, args.seed, args.env_steps,
+                          args.bfs_expansions, args.runtime, args.quantize)
+        rows.append(row)
+        print(f'{name:>6}: env {row["env_steps_per_s"]:8.0f} st/s  '
+              f'move p50/p95/p99 {row["move_p50_us"]:.0f}/{row["move_p95_us"]:.0f}/{row["move_p99_us"]:.0f}us  '
+              f'solve {row["solve_rate"]:.3f}  gap {row["step_gap"]:+.2f}')
+
+    if not rows:
+        sys.exit(1)
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / "solver_bench.csv", "w", newline="") as fp:
+        writer = csv.DictWriter(fp, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    meta = {
+        "commit":   git_commit(),
+        "runtime":  args.runtime,
+        "quantize": args.quantize,
+        "threads":  args.threads,
+        "seed":     args.seed,
+        "levels":   args.levels,
+        "torch":    torch.__version__,
+        "python":   platform.python_version(),
+        "machine":  platform.machine(),
+    }
+    with open(out_dir / "solver_bench.json", "w") as fp:
+        json.dump({"meta": meta, "results": rows}, fp, indent=2)
+    print(f"✅  {out_dir / 'solver_bench.csv'}, {out_dir / 'solver_bench.json'}")
+
+    if baseline is not None:
+        print(f"\nСравнение с {args.compare}:")
+        compare(rows, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/difficulty.py
+"""
+Дешёвая оценка сложности уровня линейной моделью из experiments
+(Masked_dqn.ipynb, «Линейная регрессия без свободного члена»):
+
+    log(T_min + 1) ≈ δ · (α·M + β·(1 − S) + γ·G/N)
+
+  M   – доля непустых пробирок, в которых больше одного цвета,
+  S   – доля пустых пробирок,
+  G/N – число валидных ходов на одну пробирку.
+
+Коэффициенты лежат в ai_models/linear_weights.json (копия
+experiments/difficulty_classifier/linear_weights.json), путь можно
+переопределить через DIFFICULTY_WEIGHTS.
+
+Оценка нужна, чтобы не тратить прогон агента на кандидата,
+чья корзина сложности уже заполнена.
+"""
+import os
+import json
+import math
+from pathlib import Path
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+WEIGHTS_PATH = Path(os.getenv(
+    "DIFFICULTY_WEIGHTS", Path(__file__).parent / "ai_models" / "linear_weights.json"
+))
+
+_weights: Dict[str, float] = {}
+
+
+def load_weights() -> Dict[str, float]:
+    if not _weights:
+        with open(WEIGHTS_PATH, "r") as fp:
+            _weights.update(json.load(fp))
+    return _weights
+
+
+def features(state: Sequence[Sequence[int]], env) -> Tuple[float, float, float]:
+    """
+    (M, S, G/N) для стартового состояния; env — любое окружение
+    с fast_get_valid_actions (обёрнутое или нет).
+    """
+    arr = np.asarray(state, dtype=int)
+    N = arr.shape[0]
+    empty = (arr == -1).all(axis=1)
+    filled = arr[~empty]
+    mixed = sum(len(set(t[t != -1].tolist())) > 1 for t in filled)
+    M = mixed / max(1, len(filled))
+    S = empty.sum() / N
+    G = len(env.fast_get_valid_actions(arr.flatten(), ignore_prev=True))
+    return M, S, G / N
+
+
+def estimate_log_steps(state: Sequence[Sequence[int]], env) -> float:
+    w = load_weights()
+    M, S, Gn = features(state, env)
+    return w.get("delta", 1.0) * (w["alpha"] * M + w["beta"] * (1 - S) + w["gamma"] * Gn)
+
+
+def estimate_steps(state: Sequence[Sequence[int]], env) -> float:
+    """
+    Оценка длины кратчайшего решения в шагах.
+    """
+    return math.expm1(estimate_log_steps(state, env))
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/distill.py
+"""
+Дистилляция Q‑сетей в маленькие сети‑ученики.
+
+Учитель — боевая модель ai_models/<N_K_L>.pth ([(N*(N-1))*25, (N*(N-1))*10]),
+ученик — MaskedDQNAgent того же входа/выхода, но со слоями --arch
+(по умолчанию [(N*(N-1))*4, (N*(N-1))*2], в ~20 раз меньше параметров).
+
+Данные — состояния из прогонов по случайным уровням (не пересекаются
+с проверочным набором level_sets):
+  раунд 0   – ходит учитель (ε‑жадно, чтобы видеть и соседние состояния);
+  раунд 1.. – ходит уже обученный ученик, метки по‑прежнему от учителя
+              (DAgger: ученик учится и на тех состояниях, куда попадает сам).
+Ученик повторяет не Q‑значения, а распределение softmax(Q/τ) учителя
+по валидным ходам — для агента важен только порядок ходов.
+
+Ученик допускается к работе, только если на фиксированном наборе уровней
+(level_sets.seeded_levels) он не хуже учителя больше чем на пороги —
+как у quantize.py. Отчёт (solve rate, шаги, задержка хода, память)
+пишется в ai_models/students/manifest.json, веса — в
+ai_models/students/<N_K_L>.pth. solver.load_agent берёт одобренного
+ученика при AI_STUDENT=1.
+
+Пример:
+  python -m ai_functions.distill                       # все модели
+  python -m ai_functions.distill 7_2_5 --levels 3000 --rounds 3 --arch 256 128
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from ai_functions.dqn_agent import MaskedDQNAgent
+
+MODELS_DIR    = Path(__file__).parent / "ai_models"
+STUDENTS_DIR  = MODELS_DIR / "students"
+MANIFEST_PATH = STUDENTS_DIR / "manifest.json"
+
+AI_STUDENT = os.getenv("AI_STUDENT", "0") == "1"
+
+TRAIN_SEED = 1_000_000          # уровни обучения: reset(seed=TRAIN_SEED+i)
+
+
+def default_arch(N: int) -> List[int]:
+    return [(N*(N-1))*4, (N*(N-1))*2]
+
+
+def student_path(model_name: str) -> Path:
+    return STUDENTS_DIR / f"{model_name}.pth"
+
+
+def load_manifest() -> Dict[str, Dict]:
+    if not MANIFEST_PATH.exists():
+        return {}
+    with open(MANIFEST_PATH, "r") as fp:
+        return json.load(fp)
+
+
+def is_approved(model_name: str) -> bool:
+    return bool(load_manifest().get(model_name, {}).get("approved")) and student_path(model_name).exists()
+
+
+def build_student(N: int, L: int, arch: List[int], device="cpu") -> MaskedDQNAgent:
+    agent = MaskedDQNAgent(state_dim=N*L, action_dim=N*N, net_arch=arch, device=device)
+    agent.epsilon = 0
+    return agent
+
+
+def load_student(model_name: str, device="cpu") -> MaskedDQNAgent:
+    N, K, L = map(int, model_name.split("_"))
+    arch = load_manifest()[model_name]["arch"]
+    agent = build_student(N, L, arch, device)
+    agent.load_state_dict(torch.load(student_path(model_name), map_location=device))
+    agent.eval()
+    return agent
+
+
+def param_count(agent) -> int:
+    return sum(p.numel() for p in agent.q_net.parameters())
+
+
+# ------------------------- data ------------------------------------------
+def _valid_mask(env, obs: np.ndarray, A: int) -> np.ndarray:
+    mask = np.zeros(A, dtype=bool)
+    mask[env.fast_get_valid_actions(obs, ignore_prev=True)] = True
+    return mask
+
+
+def collect(policy, env, N: int, levels: List[List[List[int]]], epsilon: float,
+            max_steps: int, rng: random.Random) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Прогоняет policy ε‑жадно по уровням. Возвращает (наблюдения, маски валидных ходов).
+    """
+    raw = env.env
+    A = env.action_space.n
+    states, masks = [], []
+    for state in levels:
+        raw.state = np.array(state, dtype=int)
+        raw.steps = 0
+        raw.prev_action = None
+        raw.recent_states.clear()
+        obs = raw._get_obs().flatten()
+        for _ in range(max_steps):
+            mask = _valid_mask(env, obs, A)
+            if not mask.any():
+                break
+            states.append(obs.copy())
+            masks.append(mask)
+            valid = np.flatnonzero(mask)
+            if rng.random() < epsilon:
+                act = int(rng.choice(valid))
+            else:
+                q = policy.predict_qvalues(obs[None])[0]
+                act = int(valid[np.argmax(q[valid])])
+            obs, _, done, truncated, _ = env.step(act)
+            if done or truncated:
+                break
+    return np.array(states, dtype=np.float32), np.array(masks, dtype=bool)
+
+
+# ------------------------- training --------------------------------------
+def distill_loss(student_q: torch.Tensor, teacher_q: torch.Tensor,
+                 mask: torch.Tensor, tau: float) -> torch.Tensor:
+    """
+    Кросс‑энтропия между softmax(Q/τ) учителя и ученика по валидным ходам.
+    """
+    neg = torch.finfo(student_q.dtype).min
+    target = F.softmax((teacher_q / tau).masked_fill(~mask, neg), dim=1)
+    logp = F.log_softmax((student_q / tau).masked_fill(~mask, neg), dim=1)
+    return -(target * logp.masked_fill(~mask, 0.0)).sum(dim=1).mean()
+
+
+def train(student: MaskedDQNAgent, obs: np.ndarray, teacher_q: np.ndarray, masks: np.ndarray,
+          epochs: int, batch_size: int, tau: float, seed: int) -> float:
+    gen = torch.Generator().manual_seed(seed)
+    obs_t, tq_t, mask_t = torch.from_numpy(obs), torch.from_numpy(teacher_q), torch.from_numpy(masks)
+    student.train()
+    loss = torch.tensor(0.0)
+    for _ in range(epochs):
+        perm = torch.randperm(len(obs_t), generator=gen)
+        for i in range(0, len(perm), batch_size):
+            idx = perm[i:i + batch_size]
+            loss = distill_loss(student.q_net(obs_t[idx]), tq_t[idx], mask_t[idx], tau)
+            student.optimizer.zero_grad()
+            loss.backward()
+            student.optimizer.step()
+    student.eval()
+    return loss.item()
+
+
+def distill(model_name: str, arch: Optional[List[int]] = None, n_levels: int = 2000,
+            rounds: int = 2, epsilon: float = 0.1, epochs: int = 10, batch_size: int = 256,
+            tau: float = 0.1, lr: float = 1e-3, max_steps: int = 100, seed: int = 0) -> MaskedDQNAgent:
+    from ai_functions.solver     import create_env, load_agent
+    from ai_functions.level_sets import parse_model_name, seeded_levels
+
+    N, K, L = parse_model_name(model_name)
+    env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K, max_steps=max_steps)
+    teacher = load_agent(model_name, env, N, runtime="eager", quantize=False,
+                         student=False, universal=False)
+
+    torch.manual_seed(seed)
+    student = build_student(N, L, arch or default_arch(N))
+    student.optimizer = torch.optim.Adam(student.q_net.parameters(), lr=lr)
+
+    levels = seeded_levels(model_name, n_levels, TRAIN_SEED + seed)
+    rng = random.Random(seed)
+    obs = np.empty((0, N*L), dtype=np.float32)
+    masks = np.empty((0, N*N), dtype=bool)
+    for r in range(rounds + 1):
+        policy = teacher if r == 0 else student
+        new_obs, new_masks = collect(policy, env, N, levels, epsilon, max_steps, rng)
+        obs, masks = np.concatenate([obs, new_obs]), np.concatenate([masks, new_masks])
+        teacher_q = teacher.predict_qvalues(obs).astype(np.float32)
+        loss = train(student, obs, teacher_q, masks, epochs, batch_size, tau, seed + r)
+        print(f"  раунд {r}: состояний {len(obs)}, loss {loss:.4f}")
+    return student
+
+
+# ------------------------- evaluation ------------------------------------
+def move_latency_us(agent, obs: np.ndarray, repeats: int = 2000) -> float:
+    """
+    Медианное время predict_qvalues на одно наблюдение (как при живом ходе).
+    """
+    times = []
+    for i in range(repeats):
+        o = obs[i % len(obs)][None]
+        t0 = time.perf_counter()
+        agent.predict_qvalues(o)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times) * 1e6)
+
+
+def check_student(model_name: str, student: MaskedDQNAgent, n_levels: int = 500, seed: int = 0,
+                  max_solve_drop: float = 0.01, max_step_increase: float = 0.05) -> Dict:
+    """
+    Сравнивает ученика с учителем на одном и том же наборе уровней.
+    """
+    from ai_functions.solver     import create_env, load_agent
+    from ai_functions.level_sets import parse_model_name, seeded_levels, replay_levels
+
+    N, K, L = parse_model_name(model_name)
+    env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K)
+    teacher = load_agent(model_name, env, N, runtime="eager", quantize=False,
+                         student=False, universal=False)
+    levels = seeded_levels(model_name, n_levels, seed)
+
+    base  = replay_levels(teacher, model_name, levels)
+    small = replay_levels(student, model_name, levels)
+
+    both = [(b, s) for b, s in zip(base["steps"], small["steps"]) if b is not None and s is not None]
+    base_steps    = float(np.mean([b for b, _ in both])) if both else float("nan")
+    student_steps = float(np.mean([s for _, s in both])) if both else float("nan")
+    step_increase = (student_steps - base_steps) / base_steps if both else 0.0
+    solve_drop = base["solve_rate"] - small["solve_rate"]
+
+    obs = np.array([np.array(lv).flatten() for lv in levels], dtype=np.float32)
+    teacher_us, student_us = move_latency_us(teacher, obs), move_latency_us(student, obs)
+
+    return {
+        "arch":                 [m.out_features for m in student.q_net if hasattr(m, "out_features")][:-1],
+        "levels":               n_levels,
+        "seed":                 seed,
+        "teacher_params":       param_count(teacher),
+        "student_params":       param_count(student),
+        "teacher_bytes":        param_count(teacher) * 4,
+        "student_bytes":        param_count(student) * 4,
+        "teacher_solve_rate":   base["solve_rate"],
+        "student_solve_rate":   small["solve_rate"],
+        "teacher_mean_steps":   base_steps,
+        "student_mean_steps":   student_steps,
+        "solve_drop":           solve_drop,
+        "step_increase":        step_increase,
+        "teacher_move_us":      teacher_us,
+        "student_move_us":      student_us,
+        "speedup":              teacher_us / student_us if student_us else float("nan"),
+        "approved":             solve_drop <= max_solve_drop and step_increase <= max_step_increase,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Дистилляция моделей в маленькие сети с проверкой точности")
+    parser.add_argument("models", nargs="*", help="N_K_L (по умолчанию все ai_models/*.pth)")
+    parser.add_argument("--arch", type=int, nargs="+", help="скрытые слои ученика")
+    parser.add_argument("--levels", type=int, default=2000, help="уровней для сбора состояний")
+    parser.add_argument("--rounds", type=int, default=2, help="раундов DAgger после первого")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--tau", type=float, default=0.1, help="температура softmax(Q/τ)")
+    parser.add_argument("--lr", type=float, default=1e-3, help="шаг Adam ученика")
+    parser.add_argument("--eval-levels", type=int, default=500, help="размер проверочного набора")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-solve-drop", type=float, default=0.01,
+                        help="допустимое падение solve rate (абсолютное)")
+    parser.add_argument("--max-step-increase", type=float, default=0.05,
+                        help="допустимый рост среднего числа шагов (относительный)")
+    args = parser.parse_args()
+
+    models: List[str] = args.models or sorted(p.stem for p in MODELS_DIR.glob("*.pth"))
+    STUDENTS_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest()
+    for name in models:
+        if not (MODELS_DIR / f"{name}.pth").exists():
+            print(f"Модель не найдена: {name}", file=sys.stderr)
+            continue
+        print(f"{name}:")
+        t0 = time.perf_counter()
+        student = distill(name, args.arch, args.levels, args.rounds, epochs=args.epochs,
+                          tau=args.tau, lr=args.lr, seed=args.seed)
+        report = check_student(name, student, args.eval_levels, args.seed,
+                               args.max_solve_drop, args.max_step_increase)
+        report["train_seconds"] = round(time.perf_counter() - t0, 1)
+        torch.save(student.state_dict(), student_path(name))
+        manifest[name] = report
+        mark = "✅" if report["approved"] else "🚫"
+        print(f'{mark} {name:>6}: solve {report["teacher_solve_rate"]:.3f}→{report["student_solve_rate"]:.3f}  '
+              f'steps {report["teacher_mean_steps"]:.2f}→{report["student_mean_steps"]:.2f}  '
+              f'params {report["teacher_params"]}→{report["student_params"]}  '
+              f'move {report["teacher_move_us"]:.0f}→{report["student_move_us"]:.0f} µs')
+
+    with open(MANIFEST_PATH, "w") as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,31 @@ import torch.nn as nn
 import torch.optim as optim
 import copy
 
+
+def masked_actions(qvals: np.ndarray, obs: np.ndarray, env, epsilon: float = 0.0) -> np.ndarray:
+    """
+    ε‑жадный выбор среди валидных действий по уже посчитанным Q(s,a).
+    Общая часть для MaskedDQNAgent и экспортированных рантаймов (runtime.py).
+    """
+    B, A = qvals.shape
+    actions = np.empty(B, dtype=int)
+
+    for i in range(B):
+        valid = env.fast_get_valid_actions(obs[i])
+        if not valid:
+            valid = list(range(A))
+        if random.random() < epsilon:
+            actions[i] = random.choice(valid)
+        else:
+            # вместо цикла сделаем маску
+            mask = np.full(A, -1e9, dtype=np.float32)
+            mask[valid] = 0.0
+            q_masked = qvals[i] + mask           # invalid≤-1e9
+            actions[i] = q_masked.argmax()
+
+    return actions
+
+
 class MaskedDQNAgent(nn.Module):
     def __init__(self, state_dim, action_dim, net_arch=[256,256], lr=1e-4, device='cpu'):
         super().__init__()
@@ -53,23 +78,7 @@ class MaskedDQNAgent(nn.Module):
 
     def sample_actions_masked(self, obs: np.ndarray, env) -> np.ndarray:
         qvals = self.predict_qvalues(obs)            # numpy (B, A)
-        B, A = qvals.shape
-        actions = np.empty(B, dtype=int)
-
-        for i in range(B):
-            valid = env.fast_get_valid_actions(obs[i])
-            if not valid:
-                valid = list(range(A))
-            if random.random() < self.epsilon:
-                actions[i] = random.choice(valid)
-            else:
-                # вместо цикла сделаем маску
-                mask = np.full(A, -1e9, dtype=np.float32)
-                mask[valid] = 0.0
-                q_masked = qvals[i] + mask           # invalid≤-1e9
-                actions[i] = q_masked.argmax()
-
-        return actions
+        return masked_actions(qvals, obs, env, self.epsilon)
 
     def update_target(self):
         self.q_net_target.load_state_dict(self.q_net.state_dict())
\ No newline at end of file
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/evaluate.py
+"""
+Оценка агентов против оптимума (BFS) на тысячах уровней в пуле процессов.
+
+Уровни — level_sets.seeded_levels: уровень i конфигурации — env.reset(seed=seed+i),
+поэтому результат не зависит от числа воркеров и размера чанков (с --dataset —
+уровни конфигурации из набора level_dataset.py по порядку). Каждая
+конфигурация режется на чанки по --chunk уровней, чанки раздаются пулу
+процессов (у каждого свой кэш агентов и один поток torch). Внутри чанка
+агент играет до --batch партий в ногу (rollout.Rollout): на каждом шаге
+Q‑значения всех активных партий считаются одним вызовом predict_qvalues,
+а на место закончившейся партии сразу встаёт следующая. Оптимум для каждого
+уровня — exact_search.bfs_solve с лимитом --bfs-expansions.
+
+Итог — CSV в формате experiments/graphs/alg_speed_comparison/speed_comparison.csv:
+  cfg, bfs_time, agent_time, bfs_steps, agent_steps, agent_success, speedup(×)
+и дополнительно step_gap, levels, solvable. Как и в ноутбуке, считаются только
+уровни, которые решил BFS:
+  - bfs_time      – среднее время BFS на уровень, с;
+  - agent_time    – время агента на уровень, с (время батчевого прогона чанка,
+                    делённое на число уровней в нём);
+  - bfs_steps     – средняя длина оптимального решения;
+  - agent_steps   – средняя длина решения агента (по решённым им);
+  - agent_success – доля уровней, решённых агентом;
+  - step_gap      – agent_steps - bfs_steps на уровнях, решённых обоими.
+
+Пример:
+  python -m ai_functions.evaluate --levels 2000 --out speed_comparison.csv
+  python -m ai_functions.evaluate 7_2_4 7_2_5 --levels 5000 --workers 4 --student
+  python -m ai_functions.evaluate --dataset levels.ds --levels 100000
+"""
+import os
+import sys
+import csv
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from ai_functions.solver       import create_env, get_agent, set_state
+from ai_functions.level_sets   import parse_model_name, seeded_levels, dataset_levels
+from ai_functions.rollout      import Rollout
+from ai_functions.exact_search import bfs_solve
+
+MODELS_DIR = Path(__file__).parent / "ai_models"
+
+FIELDS = ["cfg", "bfs_time", "agent_time", "bfs_steps", "agent_steps",
+          "agent_success", "speedup(×)", "step_gap", "levels", "solvable"]
+
+
+def play_batch(agent, model_name: str, levels: List[List[List[int]]],
+               batch: int = 128, max_steps: int = 100) -> List[Optional[int]]:
+    """
+    Прогоняет агента по уровням, ведя до batch партий одновременно.
+    Возвращает число ходов для каждого уровня (None — не решил).
+    """
+    N, K, L = parse_model_name(model_name)
+    envs = [create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K,
+                       max_steps=max_steps) for _ in range(min(batch, len(levels)))]
+    steps: List[Optional[int]] = [None] * len(levels)
+    active: List[Tuple[int, Rollout]] = []
+    free = list(envs)
+    nxt = 0
+
+    while nxt < len(levels) or active:
+        # свободные окружения сразу занимаем следующими уровнями
+        while free and nxt < len(levels):
+            env = free.pop()
+            r = Rollout(env, set_state(env, levels[nxt]), N, L, max_steps)
+            active.append((nxt, r))
+            nxt += 1
+
+        playing = [(i, r) for i, r in active if not r.finished]
+        if playing:
+            qvals = agent.predict_qvalues(np.stack([r.obs for _, r in playing]))
+            for (_, r), q in zip(playing, qvals):
+                r.step(q)
+
+        still = []
+        for i, r in active:
+            if r.finished:
+                steps[i] = len(r.actions) if r.done else None
+                free.append(r.env)
+            else:
+                still.append((i, r))
+        active = still
+    return steps
+
+
+def _init_worker(threads: int):
+    torch.set_num_threads(threads)
+
+
+def evaluate_chunk(model_name: str, start: int, count: int, seed: int, batch: int,
+                   bfs_expansions: int, max_steps: int, runtime: str,
+                   quantize: bool, student: bool, universal: bool,
+                   dataset: Optional[str] = None) -> Dict:
+    """
+    Уровни start..start+count-1 одной конфигурации: агент батчем и BFS по каждому.
+    """
+    N, K, L = parse_model_name(model_name)
+    if dataset:
+        levels = dataset_levels(dataset, model_name, count, start)
+    else:
+        levels = seeded_levels(model_name, count, seed + start)
+    env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K)
+    agent = get_agent(model_name, env, N, runtime=runtime, quantize=quantize,
+                      student=student, universal=universal)
+
+    t0 = time.perf_counter()
+    agent_steps = play_batch(agent, model_name, levels, batch, max_steps)
+    agent_time = time.perf_counter() - t0
+
+    bfs_steps, bfs_times = [], []
+    for state in levels:
+        t0 = time.perf_counter()
+        path = bfs_solve(state, bfs_expansions)
+        bfs_times.append(time.perf_counter() - t0)
+        bfs_steps.append(len(path) if path is not None else None)
+
+    return {"cfg": model_name, "agent_time": agent_time, "agent_steps": agent_steps,
+            "bfs_steps": bfs_steps, "bfs_times": bfs_times}
+
+
+def summarize(model_name: str, chunks: List[Dict]) -> Dict:
+    agent = [s for c in chunks for s in c["agent_steps"]]
+    opt = [s for c in chunks for s in c["bfs_steps"]]
+    bfs_times = [t for c in chunks for t in c["bfs_times"]]
+    agent_time = sum(c["agent_time"] for c in chunks) / max(1, len(agent))
+
+    solvable = [i for i, o in enumerate(opt) if o is not None]
+    solved = [i for i in solvable if agent[i] is not None]
+    bfs_time = float(np.mean([bfs_times[i] for i in solvable])) if solvable else float("nan")
+
+    def mean(xs):
+        return float(np.mean(xs)) if xs else float("nan")
+
+    return {
+        "cfg":           model_name,
+        "bfs_time":      bfs_time,
+        "agent_time":    agent_time,
+        "bfs_steps":     mean([opt[i] for i in solvable]),
+        "agent_steps":   mean([agent[i] for i in solved]),
+        "agent_success": len(solved) / len(solvable) if solvable else float("nan"),
+        "speedup(×)":    bfs_time / agent_time if agent_time else float("nan"),
+        "step_gap":      mean([agent[i] - opt[i] for i in solved]),
+        "levels":        len(agent),
+        "solvable":      len(solvable),
+    }
+
+
+def cpu_count() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Агент против BFS на фиксированных наборах уровней")
+    parser.add_argument("models", nargs="*", help="N_K_L (по умолчанию все ai_models/*.pth)")
+    parser.add_argument("--levels", type=int, default=1000, help="уровней на конфигурацию")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dataset", help="набор уровней level_dataset.py вместо seeded_levels")
+    parser.add_argument("--workers", type=int, default=cpu_count())
+    parser.add_argument("--chunk", type=int, default=250, help="уровней на задачу пула")
+    parser.add_argument("--batch", type=int, default=128, help="партий агента в ногу")
+    parser.add_argument("--bfs-expansions", type=int, default=200_000)
+    parser.add_argument("--max-steps", type=int, default=100)
+    parser.add_argument("--runtime", default="eager", choices=["eager", "torchscript", "onnx"])
+    parser.add_argument("--quantize", action="store_true", help="int8, если модель одобрена quantize.py")
+    parser.add_argument("--student", action="store_true", help="сеть‑ученик, если одобрена distill.py")
+    parser.add_argument("--universal", action="store_true", help="общая сеть universal_policy.py")
+    parser.add_argument("--out", default="speed_comparison.csv")
+    args = parser.parse_args()
+
+    models = args.models or sorted(p.stem for p in MODELS_DIR.glob("*.pth"))
+    missing = [m for m in models if not (MODELS_DIR / f"{m}.pth").exists()]
+    for m in missing:
+        print(f"Модель не найдена: {m}", file=sys.stderr)
+    models = [m for m in models if m not in missing]
+    if not models:
+        sys.exit(1)
+
+    per_model = {m: args.levels for m in models}
+    if args.dataset:
+        from ai_functions.level_dataset import LevelDataset
+        ds = LevelDataset(args.dataset)
+        per_model = {m: min(args.levels, len(ds.indices(m))) for m in models}
+        models = [m for m in models if per_model[m]]
+        if not models:
+            print(f"В наборе {args.dataset} нет уровней этих конфигураций", file=sys.stderr)
+            sys.exit(1)
+
+    tasks = [(m, start, min(args.chunk, per_model[m] - start))
+             for m in models for start in range(0, per_model[m], args.chunk)]
+    chunks: Dict[str, List[Dict]] = {m: [] for m in models}
+    left = {m: sum(1 for t in tasks if t[0] == m) for m in models}
+    rows: Dict[str, Dict] = {}
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_worker,
+                             initargs=(1,)) as pool:
+        futures = [pool.submit(evaluate_chunk, m, start, count, args.seed, args.batch,
+                               args.bfs_expansions, args.max_steps, args.runtime,
+                               args.quantize, args.student, args.universal, args.dataset)
+                   for m, start, count in tasks]
+        for fut in as_completed(futures):
+            res = fut.result()
+            m = res["cfg"]
+            chunks[m].append(res)
+            left[m] -= 1
+            if left[m] == 0:
+                row = rows[m] = summarize(m, chunks[m])
+                print(f'{m:>6}: success {row["agent_success"]:.3f}  '
+                      f'steps {row["agent_steps"]:.2f} vs {row["bfs_steps"]:.2f} '
+                      f'(gap {row["step_gap"]:+.2f})  '
+                      f'agent {row["agent_time"] * 1e3:.2f} ms  bfs {row["bfs_time"] * 1e3:.2f} ms  '
+                      f'×{row["speedup(×)"]:.1f}')
+
+    with open(args.out, "w", newline="") as fp:
+        writer = csv.DictWriter(fp, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows[m] for m in models)
+    print(f"✅  {args.out}: {len(models)} конфигураций, уровней: {sum(per_model[m] for m in models)} "
+          f"за {time.perf_counter() - t0:.1f}s, воркеров: {args.workers}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/exact_search.py
+"""
+Точный поиск (BFS) кратчайшего решения и «чистые» функции над состояниями.
+
+Состояние — кортеж кортежей (N × L), индекс 0 — верх пробирки, -1 — пустой слой.
+Правила переливания те же, что в WaterSortEnvFixed._pour и в levelLogic.mjs.
+"""
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+State = Tuple[Tuple[int, ...], ...]
+
+
+def to_state(state: Sequence[Sequence[int]]) -> State:
+    return tuple(tuple(int(c) for c in tube) for tube in state)
+
+
+def find_top(tube: Tuple[int, ...]) -> int:
+    for i, c in enumerate(tube):
+        if c != -1:
+            return i
+    return -1
+
+
+def can_pour(state: State, fr: int, to: int) -> bool:
+    if fr == to:
+        return False
+    fr_top = find_top(state[fr])
+    if fr_top == -1:
+        return False
+    to_top = find_top(state[to])
+    if to_top == 0:                              # приёмник полон
+        return False
+    return to_top == -1 or state[to][to_top] == state[fr][fr_top]
+
+
+def pour(state: State, fr: int, to: int) -> State:
+    """
+    Возвращает НОВОЕ состояние после переливания fr→to (ход должен быть валиден).
+    """
+    src, dst = list(state[fr]), list(state[to])
+    L = len(src)
+    fr_top = find_top(state[fr])
+    color = src[fr_top]
+
+    count = 1
+    idx = fr_top + 1
+    while idx < L and src[idx] == color:
+        count += 1
+        idx += 1
+
+    to_top = find_top(state[to])
+    to_idx = L - 1 if to_top == -1 else to_top - 1
+    while count and to_idx >= 0 and dst[to_idx] == -1:
+        dst[to_idx] = color
+        src[fr_top] = -1
+        fr_top += 1
+        to_idx -= 1
+        count -= 1
+
+    tubes = list(state)
+    tubes[fr], tubes[to] = tuple(src), tuple(dst)
+    return tuple(tubes)
+
+
+def is_solved(state: State) -> bool:
+    for tube in state:
+        first = tube[0]
+        if first == -1 and tube[-1] == -1:       # пустая (сверху и снизу пусто)
+            continue
+        if first == -1 or any(c != first for c in tube):
+            return False
+    return True
+
+
+def successors(state: State) -> Iterator[Tuple[Tuple[int, int], State]]:
+    n = len(state)
+    for fr in range(n):
+        for to in range(n):
+            if can_pour(state, fr, to):
+                yield (fr, to), pour(state, fr, to)
+
+
+def bfs_solve(state: Sequence[Sequence[int]],
+              max_expansions: int = 100_000) -> Optional[List[List[int]]]:
+    """
+    Кратчайшее решение списком ходов [[from, to], …] или None,
+    если решения нет (или оно не найдено за max_expansions раскрытий).
+    """
+    start = to_state(state)
+    if is_solved(start):
+        return []
+
+    parent: Dict[State, Tuple[State, Tuple[int, int]]] = {}
+    visited = {start}
+    queue = deque([start])
+    expansions = 0
+
+    while queue and expansions < max_expansions:
+        cur = queue.popleft()
+        expansions += 1
+        for move, nxt in successors(cur):
+            if nxt in visited:
+                continue
+            visited.add(nxt)
+            parent[nxt] = (cur, move)
+            if is_solved(nxt):
+                path = []
+                while nxt != start:
+                    nxt, move = parent[nxt]
+                    path.append(list(move))
+                return path[::-1]
+            queue.append(nxt)
+
+    return None
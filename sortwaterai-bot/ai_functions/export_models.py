@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/export_models.py
+"""
+Экспорт ai_models/*.pth в TorchScript / ONNX и бенчмарк задержки шага.
+
+Примеры:
+  python -m ai_functions.export_models                      # все модели → TorchScript
+  python -m ai_functions.export_models 7_2_4 --format torchscript onnx
+  python -m ai_functions.export_models --bench --threads 1 2 4 --csv export_bench.csv
+
+После бенчмарка лучшее число потоков для каждой модели пишется
+в ai_models/exported/manifest.json и подхватывается runtime.py.
+"""
+import sys
+import csv
+import json
+import time
+import argparse
+from typing import Dict, List
+
+import numpy as np
+import torch
+
+from ai_functions.solver  import create_env, load_agent
+from ai_functions.runtime import (
+    EXPORT_DIR, MANIFEST_PATH, MODELS_DIR, SUFFIXES,
+    exported_path, load_manifest, load_compiled_agent,
+)
+
+
+def model_names() -> List[str]:
+    return sorted(p.stem for p in MODELS_DIR.glob("*.pth"))
+
+
+def parse_model_name(model_name: str):
+    N, K, L = map(int, model_name.split("_"))  # N-Число пробирок, K-сколько пустых, L - Число слоёв
+    return N, K, L
+
+
+def build_eager(model_name: str):
+    N, K, L = parse_model_name(model_name)
+    env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K)
+    agent = load_agent(model_name, env, N, runtime="eager", student=False, universal=False)
+    return agent, env, N
+
+
+def export_torchscript(q_net: torch.nn.Module, obs_dim: int, model_name: str):
+    example = torch.zeros(1, obs_dim)
+    with torch.inference_mode():
+        traced = torch.jit.trace(q_net.cpu(), example)
+    traced = torch.jit.optimize_for_inference(torch.jit.freeze(traced.eval()))
+    path = exported_path(model_name, "torchscript")
+    traced.save(str(path))
+    return path
+
+
+def export_onnx(q_net: torch.nn.Module, obs_dim: int, model_name: str):
+    path = exported_path(model_name, "onnx")
+    torch.onnx.export(
+        q_net.cpu(),
+        (torch.zeros(1, obs_dim),),
+        str(path),
+        input_names=["obs"],
+        output_names=["q"],
+        dynamic_axes={"obs": {0: "batch"}, "q": {0: "batch"}},
+        dynamo=False,
+    )
+    return path
+
+
+def export_model(model_name: str, formats: List[str]) -> List[str]:
+    agent, env, _ = build_eager(model_name)
+    obs_dim = env.observation_space.shape[0]
+    done = []
+    for fmt in formats:
+        if fmt == "torchscript":
+            path = export_torchscript(agent.q_net, obs_dim, model_name)
+        else:
+            path = export_onnx(agent.q_net, obs_dim, model_name)
+        print(f"  {model_name} → {path.relative_to(MODELS_DIR.parent)}")
+        done.append(fmt)
+    return done
+
+
+# ------------------------- benchmark ---------------------------------------
+def collect_states(agent, env, n_states: int, seed: int = 0) -> np.ndarray:
+    """
+    Состояния из прогонов самого агента — именно на них считается шаг в проде.
+    """
+    states = []
+    episode = 0
+    while len(states) < n_states:
+        obs, _ = env.reset(seed=seed + episode)
+        episode += 1
+        done = truncated = False
+        while not (done or truncated) and len(states) < n_states:
+            states.append(obs.copy())
+            act = agent.sample_actions_masked(obs[None], env)[0]
+            obs, _, done, truncated, _ = env.step(act)
+    return np.stack(states)
+
+
+def step_latency_us(agent, env, states: np.ndarray, repeat: int = 3) -> float:
+    """
+    Медиана (по повторам) средней задержки одного шага агента, мкс.
+    Шаг = forward + маскирование, как в solve_with_agent.
+    """
+    raw = env.env
+    for obs in states[:10]:                      # прогрев
+        agent.sample_actions_masked(obs[None], env)
+
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for obs in states:
+            raw.prev_action = None
+            agent.sample_actions_masked(obs[None], env)
+        runs.append((time.perf_counter() - t0) / len(states))
+    return float(np.median(runs)) * 1e6
+
+
+def bench_model(model_name: str, runtimes: List[str], threads_list: List[int],
+                n_states: int) -> List[Dict]:
+    agent, env, _ = build_eager(model_name)
+    states = collect_states(agent, env, n_states)
+
+    rows = []
+    for threads in threads_list:
+        torch.set_num_threads(threads)
+        eager_us = step_latency_us(agent, env, states)
+        rows.append({"cfg": model_name, "runtime": "eager", "threads": threads,
+                     "step_us": eager_us, "speedup": 1.0})
+        for rt in runtimes:
+            if not exported_path(model_name, rt).exists():
+                continue
+            compiled = load_compiled_agent(model_name, rt, threads=threads)
+            us = step_latency_us(compiled, env, states)
+            rows.append({"cfg": model_name, "runtime": rt, "threads": threads,
+                         "step_us": us, "speedup": eager_us / us})
+    return rows
+
+
+def update_manifest(manifest: Dict, model_name: str, formats: List[str], rows: List[Dict]):
+    entry = manifest.setdefault(model_name, {})
+    if formats:
+        entry["formats"] = sorted(set(entry.get("formats", [])) | set(formats))
+    if rows:
+        exported = [r for r in rows if r["runtime"] != "eager"] or rows
+        best = min(exported, key=lambda r: r["step_us"])
+        entry["threads"] = best["threads"]
+        entry["best_runtime"] = best["runtime"]
+        entry["step_us"] = {
+            f'{r["runtime"]}@{r["threads"]}': round(r["step_us"], 2) for r in rows
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт DQN‑моделей и бенчмарк рантаймов")
+    parser.add_argument("models", nargs="*", help="N_K_L (по умолчанию все ai_models/*.pth)")
+    parser.add_argument("--format", nargs="+", default=["torchscript"],
+                        choices=list(SUFFIXES), help="форматы экспорта")
+    parser.add_argument("--skip-export", action="store_true", help="только бенчмарк уже экспортированных")
+    parser.add_argument("--bench", action="store_true", help="сравнить задержку шага с eager")
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 2, 4],
+                        help="перебираемые intra‑op потоки")
+    parser.add_argument("--states", type=int, default=500, help="число состояний в бенчмарке")
+    parser.add_argument("--csv", help="куда сохранить результаты бенчмарка")
+    args = parser.parse_args()
+
+    models = args.models or model_names()
+    unknown = [m for m in models if not (MODELS_DIR / f"{m}.pth").exists()]
+    if unknown:
+        print(f"Модели не найдены: {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(1)
+
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest()
+    all_rows: List[Dict] = []
+
+    for name in models:
+        formats = [] if args.skip_export else export_model(name, args.format)
+        rows = bench_model(name, args.format, args.threads, args.states) if args.bench else []
+        for r in rows:
+            print(f'{r["cfg"]:>6} {r["runtime"]:>11} threads={r["threads"]} '
+                  f'step={r["step_us"]:8.1f}us  ×{r["speedup"]:.2f}')
+        update_manifest(manifest, name, formats, rows)
+        all_rows.extend(rows)
+
+    with open(MANIFEST_PATH, "w") as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+
+    if args.csv and all_rows:
+        with open(args.csv, "w", newline="") as fp:
+            writer = csv.DictWriter(fp, fieldnames=list(all_rows[0]))
+            writer.writeheader()
+            writer.writerows(all_rows)
+        print(f"✅  Результаты бенчмарка: {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
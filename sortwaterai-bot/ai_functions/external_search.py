@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/external_search.py
+"""
+Точный поиск (BFS) с фронтом и множеством посещённых на диске — для
+конфигураций, на которых exact_search.bfs_solve упирается в память
+(7+ пробирок, уровни на 10–14 пробирок из experiments/pygame_code_stolen.py).
+
+Состояния:
+  - пробирки взаимозаменяемы, поэтому ищем по каноническому виду — пробирки
+    отсортированы (длина кратчайшего решения от этого не меняется, а состояний
+    в N! раз меньше);
+  - ключ — N × L ячеек по 4 бита (цвет + 1, 0 — пусто), numpy‑тип S<W>;
+    байтовый порядок ключей совпадает с порядком сортировки numpy.
+
+Поиск идёт слоями (delayed duplicate detection):
+  1. слой d читается с диска блоками по block состояний, преемники
+     копятся в памяти и, набрав run_states, сортируются и сбрасываются
+     на диск отсортированным «прогоном» без повторов;
+  2. прогоны и файл посещённых сливаются одним последовательным проходом
+     (merge_blocks): новые ключи — слой d+1, объединение — новый файл
+     посещённых. Повторы отсеиваются слиянием, а не хэш‑таблицей, поэтому
+     память ограничена ~ (run_states + block × число прогонов) ключей.
+  3. Слои остаются на диске до конца: решение восстанавливается с конца —
+     предшественники (scramble.inverse_pours) ищутся бинпоиском в слое
+     memmap, затем цепочка канонических состояний переводится в настоящие
+     ходы прямым проигрыванием от исходного уровня.
+
+  python -m ai_functions.external_search --random 7_2_4 --seed 3
+  python -m ai_functions.external_search --state '[[0,1,2,0],[...],...]' --workdir /mnt/big
+"""
+import os
+import json
+import time
+import shutil
+import tempfile
+import argparse
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from ai_functions.exact_search import State, is_solved, successors, to_state
+from ai_functions.scramble     import inverse_pours
+
+RUN_STATES = int(os.getenv("EXTERNAL_RUN_STATES", 2_000_000))   # ключей в памяти до сброса прогона
+BLOCK = int(os.getenv("EXTERNAL_BLOCK", 1 << 16))                # ключей на блок чтения/слияния
+
+
+def canonical(state: State) -> State:
+    return tuple(sorted(state))
+
+
+def key_width(N: int, L: int) -> int:
+    return (N * L + 1) // 2
+
+
+def encode(states: Sequence[State], N: int, L: int) -> np.ndarray:
+    """
+    Состояния → массив ключей S<W> (по 4 бита на ячейку).
+    """
+    W = key_width(N, L)
+    cells = np.asarray(states, dtype=np.int16).reshape(len(states), N * L) + 1
+    if (N * L) % 2:
+        cells = np.pad(cells, ((0, 0), (0, 1)))
+    packed = ((cells[:, 0::2] << 4) | cells[:, 1::2]).astype(np.uint8)
+    return np.ascontiguousarray(packed).view(f"S{W}").ravel()
+
+
+def decode(keys: np.ndarray, N: int, L: int) -> List[State]:
+    W = key_width(N, L)
+    raw = np.frombuffer(np.ascontiguousarray(keys, dtype=f"S{W}").tobytes(), dtype=np.uint8)
+    raw = raw.reshape(len(keys), W)
+    cells = np.empty((len(keys), W * 2), dtype=np.int16)
+    cells[:, 0::2] = raw >> 4
+    cells[:, 1::2] = raw & 0x0F
+    cells = cells[:, :N * L].reshape(len(keys), N, L) - 1
+    return [tuple(map(tuple, s)) for s in cells.tolist()]
+
+
+def open_keys(path: Path, W: int) -> np.ndarray:
+    n = path.stat().st_size // W if path.exists() else 0
+    if n == 0:
+        return np.empty(0, dtype=f"S{W}")
+    return np.memmap(path, dtype=f"S{W}", mode="r", shape=(n,))
+
+
+def merge_blocks(sources: List[np.ndarray], block: int = BLOCK) -> Iterator[List[np.ndarray]]:
+    """
+    Последовательное слияние отсортированных массивов (memmap) блоками.
+    На каждом шаге отдаёт по куску из каждого источника — все ключи
+    не больше общей границы, так что одинаковые ключи попадают в один шаг.
+    """
+    pos = [0] * len(sources)
+    while True:
+        heads = [src[p:p + block] for src, p in zip(sources, pos)]
+        live = [h for h in heads if len(h)]
+        if not live:
+            return
+        cutoff = min(h[-1] for h in live)
+        parts = []
+        for i, h in enumerate(heads):
+            k = int(np.searchsorted(h, cutoff, side="right")) if len(h) else 0
+            parts.append(np.asarray(h[:k]))
+            pos[i] += k
+        yield parts
+
+
+class _Runs:
+    """
+    Копит преемники слоя и сбрасывает их на диск отсортированными прогонами.
+    """
+
+    def __init__(self, workdir: Path, W: int, run_states: int):
+        self.workdir, self.W, self.run_states = workdir, W, run_states
+        self.pending: List[np.ndarray] = []
+        self.count = 0
+        self.paths: List[Path] = []
+
+    def add(self, keys: np.ndarray):
+        self.pending.append(keys)
+        self.count += len(keys)
+        if self.count >= self.run_states:
+            self.flush()
+
+    def flush(self):
+        if not self.count:
+            return
+        run = np.unique(np.concatenate(self.pending))
+        path = self.workdir / f"run_{len(self.paths):04d}.bin"
+        run.tofile(path)
+        self.paths.append(path)
+        self.pending, self.count = [], 0
+
+    def open(self) -> List[np.ndarray]:
+        self.flush()
+        return [open_keys(p, self.W) for p in self.paths]
+
+    def remove(self):
+        for p in self.paths:
+            p.unlink()
+        self.paths = []
+
+
+def _find_path(start: State, goal: State, layers: List[Path], N: int, L: int) -> List[List[int]]:
+    W = key_width(N, L)
+    chain = [goal]
+    cur = goal
+    for path in reversed(layers[1:]):
+        layer = open_keys(path, W)
+        prevs = [canonical(p) for _, p in inverse_pours(cur)]
+        keys = encode(prevs, N, L)
+        idx = np.minimum(np.searchsorted(layer, keys), len(layer) - 1)
+        hit = np.flatnonzero(layer[idx] == keys)
+        if not len(hit):
+            raise RuntimeError("Нет предшественника в слое — файлы слоёв повреждены")
+        cur = prevs[hit[0]]
+        chain.append(cur)
+
+    moves = []
+    state = start
+    for target in reversed(chain):
+        for move, nxt in successors(state):
+            if canonical(nxt) == target:
+                moves.append(list(move))
+                state = nxt
+                break
+        else:
+            raise RuntimeError("Не удалось восстановить ход по канонической цепочке")
+    return moves
+
+
+def external_bfs(state: Sequence[Sequence[int]], workdir: Optional[str] = None,
+                 max_states: Optional[int] = None, max_depth: int = 1000,
+                 run_states: int = RUN_STATES, block: int = BLOCK,
+                 stats: Optional[Dict] = None) -> Optional[List[List[int]]]:
+    """
+    Кратчайшее решение списком ходов [[from, to], …] или None, если решения нет
+    (или оно не найдено до max_states посещённых состояний / max_depth ходов).
+    Временные файлы создаются в workdir (по умолчанию системный tmp) и удаляются.
+    Если передан stats, в него пишутся layers (размеры слоёв), visited,
+    disk_mb (пик на диске), seconds и result (solved | unsolvable | limit).
+    """
+    t0 = time.perf_counter()
+    start = to_state(state)
+    N, L = len(start), len(start[0])
+    if max(c for tube in start for c in tube) >= 15:
+        raise ValueError("Ключ хранит цвет в 4 битах: поддерживается не больше 15 цветов")
+    W = key_width(N, L)
+    info: Dict = {"layers": [1], "visited": 1, "disk_mb": 0.0, "result": "unsolvable"}
+
+    tmp = Path(tempfile.mkdtemp(prefix="external_bfs_", dir=workdir))
+    try:
+        result: Optional[List[List[int]]] = None
+        if is_solved(start):
+            result = []
+            info["result"] = "solved"
+        else:
+            first = encode([canonical(start)], N, L)
+            layers = [tmp / "layer_0000.bin"]
+            first.tofile(layers[0])
+            visited_path = tmp / "visited_0000.bin"
+            first.tofile(visited_path)
+            goal = None
+
+            for depth in range(1, max_depth + 1):
+                runs = _Runs(tmp, W, run_states)
+                layer = open_keys(layers[-1], W)
+                for i in range(0, len(layer), block):
+                    children = []
+                    for cur in decode(layer[i:i + block], N, L):
+                        for _, nxt in successors(cur):
+                            nxt = canonical(nxt)
+                            if is_solved(nxt):
+                                goal = nxt
+                                break
+                            children.append(nxt)
+                        if goal is not None:
+                            break
+                    if goal is not None:
+                        break
+                    if children:
+                        runs.add(encode(children, N, L))
+                if goal is not None:
+                    runs.remove()
+                    result = _find_path(start, goal, layers, N, L)
+                    info["result"] = "solved"
+                    break
+
+                # слияние: новые ключи → слой depth, объединение → посещённые
+                new_path = tmp / f"layer_{depth:04d}.bin"
+                next_visited = tmp / f"visited_{depth:04d}.bin"
+                visited = open_keys(visited_path, W)
+                added = 0
+                with open(new_path, "wb") as f_new, open(next_visited, "wb") as f_vis:
+                    for parts in merge_blocks([visited] + runs.open(), block):
+                        seen = parts[0]
+                        cand = np.unique(np.concatenate(parts[1:])) if len(parts) > 1 else seen[:0]
+                        new = np.setdiff1d(cand, seen, assume_unique=True)
+                        new.tofile(f_new)
+                        merged = np.concatenate([seen, new])
+                        merged.sort()
+                        merged.tofile(f_vis)
+                        added += len(new)
+                disk = sum(p.stat().st_size for p in tmp.iterdir())
+                info["disk_mb"] = max(info["disk_mb"], disk / 2**20)
+                del visited
+                runs.remove()
+                visited_path.unlink()
+                visited_path = next_visited
+
+                info["layers"].append(added)
+                info["visited"] += added
+                layers.append(new_path)
+                if not added:
+                    break
+                if max_states is not None and info["visited"] >= max_states:
+                    info["result"] = "limit"
+                    break
+            else:
+                info["result"] = "limit"
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    info["seconds"] = time.perf_counter() - t0
+    if stats is not None:
+        stats.update(info)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BFS с фронтом и посещёнными на диске")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--state", help="JSON: список пробирок, индекс 0 — верх, -1 — пусто")
+    group.add_argument("--random", metavar="N_K_L", help="случайный уровень WaterSortEnvFixed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="каталог для временных файлов")
+    parser.add_argument("--max-states", type=int)
+    parser.add_argument("--run-states", type=int, default=RUN_STATES)
+    parser.add_argument("--block", type=int, default=BLOCK)
+    args = parser.parse_args()
+
+    if args.state:
+        state = json.loads(args.state)
+    else:
+        from ai_functions.water_sort_env import WaterSortEnvFixed
+        N, K, L = map(int, args.random.split("_"))
+        env = WaterSortEnvFixed(num_tubes=N, max_layers=L, num_empty=K, num_colors=N - K)
+        obs, _ = env.reset(seed=args.seed)
+        state = obs.reshape(N, L).tolist()
+        print(json.dumps(state))
+
+    stats: Dict = {}
+    path = external_bfs(state, args.workdir, args.max_states,
+                        run_states=args.run_states, block=args.block, stats=stats)
+    print(f'{stats["result"]}: ходов {len(path) if path is not None else "—"}, '
+          f'посещено {stats["visited"]}, слоёв {len(stats["layers"])}, '
+          f'диск {stats["disk_mb"]:.1f} MB, {stats["seconds"]:.1f}s')
+    if path is not None:
+        print(json.dumps(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,55 @@
 #!/usr/bin/env python3
-from pathlib import Path
 import os
-import random
-from typing import List, Dict
+from typing import Callable, Dict, List, Optional
 
-import numpy as np
-import torch
+from ai_functions.solver     import create_env, get_agent
+from ai_functions.rollout    import play
+from ai_functions.solution_optimizer import OPTIMIZE_SOLUTIONS, shorten
+from ai_functions.difficulty import estimate_steps
+from ai_functions            import metrics, scheduler
+
+# предсказание линейной модели отсеивает кандидатов, только если прогоны с тем же
+# предсказанием (при текущем наборе открытых корзин, не меньше MIN_SAMPLES)
+# попадали в открытые корзины реже, чем MIN_LIFT от доли попаданий всех прогонов;
+# каждый EXPLORE_EVERY‑й такой кандидат всё равно прогоняется, чтобы статистика жила
+PREFILTER_MIN_SAMPLES   = 20
+PREFILTER_MIN_LIFT      = 0.5
+PREFILTER_EXPLORE_EVERY = 10
+
+
+def _setup(model: str):
+    try:
+        N, K, L = map(int, model.split("_")) # N-Число пробирок, K-сколько пустых, L - Число слоёв
+    except ValueError:
+        raise RuntimeError(f"Некорректное имя модели: {model}")
+
+    max_steps  = int(os.getenv("MAX_STEPS_PER_GAME", 100))
+    mode       = os.getenv("GENERATION_MODE", "random")
+    if mode not in ("random", "scramble"):
+        raise RuntimeError(f"Неизвестный GENERATION_MODE: {mode}")
+    reset_opts = {"scramble_depth": int(os.getenv("SCRAMBLE_DEPTH", 2 * N))} if mode == "scramble" else None
+
+    env   = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K, max_steps=max_steps)
+    agent = get_agent(model, env, N)
+    return N, L, max_steps, reset_opts, env, agent
+
+
+def _rollout(model, env, agent, obs, initial, N, max_steps, known):
+    scheduler.checkpoint()        # между эпизодами уступаем подсказкам игрокам
+    done, actions, outcome = play(agent, env, obs, N, env.unwrapped.max_layers, max_steps)
+    steps = len(actions)
+
+    metrics.ROLLOUT_STEPS.observe(steps, model=model, source="generate")
+    metrics.SOLVE_OUTCOMES.inc(model=model, source="generate", outcome=outcome)
+
+    if known is not None and (not done or len(known) < steps):
+        done, steps, actions = True, len(known), known
+    if done and OPTIMIZE_SOLUTIONS:
+        actions = shorten(initial, actions)
+        metrics.SOLUTION_STEPS_SAVED.inc(steps - len(actions), model=model, source="generate")
+        steps = len(actions)
+    return done, steps, actions
 
-from ai_functions.water_sort_env import WaterSortEnvFixed, DiscreteActionWrapper
-from ai_functions.dqn_agent       import MaskedDQNAgent
 
 def get_generated_levels(model: str, count: int) -> List[Dict]:
     """
@@ -20,42 +61,12 @@ def get_generated_levels(model: str, count: int) -> List[Dict]:
         "ai_steps":  int,               # сколько шагов до победы,
         "solution":  List[List[int]],   # список ходов [[from,to],…]
       }
-    """
-    try:
-        N, K, L = map(int, model.split("_")) # N-Число пробирок, K-сколько пустых, L - Число слоёв
-    except ValueError:
-        raise RuntimeError(f"Некорректное имя модели: {model}")
 
-    max_steps  = int(os.getenv("MAX_STEPS_PER_GAME", 100))
-    device     = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-    model_path = Path(__file__).parent / "ai_models" / f"{model}.pth"
-    if not model_path.exists():
-        raise RuntimeError(f"Модель не найдена: {model_path}")
-
-    num_colors = N - K
-    base_env = WaterSortEnvFixed(
-        num_tubes = N,
-        max_layers= L,
-        num_empty=K,
-        num_colors= num_colors,
-        max_steps = max_steps
-    )
-    env = DiscreteActionWrapper(base_env)
-
-    obs_dim = env.observation_space.shape[0]
-    act_dim = env.action_space.n
-    net_arch = [(N*(N-1))*25, (N*(N-1))*10]
-
-    agent = MaskedDQNAgent(
-        state_dim = obs_dim,
-        action_dim= act_dim,
-        net_arch = net_arch,
-        device   = device
-    )
-    agent.load_state_dict(torch.load(model_path, map_location=device))
-    agent.eval()
-    agent.epsilon = 0
+    GENERATION_MODE=scramble строит уровни обратным перемешиванием
+    на глубину SCRAMBLE_DEPTH (по умолчанию 2·N): каждый такой уровень решаем,
+    и если агент не справился или нашёл путь длиннее — берём развёрнутый путь.
+    """
+    N, L, max_steps, reset_opts, env, agent = _setup(model)
 
     results = []
     seen = set()
@@ -66,17 +77,11 @@ def get_generated_levels(model: str, count: int) -> List[Dict]:
         attempts += 1
         batch = max(count*2, 10)
         for _ in range(batch):
-            obs, _ = env.reset()
+            obs, _ = env.reset(options=reset_opts)
+            known = env.unwrapped.scramble_solution
             initial = obs.copy().reshape(N, L).tolist()
 
-            done=False; steps=0; actions=[]
-            while not done and steps < max_steps:
-                act = agent.sample_actions_masked(obs[None], env)[0]
-                actions.append([act//N, act%N])
-                obs, _, done, truncated, _ = env.step(act)
-                steps+=1
-                if truncated: break
-
+            done, steps, actions = _rollout(model, env, agent, obs, initial, N, max_steps, known)
             if not done: continue
 
             key = tuple(sum(initial, []))
@@ -94,3 +99,94 @@ def get_generated_levels(model: str, count: int) -> List[Dict]:
         raise RuntimeError(f"Собрано {len(results)}/{count} уровней после {attempts} попыток")
 
     return results
+
+
+def get_levels_by_quota(model: str,
+                        quotas: Dict[str, int],
+                        classify: Callable[[int], str],
+                        is_known: Optional[Callable[[List[List[int]]], bool]] = None) -> List[Dict]:
+    """
+    Генерирует уровни под квоты {сложность: сколько нужно}; сложность
+    уровня — classify(ai_steps), она же пишется в "difficulty".
+
+    Перед прогоном агента кандидат оценивается дёшево:
+      - уровень из scramble не может быть длиннее своего пути, поэтому
+        если все корзины до этой длины заполнены — пропускаем;
+      - линейная модель (difficulty.estimate_steps) предсказывает корзину;
+        если она заполнена, а прогоны с таким предсказанием попадали в
+        открытые корзины заметно реже, чем прогоны вообще, — пропускаем
+        (кроме каждого PREFILTER_EXPLORE_EVERY‑го). Доли считаются заново
+        для каждого набора открытых корзин: когда остаётся одна редкая
+        корзина, сравнение идёт с её собственной долей, а не с тем, как
+        заполнялись остальные. Внутри одной конфигурации модель различает
+        уровни слабо, поэтому без этих оговорок она отсекала бы всё подряд.
+    Останавливается, как только все квоты заполнены, или по исчерпании
+    того же бюджета прогонов, что у get_generated_levels (MAX_GENERATE_ATTEMPTS
+    батчей); в этом случае возвращает сколько успел — добирает вызывающий.
+    """
+    N, L, max_steps, reset_opts, env, agent = _setup(model)
+
+    filled = {d: 0 for d in quotas}
+    total = sum(quotas.values())
+    budget = int(os.getenv("MAX_GENERATE_ATTEMPTS", 5)) * max(total*2, 10)
+    scan_limit = budget * int(os.getenv("DIFFICULTY_SCAN_FACTOR", 10))
+
+    # набор открытых корзин → [прогонов, попаданий в открытую корзину];
+    # (набор, предсказанная корзина) → [прогонов, попаданий, пропущено подряд]
+    base: Dict[frozenset, List[int]] = {}
+    hits: Dict[tuple, List[int]] = {}
+    results = []
+    seen = set()
+    rollouts = 0
+
+    for _ in range(scan_limit):
+        open_buckets = {d for d, q in quotas.items() if filled[d] < q}
+        if not open_buckets or rollouts >= budget:
+            break
+
+        obs, _ = env.reset(options=reset_opts)
+        known = env.unwrapped.scramble_solution
+        initial = obs.copy().reshape(N, L).tolist()
+
+        key = tuple(sum(initial, []))
+        if key in seen or (is_known is not None and is_known(initial)):
+            continue
+
+        if known is not None and not {classify(s) for s in range(1, len(known) + 1)} & open_buckets:
+            metrics.GENERATE_SKIPPED.inc(model=model, reason="bound")
+            continue
+
+        predicted = classify(round(estimate_steps(initial, env)))
+        scope = frozenset(open_buckets)
+        total_stat = base.setdefault(scope, [0, 0])
+        stat = hits.setdefault((scope, predicted), [0, 0, 0])
+        # доля попаданий этого предсказания < MIN_LIFT · доля попаданий всех прогонов
+        if (predicted not in open_buckets and stat[0] >= PREFILTER_MIN_SAMPLES
+                and stat[1] * total_stat[0] < PREFILTER_MIN_LIFT * total_stat[1] * stat[0]):
+            if stat[2] < PREFILTER_EXPLORE_EVERY - 1:
+                stat[2] += 1
+                metrics.GENERATE_SKIPPED.inc(model=model, reason="estimate")
+                continue
+            stat[2] = 0
+
+        rollouts += 1
+        done, steps, actions = _rollout(model, env, agent, obs, initial, N, max_steps, known)
+        bucket = classify(steps) if done else None
+        hit = bucket in open_buckets
+        stat[0] += 1
+        stat[1] += hit
+        total_stat[0] += 1
+        total_stat[1] += hit
+        if bucket not in open_buckets:
+            continue
+
+        seen.add(key)
+        filled[bucket] += 1
+        results.append({
+            "state":      initial,
+            "ai_steps":   steps,
+            "solution":   actions,
+            "difficulty": bucket,
+        })
+
+    return results
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/hashing.py
+"""
+Ключи состояний уровней. Без зависимостей (только stdlib), чтобы api.py
+и level_reserve.py могли их считать, не импортируя psycopg2 / torch.
+"""
+import json
+import hashlib
+from typing import Sequence
+
+
+def fingerprint(state) -> str:
+    """
+    sha1 от канонического JSON состояния — тот же ключ, по которому
+    add_ai_level отсеивает дубли уровней.
+    """
+    norm = json.dumps(state, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha1(norm.encode()).hexdigest()
+
+
+def state_hash(state: Sequence[Sequence[int]]) -> str:
+    return fingerprint([[int(c) for c in tube] for tube in state])
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/import_report.py
+"""
+Отчёт о времени импорта модулей при старте AI‑сервиса.
+
+Запускает `python -X importtime -c "import <модуль>"` в отдельном процессе
+(кэш импортов текущего не мешает) и печатает общее время и самые дорогие
+модули: по совокупному времени прямых импортов (что тянет api) и по
+собственному времени (где это время реально тратится).
+
+  python -m ai_functions.import_report                      # ai_functions.api
+  python -m ai_functions.import_report ai_functions.solver --top 15
+"""
+import sys
+import time
+import argparse
+import subprocess
+from typing import List, NamedTuple, Tuple
+
+
+class ImportRow(NamedTuple):
+    self_us: int
+    cumulative_us: int
+    depth: int
+    name: str
+
+
+def parse_importtime(stderr: str) -> List[ImportRow]:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|")
+            depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+            rows.append(ImportRow(int(self_us), int(cum_us), depth, name.strip()))
+        except ValueError:
+            continue
+    return rows
+
+
+def measure(module: str) -> Tuple[float, List[ImportRow]]:
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        err = proc.stderr.strip().splitlines()
+        raise RuntimeError(f"Не удалось импортировать {module}: {err[-1] if err else proc.returncode}")
+    return wall, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта модулей AI‑сервиса")
+    parser.add_argument("module", nargs="?", default="ai_functions.api")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    wall, rows = measure(args.module)
+    top_level = [r for r in rows if r.depth == 0]
+    print(f"{args.module}: {sum(r.cumulative_us for r in top_level) / 1e6:.3f}s импорт, "
+          f"{wall:.3f}s с запуском интерпретатора, модулей: {len(rows)}")
+
+    heavy = {"torch", "gymnasium", "numpy", "psycopg2", "fastapi", "pydantic", "starlette"}
+    loaded = sorted(heavy & {r.name.split(".")[0] for r in rows})
+    print(f"тяжёлые зависимости: {', '.join(loaded) or '—'}")
+
+    print("\nпо совокупному времени (прямые импорты):")
+    for r in sorted((r for r in rows if r.depth == 1), key=lambda r: -r.cumulative_us)[:args.top]:
+        print(f"  {r.cumulative_us / 1000:9.1f} ms  {r.name}")
+    print("\nпо собственному времени:")
+    for r in sorted(rows, key=lambda r: -r.self_us)[:args.top]:
+        print(f"  {r.self_us / 1000:9.1f} ms  {r.name}")
+
+
+if __name__ == "__main__":
+    main()
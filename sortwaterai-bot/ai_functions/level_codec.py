@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/level_codec.py
+"""
+Компактное бинарное представление уровней и решений.
+
+"Levels".level_data (TEXT, {"state": [[…]]}) и solution (JSONB, [[from, to], …])
+остаются основными — их читает backend. Рядом лежат BYTEA‑копии, которые
+Python‑сторона читает на горячих путях вместо json.loads:
+
+  state_bin    – N, L, затем N × L ячеек по 4 бита (цвет + 1, 0 — пусто),
+                 пробирки подряд, индекс 0 — верх: 2 + ⌈N·L/2⌉ байт;
+  solution_bin – по байту на ход: from << 4 | to.
+
+Оба кодека ограничены 16 пробирками и 15 цветами; состояние, которое не
+кодируется (непрямоугольное, больше цветов), остаётся только в JSON —
+читатели сами откатываются на него (state_from_row / solution_from_row).
+
+Блоб читается вместо JSON, поэтому он обязан обнулиться при любой записи
+level_data / solution. Это делает триггер, который ставит migrate: UPDATE,
+меняющий JSON‑колонку и не трогающий её блоб, обнуляет блоб (следующий
+migrate его пересчитает, до тех пор читается JSON). Кто пишет напрямую, пусть
+либо пишет блоб сам, либо явно обнуляет его — на случай БД без триггера.
+
+Миграция (идемпотентна, можно повторять — дозаполнит новые строки):
+  python -m ai_functions.level_codec migrate [--batch 5000]
+  python -m ai_functions.level_codec stats
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from typing import List, Optional, Sequence
+
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_CFG = {
+    "dbname":   os.getenv("POSTGRES_DB"),
+    "user":     os.getenv("POSTGRES_USER"),
+    "password": os.getenv("POSTGRES_PASSWORD"),
+    "host":     os.getenv("POSTGRES_HOST", "localhost"),
+    "port":     int(os.getenv("POSTGRES_PORT", 5432)),
+}
+
+MAX_TUBES = 16
+MAX_COLORS = 15
+RECHECK_SECONDS = 60            # как часто перепроверять, не появились ли колонки
+
+
+# ─────────────────────────────── ходы ───────────────────────────────────
+
+def encode_moves(solution: Sequence[Sequence[int]]) -> np.ndarray:
+    moves = np.asarray(solution, dtype=np.uint8).reshape(-1, 2)
+    return (moves[:, 0] << 4) | moves[:, 1]
+
+
+def decode_moves(raw: np.ndarray) -> List[List[int]]:
+    raw = np.asarray(raw, dtype=np.uint8)
+    return np.stack([raw >> 4, raw & 0x0F], axis=1).tolist()
+
+
+def encode_solution(solution: Optional[Sequence[Sequence[int]]]) -> Optional[bytes]:
+    if solution is None:
+        return None
+    if any(not 0 <= c < MAX_TUBES for move in solution for c in move):
+        return None
+    return encode_moves(solution).tobytes()
+
+
+def decode_solution(blob: Optional[bytes]) -> Optional[List[List[int]]]:
+    if blob is None:
+        return None
+    # решения короткие: обход байтов быстрее, чем numpy
+    return [[b >> 4, b & 0x0F] for b in blob]
+
+
+# ───────────────────────────── состояния ────────────────────────────────
+
+def encode_state(state: Sequence[Sequence[int]]) -> Optional[bytes]:
+    """
+    Состояние → bytes или None, если его нельзя закодировать.
+    """
+    N = len(state)
+    L = len(state[0]) if N else 0
+    if not N or not L or N > MAX_TUBES or any(len(t) != L for t in state):
+        return None
+    cells = np.asarray(state, dtype=np.int16).ravel() + 1
+    if cells.min() < 0 or cells.max() > MAX_COLORS:
+        return None
+    if len(cells) % 2:
+        cells = np.append(cells, 0)
+    packed = (cells[0::2] << 4) | cells[1::2]
+    return bytes((N, L)) + packed.astype(np.uint8).tobytes()
+
+
+# байт → пара ячеек; на доске в десятки ячеек таблица быстрее numpy и json.loads
+_CELL_PAIRS = [((b >> 4) - 1, (b & 0x0F) - 1) for b in range(256)]
+
+
+def decode_state(blob: bytes) -> List[List[int]]:
+    N, L = blob[0], blob[1]
+    cells = [c for b in blob[2:] for c in _CELL_PAIRS[b]]
+    return [cells[i * L:(i + 1) * L] for i in range(N)]
+
+
+# ─────────────────────── чтение строк "Levels" ──────────────────────────
+
+def state_from_row(state_bin: Optional[bytes], level_data: Optional[str]) -> Optional[List[List[int]]]:
+    """
+    Состояние уровня: из state_bin, а если его нет — из JSON level_data.
+    """
+    if state_bin is not None:
+        return decode_state(bytes(state_bin))
+    if level_data is None:
+        return None
+    try:
+        return json.loads(level_data).get("state")
+    except (ValueError, AttributeError):
+        return None
+
+
+def solution_from_row(solution_bin: Optional[bytes], solution) -> Optional[List[List[int]]]:
+    if solution_bin is not None:
+        return decode_solution(bytes(solution_bin))
+    return solution
+
+
+_has_columns = False
+_checked_at = float("-inf")
+
+
+def has_blob_columns(cur) -> bool:
+    """
+    Есть ли в "Levels" колонки state_bin / solution_bin (прошла ли миграция).
+    Положительный ответ кэшируется навсегда, отрицательный — на RECHECK_SECONDS.
+    """
+    global _has_columns, _checked_at
+    if _has_columns or time.monotonic() - _checked_at < RECHECK_SECONDS:
+        return _has_columns
+    cur.execute("""
+        SELECT count(*) FROM information_schema.columns
+        WHERE table_name = 'Levels' AND column_name IN ('state_bin', 'solution_bin')
+    """)
+    _has_columns = cur.fetchone()[0] == 2
+    _checked_at = time.monotonic()
+    return _has_columns
+
+
+# ────────────────────────────── миграция ────────────────────────────────
+
+def ensure_columns(cur):
+    cur.execute('ALTER TABLE "Levels" ADD COLUMN IF NOT EXISTS state_bin BYTEA')
+    cur.execute('ALTER TABLE "Levels" ADD COLUMN IF NOT EXISTS solution_bin BYTEA')
+
+
+def ensure_trigger(cur):
+    """
+    Триггер, обнуляющий state_bin / solution_bin, когда UPDATE меняет
+    level_data / solution, а блоб оставляет прежним (устаревшим).
+    """
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION levels_reset_blobs() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.level_data IS DISTINCT FROM OLD.level_data
+               AND NEW.state_bin IS NOT DISTINCT FROM OLD.state_bin THEN
+                NEW.state_bin := NULL;
+            END IF;
+            IF NEW.solution IS DISTINCT FROM OLD.solution
+               AND NEW.solution_bin IS NOT DISTINCT FROM OLD.solution_bin THEN
+                NEW.solution_bin := NULL;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    cur.execute('DROP TRIGGER IF EXISTS levels_reset_blobs ON "Levels"')
+    cur.execute("""
+        CREATE TRIGGER levels_reset_blobs
+        BEFORE UPDATE OF level_data, solution ON "Levels"
+        FOR EACH ROW EXECUTE FUNCTION levels_reset_blobs()
+    """)
+
+
+def backfill(batch: int = 5000) -> int:
+    """
+    Заполняет state_bin / solution_bin там, где их ещё нет (и где есть что кодировать).
+    Пачками по id; каждая пачка — своя транзакция. Возвращает число обновлённых строк.
+    """
+    conn = psycopg2.connect(**DB_CFG)
+    cur = conn.cursor()
+    ensure_columns(cur)
+    ensure_trigger(cur)
+    conn.commit()
+
+    total = skipped = 0
+    last_id = 0
+    while True:
+        cur.execute("""
+            SELECT id, level_data, solution, state_bin IS NULL, solution_bin IS NULL
+            FROM "Levels"
+            WHERE id > %s AND ((state_bin IS NULL AND level_data IS NOT NULL)
+                            OR (solution_bin IS NULL AND solution IS NOT NULL))
+            ORDER BY id
+            LIMIT %s
+        """, (last_id, batch))
+        rows = cur.fetchall()
+        if not rows:
+            break
+        updates = []
+        for level_id, level_data, solution, need_state, need_solution in rows:
+            state_bin = encode_state(state_from_row(None, level_data) or []) if need_state else None
+            solution_bin = encode_solution(solution) if need_solution else None
+            if state_bin is None and solution_bin is None:
+                skipped += 1
+                continue
+            updates.append((level_id, state_bin and psycopg2.Binary(state_bin),
+                            solution_bin and psycopg2.Binary(solution_bin)))
+        if updates:
+            execute_values(cur, """
+                UPDATE "Levels" AS l
+                SET state_bin    = COALESCE(l.state_bin, v.state_bin),
+                    solution_bin = COALESCE(l.solution_bin, v.solution_bin)
+                FROM (VALUES %s) AS v (id, state_bin, solution_bin)
+                WHERE l.id = v.id
+            """, updates, template="(%s, %s::bytea, %s::bytea)")
+        conn.commit()
+        total += len(updates)
+        last_id = rows[-1][0]
+        print(f"… до id={last_id}: {total} строк")
+
+    cur.close()
+    conn.close()
+    if skipped:
+        print(f"⚠️  Не закодировано (остались только в JSON): {skipped}", file=sys.stderr)
+    return total
+
+
+def stats():
+    conn = psycopg2.connect(**DB_CFG)
+    cur = conn.cursor()
+    if not has_blob_columns(cur):
+        print('Колонок state_bin / solution_bin нет — запустите migrate')
+        return
+    cur.execute("""
+        SELECT count(*),
+               count(state_bin), count(solution), count(solution_bin),
+               coalesce(sum(pg_column_size(level_data)), 0),
+               coalesce(sum(pg_column_size(state_bin)), 0),
+               coalesce(sum(pg_column_size(solution)), 0),
+               coalesce(sum(pg_column_size(solution_bin)), 0)
+        FROM "Levels"
+    """)
+    n, n_state, n_sol, n_sol_bin, text_b, state_b, json_b, sol_b = cur.fetchone()
+    cur.close()
+    conn.close()
+    print(f"уровней: {n}, state_bin: {n_state}, solution: {n_sol}, solution_bin: {n_sol_bin}")
+    print(f"level_data {text_b / 1024:.1f} KB → state_bin {state_b / 1024:.1f} KB")
+    print(f"solution   {json_b / 1024:.1f} KB → solution_bin {sol_b / 1024:.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BYTEA‑копии level_data / solution в \"Levels\"")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("migrate", help="добавить колонки и триггер, заполнить колонки")
+    p.add_argument("--batch", type=int, default=5000)
+    sub.add_parser("stats", help="заполненность и размеры колонок")
+    args = parser.parse_args()
+
+    if args.cmd == "migrate":
+        print(f"✅  Обновлено строк: {backfill(args.batch)}")
+    else:
+        stats()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/level_dataset.py
+"""
+Колоночный формат наборов уровней на диске вместо pickle.
+
+Набор — каталог с отдельным файлом на колонку; каждый открывается через
+np.memmap, поэтому открыть набор из миллионов уровней — это прочитать
+meta.json, а уровень i читается с диска только когда к нему обратились.
+
+  meta.json        – {"version", "width", "count", "difficulties"}
+  states.bin       – int8 [count, width]: N × L ячеек построчно (индекс 0 — верх,
+                     -1 — пусто), хвост строки до width заполнен -1
+  config.bin       – uint8 [count, 3]: N, K, L
+  ai_steps.bin     – int16 [count], -1 — неизвестно
+  difficulty.bin   – int8 [count]: индекс в meta["difficulties"], -1 — нет
+  sol_offsets.bin  – int64 [count + 1]: решение уровня i — moves[off[i]:off[i+1]]
+  moves.bin        – uint8: ход from→to одним байтом (from << 4 | to)
+
+append дописывает колонки в конец файлов, а count в meta.json обновляет
+последним (через временный файл и os.replace): читатель, открывший набор
+раньше или во время записи, видит только целиком записанные уровни, а хвост
+прерванной записи следующий append отрезает.
+
+  python -m ai_functions.level_dataset convert level_reserve/*.jsonl levels.ds
+  python -m ai_functions.level_dataset convert experiments/data/levels.pkl big.ds --width 56
+  python -m ai_functions.level_dataset info levels.ds
+"""
+import os
+import sys
+import json
+import pickle
+import argparse
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from ai_functions.level_codec import encode_moves, decode_moves
+
+VERSION = 1
+WIDTH = 35                      # ячеек на строку: 7 × 5 — все конфигурации ai_models; больше — --width
+MAX_TUBES = 16                  # ход хранится в одном байте: 4 бита на пробирку
+
+COLUMNS = {
+    "states":      np.int8,
+    "config":      np.uint8,
+    "ai_steps":    np.int16,
+    "difficulty":  np.int8,
+    "sol_offsets": np.int64,
+    "moves":       np.uint8,
+}
+
+
+class LevelDataset:
+    """
+    Набор уровней в каталоге path. Только чтение, пока не вызван append.
+
+      ds = LevelDataset("levels.ds")
+      len(ds), ds[i]                      # {"state", "solution", "ai_steps", "difficulty", "level_format"}
+      ds.state(i), ds.solution(i)
+      ds.indices("7_2_4")                 # номера уровней конфигурации
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "meta.json", "r") as fp:
+            self.meta = json.load(fp)
+        if self.meta["version"] != VERSION:
+            raise RuntimeError(f"Неизвестная версия набора уровней: {self.meta['version']}")
+        self.width = self.meta["width"]
+        self.difficulties: List[str] = self.meta["difficulties"]
+        self._open()
+
+    @classmethod
+    def create(cls, path, width: int = WIDTH) -> "LevelDataset":
+        path = Path(path)
+        if (path / "meta.json").exists():
+            raise RuntimeError(f"Набор уровней уже существует: {path}")
+        path.mkdir(parents=True, exist_ok=True)
+        for name in COLUMNS:
+            (path / f"{name}.bin").write_bytes(b"")
+        np.zeros(1, dtype=np.int64).tofile(path / "sol_offsets.bin")
+        _write_meta(path, {"version": VERSION, "width": width, "count": 0, "difficulties": []})
+        return cls(path)
+
+    def _column(self, name: str, shape) -> np.ndarray:
+        dtype = COLUMNS[name]
+        if not np.prod(shape):
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self.path / f"{name}.bin", dtype=dtype, mode="r", shape=shape)
+
+    def _open(self):
+        n = self.count = self.meta["count"]
+        self.states = self._column("states", (n, self.width))
+        self.config = self._column("config", (n, 3))
+        self.ai_steps = self._column("ai_steps", (n,))
+        self.difficulty = self._column("difficulty", (n,))
+        self.sol_offsets = self._column("sol_offsets", (n + 1,))
+        self.moves = self._column("moves", (int(self.sol_offsets[-1]),))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def level_format(self, i: int) -> str:
+        return "_".join(str(int(x)) for x in self.config[i])
+
+    def state(self, i: int) -> np.ndarray:
+        N, _, L = (int(x) for x in self.config[i])
+        return np.asarray(self.states[i, :N * L]).reshape(N, L)
+
+    def solution(self, i: int) -> Optional[List[List[int]]]:
+        lo, hi = self.sol_offsets[i], self.sol_offsets[i + 1]
+        if lo == hi and self.ai_steps[i] != 0:
+            return None                       # решения нет (или оно не сохранено)
+        return decode_moves(self.moves[lo:hi])
+
+    def __getitem__(self, i: int) -> Dict:
+        if not -self.count <= i < self.count:
+            raise IndexError(i)
+        i %= self.count
+        d = int(self.difficulty[i])
+        steps = int(self.ai_steps[i])
+        return {
+            "state":        self.state(i).tolist(),
+            "solution":     self.solution(i),
+            "ai_steps":     steps if steps >= 0 else None,
+            "difficulty":   self.difficulties[d] if d >= 0 else None,
+            "level_format": self.level_format(i),
+        }
+
+    def indices(self, level_format: str) -> np.ndarray:
+        cfg = np.array([int(x) for x in level_format.split("_")], dtype=np.uint8)
+        return np.flatnonzero((self.config == cfg).all(axis=1))
+
+    def append(self, levels: Iterable[Dict]) -> int:
+        """
+        Дописывает уровни ({"state", "solution"?, "ai_steps"?, "difficulty"?,
+        "level_format"?}); формат по умолчанию берётся из state (K — число
+        пустых пробирок). Возвращает число добавленных.
+        """
+        levels = list(levels)
+        if not levels:
+            return 0
+        n = len(levels)
+        states = np.full((n, self.width), -1, dtype=np.int8)
+        config = np.zeros((n, 3), dtype=np.uint8)
+        ai_steps = np.full(n, -1, dtype=np.int16)
+        difficulty = np.full(n, -1, dtype=np.int8)
+        lengths = np.zeros(n, dtype=np.int64)
+        moves = []
+        difficulties = list(self.difficulties)
+
+        for j, lvl in enumerate(levels):
+            st = np.asarray(lvl["state"], dtype=np.int8)
+            N, L = st.shape
+            if N > MAX_TUBES or N * L > self.width:
+                raise ValueError(f"Уровень {N}×{L} не помещается в набор (width={self.width}, "
+                                 f"создайте набор с --width {N * L})")
+            fmt = lvl.get("level_format")
+            K = int(fmt.split("_")[1]) if fmt else int((st == -1).all(axis=1).sum())
+            states[j, :N * L] = st.ravel()
+            config[j] = (N, K, L)
+            if lvl.get("ai_steps") is not None:
+                ai_steps[j] = lvl["ai_steps"]
+            if lvl.get("difficulty") is not None:
+                if lvl["difficulty"] not in difficulties:
+                    difficulties.append(lvl["difficulty"])
+                difficulty[j] = difficulties.index(lvl["difficulty"])
+            if lvl.get("solution") is not None:
+                m = encode_moves(lvl["solution"])
+                moves.append(m)
+                lengths[j] = len(m)
+
+        offsets = self.sol_offsets[-1] + np.cumsum(lengths)
+        columns = {
+            "states": states, "config": config, "ai_steps": ai_steps,
+            "difficulty": difficulty, "sol_offsets": offsets,
+            "moves": np.concatenate(moves) if moves else np.empty(0, dtype=np.uint8),
+        }
+        committed = {
+            "states": self.count * self.width, "config": self.count * 3,
+            "ai_steps": self.count, "difficulty": self.count,
+            "sol_offsets": self.count + 1, "moves": int(self.sol_offsets[-1]),
+        }
+        for name, data in columns.items():
+            with open(self.path / f"{name}.bin", "r+b") as fp:
+                # хвост прерванного append (count его не покрывает) затираем
+                fp.truncate(committed[name] * np.dtype(COLUMNS[name]).itemsize)
+                fp.seek(0, os.SEEK_END)
+                data.astype(COLUMNS[name], copy=False).tofile(fp)
+                fp.flush()
+                os.fsync(fp.fileno())
+
+        self.meta = dict(self.meta, count=self.count + n, difficulties=difficulties)
+        _write_meta(self.path, self.meta)
+        self.difficulties = difficulties
+        self._open()
+        return n
+
+
+def _write_meta(path: Path, meta: Dict):
+    tmp = path / "meta.json.tmp"
+    with open(tmp, "w") as fp:
+        json.dump(meta, fp, indent=2)
+    os.replace(tmp, path / "meta.json")
+
+
+# ─────────────────────────── конвертация ────────────────────────────────
+
+def read_pickle(path) -> List[Dict]:
+    """
+    Уровни из pickle: DataFrame (нужен pandas) или список словарей.
+    """
+    try:
+        import pandas as pd
+        obj = pd.read_pickle(path)
+    except ImportError:
+        with open(path, "rb") as fp:
+            try:
+                obj = pickle.load(fp)
+            except ImportError as e:
+                raise RuntimeError(f"{path}: для чтения нужен {e.name}") from e
+    if hasattr(obj, "to_dict"):
+        obj = obj.to_dict("records")
+    rows = list(obj)
+    if rows and "state" not in rows[0]:
+        raise RuntimeError(f"{path}: в строках нет колонки state "
+                           f"(есть {', '.join(map(str, rows[0]))}) — уровни не восстановить")
+    return rows
+
+
+def read_jsonl(path) -> List[Dict]:
+    """
+    Уровни из jsonl (формат level_reserve.py); level_format — имя файла N_K_L.
+    """
+    path = Path(path)
+    fmt = path.stem if len(path.stem.split("_")) == 3 else None
+    rows = []
+    with open(path, "r") as fp:
+        for line in fp:
+            if line.strip():
+                row = json.loads(line)
+                row.setdefault("level_format", fmt)
+                rows.append(row)
+    return rows
+
+
+def convert(sources: Sequence[str], out: str, width: int = WIDTH) -> LevelDataset:
+    out_path = Path(out)
+    ds = LevelDataset(out_path) if (out_path / "meta.json").exists() else LevelDataset.create(out_path, width)
+    for src in sources:
+        rows = read_jsonl(src) if src.endswith(".jsonl") else read_pickle(src)
+        added = ds.append(rows)
+        print(f"{src}: {added} уровней")
+    return ds
+
+
+def info(ds: LevelDataset):
+    formats, counts = np.unique(np.asarray(ds.config), axis=0, return_counts=True) \
+        if len(ds) else (np.empty((0, 3)), np.empty(0))
+    size = sum(p.stat().st_size for p in ds.path.iterdir())
+    print(f"{ds.path}: {len(ds)} уровней, {size / 2**20:.1f} MB, "
+          f"решений: {int(ds.sol_offsets[-1])} ходов")
+    for cfg, cnt in zip(formats, counts):
+        print(f"  {'_'.join(map(str, cfg)):>7}: {cnt}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Наборы уровней в колоночном формате (memmap)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("convert", help="pickle / jsonl → набор (дописывает, если он уже есть)")
+    p.add_argument("sources", nargs="+")
+    p.add_argument("out")
+    p.add_argument("--width", type=int, default=WIDTH)
+    p = sub.add_parser("info")
+    p.add_argument("path")
+    args = parser.parse_args()
+
+    try:
+        if args.cmd == "convert":
+            info(convert(args.sources, args.out, args.width))
+        else:
+            info(LevelDataset(args.path))
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/level_reserve.py
+"""
+Запас заранее сгенерированных уровней на диске — по файлу на модель N_K_L.
+
+  <LEVEL_RESERVE_DIR>/<N_K_L>.jsonl   – строка = {"state", "ai_steps", "solution", "fingerprint",
+                                        "lease"?: {"pid", "until"}} (см. lease)
+  <LEVEL_RESERVE_DIR>/<N_K_L>.lock    – fcntl‑блокировка на время чтения/записи
+
+Файл всегда переписывается целиком через временный файл и os.replace,
+поэтому читатель никогда не видит половину записи. Каталог должен быть
+доступен на запись (в docker — отдельный том: ai_functions смонтирован read‑only).
+
+Сложность не хранится: её считает при выдаче тот, кто берёт уровни
+(STEPS_THRESHOLDS могут поменяться, пока уровни лежат в запасе).
+
+ReserveProducer — фоновый поток внутри AI‑сервиса: в простое (нет
+запросов в работе, см. scheduler.py) догенерирует запас каждой модели
+до RESERVE_HIGH_WATER, как только он опустился ниже RESERVE_LOW_WATER.
+
+CLI:
+  python -m ai_functions.level_reserve status
+  python -m ai_functions.level_reserve fill 7_2_4 5_2_4 --target 500
+"""
+import os
+import sys
+import json
+import time
+import fcntl
+import argparse
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from ai_functions import metrics, scheduler
+from ai_functions.hashing import fingerprint
+
+MODELS_DIR  = Path(__file__).parent / "ai_models"
+RESERVE_DIR = Path(os.getenv("LEVEL_RESERVE_DIR", Path(__file__).parent.parent / "level_reserve"))
+
+LEVEL_RESERVE = os.getenv("LEVEL_RESERVE", "0") == "1"
+HIGH_WATER    = int(os.getenv("RESERVE_HIGH_WATER", 200))
+LOW_WATER     = int(os.getenv("RESERVE_LOW_WATER", HIGH_WATER // 2))
+BATCH         = int(os.getenv("RESERVE_BATCH", 20))
+IDLE_SECONDS  = float(os.getenv("RESERVE_IDLE_SECONDS", 5))
+LEASE_SECONDS = float(os.getenv("RESERVE_LEASE_SECONDS", 600))   # срок аренды выданных уровней
+
+
+def reserve_models() -> List[str]:
+    env = os.getenv("RESERVE_MODELS")
+    if env:
+        return [m.strip() for m in env.split(",") if m.strip()]
+    return sorted(p.stem for p in MODELS_DIR.glob("*.pth"))
+
+
+def reserve_path(model_name: str) -> Path:
+    return RESERVE_DIR / f"{model_name}.jsonl"
+
+
+@contextmanager
+def _locked(model_name: str):
+    RESERVE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(RESERVE_DIR / f"{model_name}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read(model_name: str) -> List[Dict]:
+    path = reserve_path(model_name)
+    if not path.exists():
+        return []
+    with open(path, "r") as fp:
+        return [json.loads(line) for line in fp if line.strip()]
+
+
+def _write(model_name: str, levels: Iterable[Dict]):
+    path = reserve_path(model_name)
+    tmp = path.with_suffix(".jsonl.tmp")
+    with open(tmp, "w") as fp:
+        for lvl in levels:
+            fp.write(json.dumps(lvl, separators=(",", ":")) + "\n")
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp, path)
+
+
+def size(model_name: str) -> int:
+    path = reserve_path(model_name)
+    if not path.exists():
+        return 0
+    with open(path, "rb") as fp:
+        return sum(1 for line in fp if line.strip())
+
+
+def add(model_name: str, levels: List[Dict]) -> int:
+    """
+    Дописывает уровни в запас (без дублей). Возвращает, сколько добавлено.
+    """
+    with _locked(model_name):
+        current = _read(model_name)
+        have = {lvl["fingerprint"] for lvl in current}
+        fresh = []
+        for lvl in levels:
+            fph = fingerprint(lvl["state"])
+            if fph in have:
+                continue
+            have.add(fph)
+            fresh.append({
+                "state":       lvl["state"],
+                "ai_steps":    int(lvl["ai_steps"]),
+                "solution":    [[int(a), int(b)] for a, b in lvl["solution"]],
+                "fingerprint": fph,
+            })
+        if fresh:
+            _write(model_name, current + fresh)
+    return len(fresh)
+
+
+def lease(model_name: str,
+          classify: Callable[[int], str],
+          quotas: Optional[Dict[str, int]] = None,
+          count: Optional[int] = None,
+          exclude: Optional[Set[str]] = None) -> List[Dict]:
+    """
+    Выдаёт уровни из запаса: либо под квоты {сложность: сколько},
+    либо просто `count` штук. Выданные помечаются арендой (pid, срок) под
+    той же блокировкой, что и выбор, — параллельный lease (другой воркер,
+    CLI) их уже не получит. Из файла уровни уходят только через discard,
+    после коммита в БД; release или истечение LEASE_SECONDS возвращают
+    их в оборот, так что упавшая вставка или процесс уровни не теряют.
+    Уровни из exclude (уже есть в БД) выбрасываются из запаса насовсем.
+    У выданных проставлен "difficulty".
+    """
+    exclude = exclude or set()
+    need = dict(quotas) if quotas is not None else None
+    now = time.time()
+    picked, keep = [], []
+    with _locked(model_name):
+        current = _read(model_name)
+        for lvl in current:
+            if lvl["fingerprint"] in exclude:
+                continue
+            keep.append(lvl)
+            if lvl.get("lease", {}).get("until", 0) > now:
+                continue                     # арендован кем‑то ещё
+            diff = classify(lvl["ai_steps"])
+            if need is not None:
+                wanted = need.get(diff, 0) > 0
+            else:
+                wanted = len(picked) < (count or 0)
+            if wanted:
+                lvl["lease"] = {"pid": os.getpid(), "until": now + LEASE_SECONDS}
+                picked.append({k: v for k, v in lvl.items() if k != "lease"} | {"difficulty": diff})
+                if need is not None:
+                    need[diff] -= 1
+        if picked or len(keep) != len(current):
+            _write(model_name, keep)
+    return picked
+
+
+def release(model_name: str, fingerprints: Set[str]) -> int:
+    """
+    Снимает аренду с ещё лежащих в запасе уровней (вставка не удалась,
+    уровень оказался лишним). Возвращает, скольким снята.
+    """
+    released = 0
+    with _locked(model_name):
+        current = _read(model_name)
+        for lvl in current:
+            if lvl["fingerprint"] in fingerprints and lvl.pop("lease", None) is not None:
+                released += 1
+        if released:
+            _write(model_name, current)
+    return released
+
+
+def discard(model_name: str, fingerprints: Set[str]) -> int:
+    """
+    Убирает из запаса уровни (по fingerprint), уже закоммиченные в БД.
+    Возвращает, сколько убрано.
+    """
+    with _locked(model_name):
+        current = _read(model_name)
+        keep = [lvl for lvl in current if lvl["fingerprint"] not in fingerprints]
+        if len(keep) != len(current):
+            _write(model_name, keep)
+    return len(current) - len(keep)
+
+
+def refill(model_name: str, target: int = HIGH_WATER, batch: int = BATCH,
+           should_pause: Callable[[], bool] = lambda: False) -> int:
+    """
+    Догенерирует запас модели до target. Между батчами проверяет should_pause,
+    чтобы уступать процессор запросам. Возвращает, сколько добавлено.
+    """
+    from ai_functions.get_generated_levels import get_generated_levels
+
+    added = 0
+    while size(model_name) < target and not should_pause():
+        try:
+            levels = get_generated_levels(model_name, min(batch, target - size(model_name)))
+        except RuntimeError as e:
+            # часть батча не собралась — берём то, что есть в следующий раз
+            print(f"⚠️  Reserve {model_name}: {e}", file=sys.stderr)
+            break
+        n = add(model_name, levels)
+        if not n:
+            break                    # одни дубли — пространство уровней исчерпано
+        added += n
+    return added
+
+
+def _sizes() -> Dict[metrics.LabelKey, float]:
+    return {metrics._key({"model": m}): size(m) for m in reserve_models() if reserve_path(m).exists()}
+
+
+metrics.REGISTRY.register(metrics.Gauge(
+    "ai_level_reserve_levels", "Уровней в запасе на диске", _sizes))
+
+
+# ------------------------- background producer -----------------------------
+class ReserveProducer(threading.Thread):
+    def __init__(self, models: Optional[List[str]] = None):
+        super().__init__(name="level-reserve", daemon=True)
+        self.models = models or reserve_models()
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            for model in self.models:
+                if self._stopping.is_set():
+                    return
+                if scheduler.is_busy() or size(model) >= LOW_WATER:
+                    continue
+                try:
+                    n = refill(model, HIGH_WATER, BATCH,
+                               should_pause=lambda: scheduler.is_busy() or self._stopping.is_set())
+                    if n:
+                        print(f"📦 Reserve {model}: +{n} → {size(model)}")
+                except Exception as e:
+                    print(f"❌ Reserve {model}: {e}", file=sys.stderr)
+            self._stopping.wait(IDLE_SECONDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запас сгенерированных уровней")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="размер запаса по моделям")
+    fill = sub.add_parser("fill", help="догенерировать запас")
+    fill.add_argument("models", nargs="*", help="N_K_L (по умолчанию RESERVE_MODELS или все ai_models/*.pth)")
+    fill.add_argument("--target", type=int, default=HIGH_WATER)
+    fill.add_argument("--batch", type=int, default=BATCH)
+    args = parser.parse_args()
+
+    if args.cmd == "status":
+        for model in reserve_models():
+            print(f"{model:>6}: {size(model)}")
+        return
+
+    for model in args.models or reserve_models():
+        t0 = time.perf_counter()
+        n = refill(model, args.target, args.batch)
+        print(f"{model:>6}: +{n} → {size(model)} ({time.perf_counter() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/level_sets.py
+"""
+Фиксированные (по seed) наборы уровней и их прогон агентом.
+
+Один и тот же seed всегда даёт одни и те же стартовые позиции,
+поэтому результаты можно сравнивать между моделями, рантаймами и коммитами.
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from ai_functions.solver import create_env, solve_with_agent
+
+
+def parse_model_name(model_name: str):
+    try:
+        N, K, L = map(int, model_name.split("_"))  # N-Число пробирок, K-сколько пустых, L - Число слоёв
+    except ValueError:
+        raise RuntimeError(f"Некорректное имя модели: {model_name}")
+    return N, K, L
+
+
+def seeded_levels(model_name: str, count: int, seed: int = 0) -> List[List[List[int]]]:
+    """
+    `count` стартовых позиций для конфигурации N_K_L: уровень i — это env.reset(seed=seed+i).
+    """
+    N, K, L = parse_model_name(model_name)
+    env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K)
+    levels = []
+    for i in range(count):
+        obs, _ = env.reset(seed=seed + i)
+        levels.append(obs.reshape(N, L).tolist())
+    return levels
+
+
+def dataset_levels(path: str, model_name: str, count: int, start: int = 0) -> List[List[List[int]]]:
+    """
+    Уровни конфигурации N_K_L из набора level_dataset.py: с start-го по счёту, не больше count.
+    """
+    from ai_functions.level_dataset import LevelDataset
+    ds = LevelDataset(path)
+    return [ds.state(int(i)).tolist() for i in ds.indices(model_name)[start:start + count]]
+
+
+def replay_levels(agent, model_name: str, levels: List[List[List[int]]],
+                  max_steps: int = 100) -> Dict:
+    """
+    Прогоняет агента по набору уровней.
+
+    Возвращает:
+      {
+        "solved":     List[bool],
+        "steps":      List[Optional[int]],   # None — не решил,
+        "solve_rate": float,
+        "mean_steps": float,                 # по решённым, nan если таких нет
+      }
+    """
+    N, K, L = parse_model_name(model_name)
+    env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K, max_steps=max_steps)
+
+    steps = []
+    for state in levels:
+        sol = solve_with_agent(agent, env, state, N, max_steps=max_steps)
+        steps.append(len(sol) if sol is not None else None)
+
+    solved = [s is not None for s in steps]
+    done_steps = [s for s in steps if s is not None]
+    return {
+        "solved":     solved,
+        "steps":      steps,
+        "solve_rate": sum(solved) / max(1, len(levels)),
+        "mean_steps": float(np.mean(done_steps)) if done_steps else float("nan"),
+    }
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/metrics.py
+"""
+Метрики AI‑сервиса в текстовом формате Prometheus (GET /metrics).
+
+Без внешних зависимостей: счётчики, гистограммы и gauge с метками,
+потокобезопасные (uvicorn выполняет sync‑эндпоинты в пуле потоков).
+
+При нескольких воркерах (serve.py) у каждого процесса свой REGISTRY:
+после enable_multiprocess(dir) воркер раз в несколько секунд сбрасывает
+свои значения в <dir>/<pid>.json, а render() складывает живые значения
+процесса со снимками остальных — /metrics отвечает любой воркер. Снимок
+завершившегося воркера родитель убирает через retire(pid): счётчики и
+гистограммы переходят в archive.json, gauge (например, очередь scheduler)
+отбрасываются — иначе доля мёртвого процесса висела бы в них вечно.
+"""
+import os
+import json
+import math
+import time
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+STEPS_BUCKETS   = (1, 2, 3, 5, 8, 10, 15, 20, 30, 50, 75, 100)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _unkey(raw) -> LabelKey:
+    return tuple((k, v) for k, v in raw)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str):
+        self.name, self.doc = name, doc
+        self._values: Dict[LabelKey, float] = {}
+        self._others: List = []          # снимки других процессов
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_key(labels), 0.0)
+
+    def state(self) -> List:
+        with self._lock:
+            return [[key, v] for key, v in self._values.items()]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def totals(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            out = dict(self._values)
+        for state in self._others:
+            for raw, v in state:
+                key = _unkey(raw)
+                out[key] = out.get(key, 0.0) + v
+        return out
+
+    def samples(self) -> Iterable[str]:
+        for key, v in self.totals().items():
+            yield f"{self.name}{_fmt_labels(key)} {_fmt_value(v)}"
+
+
+class Gauge:
+    """
+    Gauge либо с явным set(), либо с функцией fn() → {метки: значение},
+    которая вызывается при каждом рендере.
+
+    merge — как сводить значения нескольких процессов: "local" (значение
+    одинаково в любом процессе или уже посчитано из сведённых счётчиков)
+    или "sum" (у каждого процесса своя доля).
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str,
+                 fn: Optional[Callable[[], Dict[LabelKey, float]]] = None,
+                 merge: str = "local"):
+        self.name, self.doc, self.fn, self.merge = name, doc, fn, merge
+        self._values: Dict[LabelKey, float] = {}
+        self._others: List = []
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_key(labels)] = value
+
+    def _local(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            items = dict(self._values)
+        if self.fn is not None:
+            items.update(self.fn())
+        return items
+
+    def state(self) -> List:
+        return [[key, v] for key, v in self._local().items()] if self.merge == "sum" else []
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def totals(self) -> Dict[LabelKey, float]:
+        out = self._local()
+        if self.merge == "sum":
+            for state in self._others:
+                for raw, v in state:
+                    key = _unkey(raw)
+                    out[key] = out.get(key, 0.0) + v
+        return out
+
+    def samples(self) -> Iterable[str]:
+        for key, v in self.totals().items():
+            yield f"{self.name}{_fmt_labels(key)} {_fmt_value(v)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.doc = name, doc
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+        self._others: List = []
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def state(self) -> List:
+        with self._lock:
+            return [[k, list(c), self._sums[k]] for k, c in self._counts.items()]
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._sums.clear()
+
+    def totals(self) -> Dict[LabelKey, Tuple[List[int], float]]:
+        out = {k: (c, total) for k, c, total in self.state()}
+        for state in self._others:
+            for raw, counts, total in state:
+                key = _unkey(raw)
+                mine, mine_total = out.get(key, ([0] * len(self.buckets), 0.0))
+                out[key] = ([a + b for a, b in zip(mine, counts)], mine_total + total)
+        return out
+
+    def samples(self) -> Iterable[str]:
+        for key, (counts, total) in self.totals().items():
+            for bound, n in zip(self.buckets, counts):
+                yield f"{self.name}_bucket{_fmt_labels(key, ('le', _fmt_value(bound)))} {n}"
+            yield f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(total)}"
+            yield f"{self.name}_count{_fmt_labels(key)} {counts[-1]}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def state(self) -> Dict[str, List]:
+        return {m.name: m.state() for m in self._metrics}
+
+    def kind(self, name: str) -> Optional[str]:
+        for m in self._metrics:
+            if m.name == name:
+                return m.kind
+        return None
+
+    def reset(self):
+        for m in self._metrics:
+            m.reset()
+
+    def set_others(self, states: List[Dict[str, List]]):
+        for m in self._metrics:
+            m._others = [st[m.name] for st in states if m.name in st]
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.append(f"# HELP {m.name} {m.doc}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    "ai_requests_total", "HTTP‑запросы по эндпоинту, модели и статусу"))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "ai_request_duration_seconds", "Время обработки запроса по эндпоинту и модели"))
+ERRORS = REGISTRY.register(Counter(
+    "ai_errors_total", "Ошибки внутри обработчиков"))
+MODEL_LOAD_SECONDS = REGISTRY.register(Histogram(
+    "ai_model_load_seconds", "Время загрузки модели", (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)))
+AGENT_CACHE = REGISTRY.register(Counter(
+    "ai_agent_cache_requests_total", "Обращения к кэшу агентов (result=hit|miss)"))
+ROLLOUT_STEPS = REGISTRY.register(Histogram(
+    "ai_rollout_steps", "Число шагов агента в одном прогоне", STEPS_BUCKETS))
+SOLVE_OUTCOMES = REGISTRY.register(Counter(
+    "ai_solve_outcomes_total", "Исход прогона (solved|step_limit|no_moves|cycle|dead_end|stored|trajectory|unsolvable)"))
+INGEST_LEVELS = REGISTRY.register(Counter(
+    "ai_ingest_levels_total", "Уровни, добавленные в БД"))
+INGEST_CANDIDATES = REGISTRY.register(Counter(
+    "ai_ingest_candidates_total", "Сгенерированные кандидаты для добавления"))
+SOLUTION_STEPS_SAVED = REGISTRY.register(Counter(
+    "ai_solution_steps_saved_total", "Шаги, срезанные solution_optimizer"))
+GENERATE_SKIPPED = REGISTRY.register(Counter(
+    "ai_generate_skipped_total", "Кандидаты, отсеянные без прогона агента (reason=bound|estimate)"))
+SOLVE_SHARED = REGISTRY.register(Counter(
+    "ai_solve_shared_total", "Запросы /solve_level, получившие результат одновременного такого же (singleflight)"))
+SCHED_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "ai_sched_wait_seconds", "Ожидание слота в классе приоритета (cls=interactive|bulk)"))
+SCHED_YIELD_SECONDS = REGISTRY.register(Counter(
+    "ai_sched_yield_seconds_total", "Сколько генерация простояла, уступая подсказкам"))
+INGEST_SECONDS = REGISTRY.register(Histogram(
+    "ai_ingest_duration_seconds", "Длительность run_ingest"))
+
+
+def _cache_hit_ratio() -> Dict[LabelKey, float]:
+    per_model: Dict[str, Dict[str, float]] = {}
+    for key, v in AGENT_CACHE.totals().items():
+        labels = dict(key)
+        per_model.setdefault(labels.get("model", "-"), {})[labels.get("result")] = v
+    return {
+        _key({"model": m}): r.get("hit", 0.0) / (r.get("hit", 0.0) + r.get("miss", 0.0))
+        for m, r in per_model.items() if r.get("hit", 0.0) + r.get("miss", 0.0)
+    }
+
+
+REGISTRY.register(Gauge(
+    "ai_agent_cache_hit_ratio", "Доля попаданий в кэш агентов", _cache_hit_ratio))
+
+
+# ------------------------- per-request labels ------------------------------
+_local = threading.local()
+
+
+@contextmanager
+def track_request(endpoint: str, model: str = "-"):
+    """
+    Считает запрос и его длительность. Модель можно уточнить изнутри
+    обработчика через set_request_model (например, solve_level узнаёт её из БД).
+    """
+    labels = {"endpoint": endpoint, "model": model}
+    prev = getattr(_local, "labels", None)
+    _local.labels = labels
+    status = "ok"
+    t0 = time.perf_counter()
+    try:
+        yield labels
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _local.labels = prev
+        REQUESTS.inc(status=status, **labels)
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, **labels)
+
+
+def set_request_model(model: str):
+    labels = getattr(_local, "labels", None)
+    if labels is not None:
+        labels["model"] = model
+
+
+# ------------------------- multi-process (serve.py) ------------------------
+_mp_dir: Optional[Path] = None
+_render_lock = threading.Lock()
+
+
+def enable_multiprocess(path: str):
+    global _mp_dir
+    _mp_dir = Path(path)
+    _mp_dir.mkdir(parents=True, exist_ok=True)
+
+
+def dump(name: Optional[str] = None):
+    """
+    Сбрасывает значения процесса в <dir>/<name или pid>.json (атомарно).
+    """
+    if _mp_dir is None:
+        return
+    path = _mp_dir / f"{name or os.getpid()}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(REGISTRY.state()))
+    os.replace(tmp, path)
+
+
+def _fold(kind: str, into: List, state: List) -> List:
+    """
+    Складывает снимок метрики state в into (счётчик или гистограмма).
+    """
+    merged = {_unkey(row[0]): row[1:] for row in into}
+    for raw, *rest in state:
+        key = _unkey(raw)
+        if key not in merged:
+            merged[key] = rest
+        elif kind == "histogram":
+            counts, total = merged[key]
+            merged[key] = [[a + b for a, b in zip(counts, rest[0])], total + rest[1]]
+        else:
+            merged[key] = [merged[key][0] + rest[0]]
+    return [[list(key)] + rest for key, rest in merged.items()]
+
+
+def retire(pid: int):
+    """
+    Убирает снимок завершившегося процесса pid: его счётчики и гистограммы
+    дописываются в archive.json, gauge отбрасываются. Вызывает только родитель.
+    """
+    if _mp_dir is None:
+        return
+    path = _mp_dir / f"{pid}.json"
+    try:
+        state = json.loads(path.read_text())
+    except (OSError, ValueError):
+        state = {}
+    if state:
+        archive_path = _mp_dir / "archive.json"
+        try:
+            archive = json.loads(archive_path.read_text())
+        except (OSError, ValueError):
+            archive = {}
+        for name, rows in state.items():
+            kind = REGISTRY.kind(name)
+            if kind in ("counter", "histogram") and rows:
+                archive[name] = _fold(kind, archive.get(name, []), rows)
+        tmp = archive_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(archive))
+        os.replace(tmp, archive_path)
+    for p in (path, path.with_suffix(".tmp")):
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def start_dumper(interval: float = 5.0) -> threading.Thread:
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                dump()
+            except OSError:
+                pass
+    t = threading.Thread(target=loop, name="metrics-dump", daemon=True)
+    t.start()
+    return t
+
+
+def _read_others() -> List[Dict[str, List]]:
+    own = f"{os.getpid()}.json"
+    states = []
+    for path in sorted(_mp_dir.glob("*.json")):
+        if path.name == own:
+            continue
+        try:
+            states.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue                 # файл как раз перезаписывается
+    return states
+
+
+def render() -> str:
+    if _mp_dir is None:
+        return REGISTRY.render()
+    with _render_lock:
+        REGISTRY.set_others(_read_others())
+        return REGISTRY.render()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/quantize.py
+"""
+Динамическая int8‑квантизация Q‑сетей (MaskedDQNAgent.q_net) с проверкой точности.
+
+Квантованная модель допускается к работе, только если на фиксированном
+наборе уровней (level_sets.seeded_levels) она не хуже float32‑модели
+больше чем на заданные пороги:
+  - solve rate падает не более чем на --max-solve-drop (абсолютно),
+  - среднее число шагов на уровнях, решённых обеими, растёт
+    не более чем на --max-step-increase (относительно).
+
+Результаты проверки пишутся в ai_models/quantized.json; solver.load_agent
+квантует модель при AI_QUANTIZE=1 только если она там одобрена.
+
+Пример:
+  python -m ai_functions.quantize                 # все модели
+  python -m ai_functions.quantize 7_2_4 --levels 1000 --max-solve-drop 0.02
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+MODELS_DIR = Path(__file__).parent / "ai_models"
+GUARD_PATH = MODELS_DIR / "quantized.json"
+
+AI_QUANTIZE = os.getenv("AI_QUANTIZE", "0") == "1"
+
+
+def quantize_agent(agent):
+    """
+    Заменяет Linear‑слои q_net на DynamicQuantizedLinear (веса int8, активации fp32).
+    Target‑сеть для инференса не нужна, её не трогаем.
+    """
+    agent.q_net = torch.ao.quantization.quantize_dynamic(
+        agent.q_net.cpu(), {nn.Linear}, dtype=torch.qint8
+    )
+    agent.device = torch.device("cpu")
+    return agent
+
+
+def load_guard() -> Dict[str, Dict]:
+    if not GUARD_PATH.exists():
+        return {}
+    with open(GUARD_PATH, "r") as fp:
+        return json.load(fp)
+
+
+def is_approved(model_name: str) -> bool:
+    return bool(load_guard().get(model_name, {}).get("approved"))
+
+
+def check_quantized(model_name: str, n_levels: int = 500, seed: int = 0,
+                    max_solve_drop: float = 0.01, max_step_increase: float = 0.05) -> Dict:
+    """
+    Сравнивает float32 и int8 версии модели на одном и том же наборе уровней.
+    """
+    from ai_functions.solver     import create_env, load_agent
+    from ai_functions.level_sets import parse_model_name, seeded_levels, replay_levels
+
+    N, K, L = parse_model_name(model_name)
+    env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K)
+    levels = seeded_levels(model_name, n_levels, seed)
+
+    fp32 = load_agent(model_name, env, N, runtime="eager", quantize=False,
+                      student=False, universal=False)
+    t0 = time.perf_counter()
+    base = replay_levels(fp32, model_name, levels)
+    fp32_time = time.perf_counter() - t0
+
+    int8 = quantize_agent(load_agent(model_name, env, N, runtime="eager", quantize=False,
+                                     student=False, universal=False))
+    t0 = time.perf_counter()
+    quant = replay_levels(int8, model_name, levels)
+    int8_time = time.perf_counter() - t0
+
+    both = [(b, q) for b, q in zip(base["steps"], quant["steps"]) if b is not None and q is not None]
+    base_steps  = float(np.mean([b for b, _ in both])) if both else float("nan")
+    quant_steps = float(np.mean([q for _, q in both])) if both else float("nan")
+    step_increase = (quant_steps - base_steps) / base_steps if both else 0.0
+    solve_drop = base["solve_rate"] - quant["solve_rate"]
+
+    return {
+        "levels":          n_levels,
+        "seed":            seed,
+        "fp32_solve_rate": base["solve_rate"],
+        "int8_solve_rate": quant["solve_rate"],
+        "fp32_mean_steps": base_steps,
+        "int8_mean_steps": quant_steps,
+        "solve_drop":      solve_drop,
+        "step_increase":   step_increase,
+        "speedup":         fp32_time / int8_time if int8_time else float("nan"),
+        "approved":        solve_drop <= max_solve_drop and step_increase <= max_step_increase,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="int8‑квантизация моделей с проверкой точности")
+    parser.add_argument("models", nargs="*", help="N_K_L (по умолчанию все ai_models/*.pth)")
+    parser.add_argument("--levels", type=int, default=500, help="размер набора уровней")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-solve-drop", type=float, default=0.01,
+                        help="допустимое падение solve rate (абсолютное)")
+    parser.add_argument("--max-step-increase", type=float, default=0.05,
+                        help="допустимый рост среднего числа шагов (относительный)")
+    args = parser.parse_args()
+
+    models: List[str] = args.models or sorted(p.stem for p in MODELS_DIR.glob("*.pth"))
+    guard = load_guard()
+    for name in models:
+        if not (MODELS_DIR / f"{name}.pth").exists():
+            print(f"Модель не найдена: {name}", file=sys.stderr)
+            continue
+        report = check_quantized(name, args.levels, args.seed,
+                                 args.max_solve_drop, args.max_step_increase)
+        guard[name] = report
+        mark = "✅" if report["approved"] else "🚫"
+        print(f'{mark} {name:>6}: solve {report["fp32_solve_rate"]:.3f}→{report["int8_solve_rate"]:.3f}  '
+              f'steps {report["fp32_mean_steps"]:.2f}→{report["int8_mean_steps"]:.2f}  '
+              f'×{report["speedup"]:.2f}')
+
+    with open(GUARD_PATH, "w") as fp:
+        json.dump(guard, fp, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
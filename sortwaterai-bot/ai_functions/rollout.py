@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/rollout.py
+"""
+Прогон агента по уровню с защитой от циклов и тупиков.
+
+Общий цикл для solver.solve_with_agent и get_generated_levels:
+  - посещённые состояния хранятся в множестве; если жадный ход агента
+    ведёт в уже посещённое состояние, берём следующее по Q‑значению
+    валидное действие, ведущее в новое (следующее состояние считается
+    exact_search.pour, без шага окружения);
+  - если все валидные ходы ведут в посещённые состояния — исход "cycle";
+  - при первом таком «откате» к следующему действию проверяем, не тупик ли
+    это: перебираем все достижимые состояния (не больше DEAD_END_LIMIT);
+    если перебор закончился, а решения нет — исход "dead_end".
+
+Штраф recent_states в окружении влияет только на награду, поэтому
+без этого агент мог ходить по кругу до max_steps.
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ai_functions.exact_search import State, is_solved, pour, successors, to_state
+
+DEAD_END_LIMIT = int(os.getenv("DEAD_END_LIMIT", 300))
+
+
+def rollout_outcome(done: bool, info: Dict) -> str:
+    if done:
+        return "solved"
+    if info.get("no_valid_moves"):
+        return "no_moves"
+    return "step_limit"
+
+
+def is_dead(state: State, limit: int = DEAD_END_LIMIT) -> bool:
+    """
+    True, если из state решение недостижимо: все достижимые состояния
+    перебраны (их не больше limit), и решённого среди них нет.
+    False — решение найдено или перебор не уложился в limit.
+    """
+    if is_solved(state):
+        return False
+    seen = {state}
+    stack = [state]
+    while stack:
+        cur = stack.pop()
+        for _, nxt in successors(cur):
+            if nxt in seen:
+                continue
+            if is_solved(nxt) or len(seen) >= limit:
+                return False
+            seen.add(nxt)
+            stack.append(nxt)
+    return True
+
+
+class Rollout:
+    """
+    Прогон одного уровня, по шагу за раз: ход выбирается по Q‑значениям,
+    которые посчитал вызывающий. Так несколько партий можно вести в ногу
+    и считать Q для всех одним батчем (evaluate.py).
+
+      r = Rollout(env, obs, N, L)
+      while not r.finished:
+          r.step(agent.predict_qvalues(r.obs[None])[0])
+    """
+
+    def __init__(self, env, obs: np.ndarray, N: int, L: int,
+                 max_steps: int = 100, dead_limit: int = DEAD_END_LIMIT):
+        self.env, self.obs, self.N = env, obs, N
+        self.max_steps, self.dead_limit = max_steps, dead_limit
+        self.state = to_state(obs.reshape(N, L))
+        self.visited = {self.state}
+        self.actions: List[List[int]] = []
+        self.done = False
+        self.outcome: Optional[str] = None
+        self.valid: List[int] = []
+        self._checked_dead = False
+        self._next_valid({})
+
+    @property
+    def finished(self) -> bool:
+        return self.outcome is not None
+
+    def _next_valid(self, info: Dict):
+        if self.done or len(self.actions) >= self.max_steps:
+            self.outcome = rollout_outcome(self.done, info)
+            return
+        self.valid = self.env.fast_get_valid_actions(self.obs)
+        if not self.valid:
+            self.outcome = "no_moves"
+
+    def step(self, qvals: np.ndarray):
+        N = self.N
+        act, nxt = None, None
+        for i, a in enumerate(sorted(self.valid, key=lambda a: -qvals[a])):
+            candidate = pour(self.state, a // N, a % N)
+            if candidate in self.visited:
+                continue
+            if i > 0 and not self._checked_dead and self.dead_limit:
+                self._checked_dead = True
+                if is_dead(self.state, self.dead_limit):
+                    self.outcome = "dead_end"
+                    return
+            act, nxt = a, candidate
+            break
+        if act is None:
+            self.outcome = "cycle"
+            return
+
+        self.obs, _, self.done, truncated, info = self.env.step(act)
+        self.actions.append([int(act // N), int(act % N)])
+        self.state = nxt
+        self.visited.add(nxt)
+        if truncated and not self.done:
+            self.outcome = rollout_outcome(self.done, info)
+            return
+        self._next_valid(info)
+
+
+def play(agent, env, obs: np.ndarray, N: int, L: int,
+         max_steps: int = 100, dead_limit: int = DEAD_END_LIMIT) -> Tuple[bool, List[List[int]], str]:
+    """
+    Ведёт агента от obs (плоское наблюдение, env уже в этом состоянии).
+    Возвращает (решён ли, ходы [[from, to], …], исход):
+    solved | step_limit | no_moves | cycle | dead_end.
+    """
+    r = Rollout(env, obs, N, L, max_steps, dead_limit)
+    while not r.finished:
+        r.step(agent.predict_qvalues(r.obs[None])[0])
+    return r.done, r.actions, r.outcome
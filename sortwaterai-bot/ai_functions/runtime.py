@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/runtime.py
+"""
+Рантайм для экспортированных Q‑сетей (TorchScript / ONNX).
+
+Экспорт делает export_models.py: рядом с ai_models/<N_K_L>.pth появляются
+ai_models/exported/<N_K_L>.pt (TorchScript) и/или <N_K_L>.onnx,
+а в manifest.json записывается подобранное число intra‑op потоков.
+
+Режим выбирается переменной окружения AI_RUNTIME:
+  eager       – обычный MaskedDQNAgent (по умолчанию),
+  torchscript – torch.jit.load(...),
+  onnx        – onnxruntime.InferenceSession(...) (нужен пакет onnxruntime).
+"""
+import os
+import json
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import torch
+
+from ai_functions.dqn_agent import masked_actions
+
+MODELS_DIR    = Path(__file__).parent / "ai_models"
+EXPORT_DIR    = MODELS_DIR / "exported"
+MANIFEST_PATH = EXPORT_DIR / "manifest.json"
+
+AI_RUNTIME = os.getenv("AI_RUNTIME", "eager")
+RUNTIMES   = ("eager", "torchscript", "onnx")
+SUFFIXES   = {"torchscript": ".pt", "onnx": ".onnx"}
+
+_threads_configured = False
+_held_threads: Optional[int] = None      # потоками управляет вызывающий (serve.py)
+
+
+def exported_path(model_name: str, fmt: str) -> Path:
+    return EXPORT_DIR / f"{model_name}{SUFFIXES[fmt]}"
+
+
+def load_manifest() -> Dict[str, Dict]:
+    if not MANIFEST_PATH.exists():
+        return {}
+    with open(MANIFEST_PATH, "r") as fp:
+        return json.load(fp)
+
+
+def tuned_threads(model_name: str) -> int:
+    """
+    Число intra‑op потоков: AI_INTRA_OP_THREADS из env,
+    иначе значение, подобранное бенчмарком export_models.py, иначе 1.
+    """
+    env_val = os.getenv("AI_INTRA_OP_THREADS")
+    if env_val:
+        return int(env_val)
+    return int(load_manifest().get(model_name, {}).get("threads", 1))
+
+
+def hold_threads(threads: int):
+    """
+    Потоками процесса управляет вызывающий: загрузчики не трогают
+    torch.set_num_threads, а ONNX‑сессии берут threads вместо подобранного
+    числа. serve.py зовёт это в родителе до warmup.preload — иначе загрузка
+    подняла бы потоки родителя перед fork, а воркеры унаследовали бы
+    «уже настроено».
+    """
+    global _held_threads
+    _held_threads = threads
+
+
+def configure_torch_threads(threads: int):
+    """
+    torch.set_num_threads глобален для процесса, поэтому выставляем его один раз.
+    """
+    global _threads_configured
+    if _threads_configured or _held_threads is not None:
+        return
+    torch.set_num_threads(threads)
+    _threads_configured = True
+
+
+class CompiledAgent:
+    """
+    Обёртка над экспортированной сетью с тем же интерфейсом,
+    что использует solver/get_generated_levels у MaskedDQNAgent.
+    """
+
+    def __init__(self, forward: Callable[[np.ndarray], np.ndarray], runtime: str):
+        self._forward = forward
+        self.runtime  = runtime
+        self.epsilon  = 0
+
+    def eval(self):
+        return self
+
+    def predict_qvalues(self, obs: np.ndarray) -> np.ndarray:
+        return self._forward(np.asarray(obs, dtype=np.float32))
+
+    def sample_actions_masked(self, obs: np.ndarray, env) -> np.ndarray:
+        qvals = self.predict_qvalues(obs)
+        return masked_actions(qvals, obs, env, self.epsilon)
+
+
+def load_torchscript(model_name: str, threads: Optional[int] = None) -> CompiledAgent:
+    path = exported_path(model_name, "torchscript")
+    if not path.exists():
+        raise RuntimeError(f"TorchScript‑модель не найдена: {path}")
+
+    configure_torch_threads(threads or tuned_threads(model_name))
+    module = torch.jit.load(str(path), map_location="cpu")
+    module.eval()
+
+    def forward(obs: np.ndarray) -> np.ndarray:
+        with torch.inference_mode():
+            return module(torch.from_numpy(obs)).numpy()
+
+    return CompiledAgent(forward, "torchscript")
+
+
+def load_onnx(model_name: str, threads: Optional[int] = None) -> CompiledAgent:
+    path = exported_path(model_name, "onnx")
+    if not path.exists():
+        raise RuntimeError(f"ONNX‑модель не найдена: {path}")
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise RuntimeError("Для AI_RUNTIME=onnx нужен пакет onnxruntime")
+
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = threads or _held_threads or tuned_threads(model_name)
+    opts.inter_op_num_threads = 1
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+
+    def forward(obs: np.ndarray) -> np.ndarray:
+        return session.run(None, {input_name: obs})[0]
+
+    return CompiledAgent(forward, "onnx")
+
+
+def load_compiled_agent(model_name: str, runtime: str = AI_RUNTIME,
+                        threads: Optional[int] = None) -> CompiledAgent:
+    if runtime == "torchscript":
+        return load_torchscript(model_name, threads)
+    if runtime == "onnx":
+        return load_onnx(model_name, threads)
+    raise RuntimeError(f"Неизвестный AI_RUNTIME: {runtime} (ожидается одно из {RUNTIMES})")
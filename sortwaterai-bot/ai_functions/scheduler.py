@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/scheduler.py
+"""
+Приоритеты между запросами игроков и генерацией уровней внутри AI‑сервиса.
+
+Два класса работ:
+  interactive – /solve_level (подсказки игрокам), лимит SCHED_INTERACTIVE_LIMIT;
+  bulk        – /add_levels, лимит SCHED_BULK_LIMIT.
+
+Лимит — это семафор класса: лишние запросы ждут своей очереди, не мешая
+другому классу. Генерация длинная и выполняется кусками по эпизоду:
+перед каждым эпизодом (get_generated_levels._rollout) вызывается
+checkpoint(), который ждёт, пока есть interactive‑работа — но не дольше
+SCHED_MAX_YIELD секунд за раз, чтобы при постоянном потоке подсказок
+генерация всё же двигалась. Без этого генерация делила с подсказками GIL
+и ядра на равных, и время подсказки росло во время большого /add_levels.
+
+Фоновый запас уровней (level_reserve.ReserveProducer) — самый низкий
+приоритет: он не начинает батч, пока занят любой класс (is_busy), а внутри
+батча уступает interactive через тот же checkpoint().
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+from ai_functions import metrics
+
+INTERACTIVE = "interactive"
+BULK        = "bulk"
+
+LIMITS = {
+    INTERACTIVE: int(os.getenv("SCHED_INTERACTIVE_LIMIT", 8)),
+    BULK:        int(os.getenv("SCHED_BULK_LIMIT", 1)),
+}
+MAX_YIELD = float(os.getenv("SCHED_MAX_YIELD", 2.0))
+
+
+class Scheduler:
+    def __init__(self, limits: Dict[str, int]):
+        self._slots = {cls: threading.BoundedSemaphore(n) for cls, n in limits.items()}
+        self._cond = threading.Condition()
+        self._pending = {cls: 0 for cls in limits}      # в работе + ждут слота
+
+    @contextmanager
+    def slot(self, cls: str):
+        """
+        Выполнение работы класса cls: ждёт свободный слот, держит его до выхода.
+        """
+        with self._cond:
+            self._pending[cls] += 1
+        t0 = time.perf_counter()
+        self._slots[cls].acquire()
+        metrics.SCHED_WAIT_SECONDS.observe(time.perf_counter() - t0, cls=cls)
+        try:
+            yield
+        finally:
+            self._slots[cls].release()
+            with self._cond:
+                self._pending[cls] -= 1
+                self._cond.notify_all()
+
+    def pending(self, cls: str) -> int:
+        return self._pending[cls]
+
+    def is_busy(self) -> bool:
+        return any(self._pending.values())
+
+    def checkpoint(self, max_wait: float = MAX_YIELD) -> float:
+        """
+        Точка уступки для bulk‑работы между эпизодами: ждёт, пока не останется
+        interactive‑работы, но не дольше max_wait. Возвращает время ожидания.
+        """
+        if not self._pending[INTERACTIVE]:
+            return 0.0
+        t0 = time.perf_counter()
+        deadline = t0 + max_wait
+        with self._cond:
+            while self._pending[INTERACTIVE]:
+                left = deadline - time.perf_counter()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+        waited = time.perf_counter() - t0
+        metrics.SCHED_YIELD_SECONDS.inc(waited)
+        return waited
+
+
+SCHEDULER = Scheduler(LIMITS)
+
+slot       = SCHEDULER.slot
+checkpoint = SCHEDULER.checkpoint
+is_busy    = SCHEDULER.is_busy
+
+
+def _pending() -> Dict[metrics.LabelKey, float]:
+    return {metrics._key({"cls": cls}): SCHEDULER.pending(cls) for cls in LIMITS}
+
+
+metrics.REGISTRY.register(metrics.Gauge(
+    "ai_sched_pending", "Работы в классе приоритета: выполняются + ждут слота", _pending,
+    merge="sum"))
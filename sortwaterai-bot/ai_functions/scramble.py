@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/scramble.py
+"""
+Генерация заведомо решаемых уровней «обратным перемешиванием».
+
+Стартуем с решённого состояния и делаем случайные обратные переливания:
+из пробирки j забираем c верхних слоёв цвета x и кладём их в пробирку i.
+Кандидат принимается, только если прямой ход i→j (exact_search.pour)
+из полученного состояния возвращает ровно текущее — т.е. обратный ход
+действительно обратим по правилам игры. Развёрнутый путь — готовое
+решение уровня (верхняя граница числа шагов).
+
+По умолчанию ждём «классическую» раскладку: все пробирки либо полные,
+либо пустые, пустых ровно K — как у уровней из WaterSortEnvFixed.reset.
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ai_functions.exact_search import State, can_pour, find_top, is_solved, pour
+
+Move = Tuple[int, int]
+
+
+def solved_state(N: int, K: int, L: int, rng: np.random.Generator) -> State:
+    """
+    Решённое состояние: N-K одноцветных полных пробирок и K пустых,
+    цвета и позиции пробирок перемешаны.
+    """
+    tubes = [(c,) * L for c in rng.permutation(N - K).tolist()] + [(-1,) * L] * K
+    order = rng.permutation(N)
+    return tuple(tubes[i] for i in order)
+
+
+def inverse_pours(state: State) -> List[Tuple[Move, State]]:
+    """
+    Все предшественники состояния: пары ((fr, to), prev), где prev → state
+    прямым ходом fr→to.
+    """
+    N, L = len(state), len(state[0])
+    result = []
+    for j in range(N):
+        top_j = find_top(state[j])
+        if top_j == -1:
+            continue
+        color = state[j][top_j]
+        run = 1
+        while top_j + run < L and state[j][top_j + run] == color:
+            run += 1
+
+        for c in range(1, run + 1):
+            # забрали весь верхний «столбик» — под ним должно быть пусто,
+            # иначе прямой ход не мог бы закончиться на чужом цвете
+            if c == run and top_j + run != L:
+                continue
+            for i in range(N):
+                if i == j:
+                    continue
+                top_i = find_top(state[i])
+                bottom = L if top_i == -1 else top_i          # первый занятый слой
+                if bottom < c:
+                    continue
+                src, dst = list(state[i]), list(state[j])
+                for k in range(c):
+                    dst[top_j + k] = -1
+                    src[bottom - 1 - k] = color
+                tubes = list(state)
+                tubes[i], tubes[j] = tuple(src), tuple(dst)
+                prev = tuple(tubes)
+                if can_pour(prev, i, j) and pour(prev, i, j) == state:
+                    result.append(((i, j), prev))
+    return result
+
+
+def is_full_layout(state: State, K: int) -> bool:
+    """
+    Каждая пробирка либо полная, либо пустая, пустых ровно K.
+    """
+    empty = 0
+    for tube in state:
+        if tube[0] == -1 and tube[-1] == -1:
+            empty += 1
+        elif tube[0] == -1:
+            return False
+    return empty == K
+
+
+def scramble(N: int, K: int, L: int, depth: int, rng: np.random.Generator,
+             full_tubes: bool = True, max_walk: Optional[int] = None,
+             max_tries: int = 200) -> Tuple[State, List[List[int]]]:
+    """
+    Возвращает (состояние, решение) — решение списком ходов [[from, to], …]
+    длиной не меньше depth. Блуждание не заходит в уже посещённые состояния.
+
+    full_tubes=True продолжает блуждание после depth, пока не получится
+    классическая раскладка (не дольше max_walk шагов, max_tries попыток);
+    если так и не вышло — отдаём последнее нерешённое состояние.
+    """
+    if max_walk is None:
+        max_walk = depth + 10 * N * L
+
+    fallback = None
+    for _ in range(max_tries):
+        state = solved_state(N, K, L, rng)
+        visited = {state}
+        path: List[Move] = []
+        while len(path) < max_walk:
+            options = [(m, p) for m, p in inverse_pours(state) if p not in visited]
+            if not options:
+                break
+            move, state = options[rng.integers(len(options))]
+            visited.add(state)
+            path.append(move)
+            if len(path) >= depth and not is_solved(state):
+                if not full_tubes or is_full_layout(state, K):
+                    return state, [list(m) for m in reversed(path)]
+                if fallback is None:
+                    fallback = (state, [list(m) for m in reversed(path)])
+
+    if fallback is None:
+        raise RuntimeError(f"Не удалось перемешать уровень {N}_{K}_{L} на глубину {depth}")
+    print("Warning: Could not reach full-tube layout. Using partially filled puzzle.")
+    return fallback
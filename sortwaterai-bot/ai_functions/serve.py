@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/serve.py
+"""
+Запуск AI‑сервиса в несколько процессов с общими весами моделей.
+
+  python -m ai_functions.serve [--workers N] [--host 0.0.0.0] [--port 8001]
+
+Родитель импортирует api, загружает всех агентов ai_models/*.pth в кэш
+solver.get_agent (warmup.preload), делает gc.freeze() и форкает
+AI_WORKERS воркеров. Веса лежат в памяти тензоров, которую никто не пишет,
+поэтому после fork страницы остаются общими (copy‑on‑write): память почти
+не растёт с числом воркеров, а пропускная способность растёт — у каждого
+воркера свой GIL. `uvicorn --workers` так не умеет: там каждый воркер
+импортирует приложение и грузит модели сам.
+
+Все воркеры принимают соединения с одного сокета, открытого родителем.
+Пока родитель грузит модели, на сокете уже работает временный воркер,
+форкнутый до импорта torch: он отвечает на /health (а /ready — 503),
+и контейнер становится healthy за доли секунды. Когда настоящие воркеры
+запущены, временный получает SIGTERM и дорабатывает начатые запросы.
+Родитель перезапускает упавших воркеров; SIGTERM/SIGINT пересылает им
+и ждёт завершения.
+
+  - /metrics любого воркера отдаёт сумму по всем (metrics.enable_multiprocess),
+    снимки завершившихся воркеров родитель сворачивает в архив (metrics.retire);
+  - фоновый запас уровней (LEVEL_RESERVE=1) работает только в воркере 0;
+  - singleflight и scheduler действуют в пределах одного воркера;
+  - потоки torch на воркер — AI_TORCH_THREADS (по умолчанию ядра / воркеры).
+"""
+import os
+import gc
+import sys
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import traceback
+from typing import Dict
+
+import uvicorn
+
+from ai_functions import metrics, level_reserve, warmup
+from ai_functions.api import app
+
+BOOTSTRAP = -1                  # номер временного воркера
+
+METRICS_INTERVAL = float(os.getenv("AI_METRICS_INTERVAL", 5))
+
+
+def cpu_count() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def open_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(index: int, sock: socket.socket, threads: int, log_level: str):
+    if index == BOOTSTRAP:
+        # модели грузит родитель; запросы на решение временный воркер
+        # обслужит сам, загрузив нужную модель по требованию
+        warmup.AI_WARMUP = False
+    else:
+        import torch
+        torch.set_num_threads(threads)
+    level_reserve.LEVEL_RESERVE = level_reserve.LEVEL_RESERVE and index == 0
+    metrics.start_dumper(METRICS_INTERVAL)
+
+    host, port = sock.getsockname()[:2]
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level=log_level))
+    try:
+        server.run(sockets=[sock])
+    finally:
+        metrics.dump()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI‑сервис в несколько процессов с общими весами")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("AI_WORKERS", cpu_count())))
+    parser.add_argument("--host", default=os.getenv("AI_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("AI_PORT", 8001)))
+    parser.add_argument("--log-level", default=os.getenv("AI_LOG_LEVEL", "info"))
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    threads = int(os.getenv("AI_TORCH_THREADS", 0)) or max(1, cpu_count() // workers)
+
+    metrics_dir = tempfile.mkdtemp(prefix="ai_metrics_")
+    metrics.enable_multiprocess(metrics_dir)
+    sock = open_socket(args.host, args.port)
+
+    children: Dict[int, int] = {}          # pid → номер воркера
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(index, sock, threads, args.log_level)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        children[pid] = index
+
+    def on_signal(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    spawn(BOOTSTRAP)
+
+    import torch
+    from ai_functions import runtime
+    # родитель не заводит пул потоков torch: после fork он был бы нерабочим;
+    # экспортированные модели при загрузке не должны это менять
+    torch.set_num_threads(1)
+    runtime.hold_threads(threads)
+    t0 = time.perf_counter()
+    models = warmup.preload()
+    print(f"[serve] Загружено моделей: {len(models)} за {time.perf_counter() - t0:.1f}s; "
+          f"воркеров: {workers}, потоков torch на воркер: {threads}")
+
+    # загрузка моделей посчитана в метриках родителя — отдаём её снимком,
+    # чтобы воркеры не унаследовали её каждый
+    metrics.dump("parent")
+    metrics.REGISTRY.reset()
+    gc.collect()
+    gc.freeze()
+
+    if not stopping:
+        for i in range(workers):
+            spawn(i)
+        for pid, index in list(children.items()):
+            if index == BOOTSTRAP:
+                os.kill(pid, signal.SIGTERM)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        # снимок метрик мёртвого воркера — в архив, его gauge больше не считаем
+        metrics.retire(pid)
+        if index is None or index == BOOTSTRAP or stopping:
+            continue
+        print(f"⚠️  [serve] Воркер {index} (pid {pid}) завершился с кодом "
+              f"{os.waitstatus_to_exitcode(status)}, перезапускаем", file=sys.stderr)
+        time.sleep(1)
+        spawn(index)
+
+    sock.close()
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
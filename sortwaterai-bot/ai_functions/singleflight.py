@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/singleflight.py
+"""
+Склейка одновременных одинаковых вызовов (single flight).
+
+Первый вызов с ключом выполняет функцию; те, кто пришёл с тем же ключом,
+пока она выполняется, ждут и получают тот же результат (или то же
+исключение). После завершения ключ забывается — это не кэш:
+следующий вызов считается заново.
+
+Эндпоинты FastAPI у нас синхронные и выполняются в пуле потоков,
+поэтому всё на threading.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Возвращает (результат, shared): shared=True — результат получен
+        от чужого вызова. Результат общий, менять его нельзя.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/solution_optimizer.py
+"""
+Укорачивание готовых решений (агента или scramble) без полного поиска.
+
+  1) replay     – проигрываем ходы, проверяя каждый по правилам игры;
+  2) loops      – если состояние повторилось, вырезаем ходы между повторами;
+  3) windows    – из каждого состояния пути делаем ограниченный BFS
+                  (глубина OPT_WINDOW, не больше OPT_MAX_EXPANSIONS раскрытий)
+                  и ищем более позднее состояние того же пути или любое решённое,
+                  до которого короче, чем по исходному пути; вклеиваем найденный
+                  кусок и повторяем, пока что‑то укорачивается.
+
+Результат — валидное решение не длиннее исходного.
+
+При генерации (get_generated_levels) бюджет больше — OPT_WINDOW/OPT_MAX_EXPANSIONS,
+при живом решении (solver.solve_level) — OPT_LIVE_WINDOW/OPT_LIVE_MAX_EXPANSIONS:
+на 7_2_x это ≈25 мс против ≈100 мс при почти той же экономии.
+"""
+import os
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ai_functions.exact_search import State, can_pour, is_solved, pour, successors, to_state
+
+OPTIMIZE_SOLUTIONS  = os.getenv("OPTIMIZE_SOLUTIONS", "1") == "1"
+WINDOW              = int(os.getenv("OPT_WINDOW", 4))
+MAX_EXPANSIONS      = int(os.getenv("OPT_MAX_EXPANSIONS", 2000))
+LIVE_WINDOW         = int(os.getenv("OPT_LIVE_WINDOW", 3))
+LIVE_MAX_EXPANSIONS = int(os.getenv("OPT_LIVE_MAX_EXPANSIONS", 300))
+
+Moves = List[List[int]]
+
+
+def replay(state: Sequence[Sequence[int]], moves: Moves) -> List[State]:
+    """
+    Состояния пути: states[0] — старт, states[i+1] — после moves[i].
+    """
+    states = [to_state(state)]
+    for fr, to in moves:
+        cur = states[-1]
+        if not can_pour(cur, fr, to):
+            raise ValueError(f"Недопустимый ход {fr}→{to} на шаге {len(states) - 1}")
+        states.append(pour(cur, fr, to))
+    return states
+
+
+def remove_loops(states: List[State], moves: Moves) -> Tuple[List[State], Moves]:
+    """
+    Убирает возвраты в уже пройденные состояния.
+    """
+    out_states = [states[0]]
+    out_moves: Moves = []
+    index: Dict[State, int] = {states[0]: 0}
+    for move, st in zip(moves, states[1:]):
+        if st in index:
+            cut = index[st]
+            for dropped in out_states[cut + 1:]:
+                del index[dropped]
+            out_states, out_moves = out_states[:cut + 1], out_moves[:cut]
+        else:
+            index[st] = len(out_states)
+            out_states.append(st)
+            out_moves.append(list(move))
+    return out_states, out_moves
+
+
+def _shortcut(states: List[State], i: int, depth: int,
+              max_expansions: int) -> Optional[Tuple[int, Moves]]:
+    """
+    BFS из states[i] глубиной ≤ depth. Возвращает (k, ходы) с наибольшей
+    экономией: после ходов мы в states[k] (или в решённом, тогда k = len-1),
+    причём len(ходы) < k - i. None — короче не нашлось.
+    """
+    last = len(states) - 1
+    later = {st: k for k, st in enumerate(states) if k > i + 1}
+    start = states[i]
+    parent: Dict[State, Tuple[State, Tuple[int, int]]] = {}
+    seen = {start}
+    queue = deque([(start, 0)])
+    best: Optional[Tuple[int, State]] = None          # (экономия, состояние)
+    expansions = 0
+
+    while queue and expansions < max_expansions:
+        cur, d = queue.popleft()
+        if d >= depth:
+            continue
+        expansions += 1
+        for move, nxt in successors(cur):
+            if nxt in seen:
+                continue
+            seen.add(nxt)
+            parent[nxt] = (cur, move)
+            k = last if is_solved(nxt) else later.get(nxt)
+            if k is not None:
+                saving = (k - i) - (d + 1)
+                if saving > 0 and (best is None or saving > best[0]):
+                    best = (saving, nxt)
+            queue.append((nxt, d + 1))
+
+    if best is None:
+        return None
+    node = best[1]
+    k = last if is_solved(node) else later[node]
+    path: Moves = []
+    while node != start:
+        node, move = parent[node]
+        path.append(list(move))
+    return k, path[::-1]
+
+
+def shorten(state: Sequence[Sequence[int]], moves: Moves,
+            window: int = WINDOW, max_expansions: int = MAX_EXPANSIONS) -> Moves:
+    """
+    Возвращает решение не длиннее moves. moves должно решать state.
+    """
+    states = replay(state, moves)
+    if not is_solved(states[-1]):
+        raise ValueError("Решение не доводит уровень до конца")
+    states, moves = remove_loops(states, [list(m) for m in moves])
+
+    i = 0
+    while i < len(moves):
+        found = _shortcut(states, i, window, max_expansions)
+        if found is None:
+            i += 1
+            continue
+        k, sub = found
+        moves = moves[:i] + sub + moves[k:]
+        states = replay(states[0], moves)
+        # если кусок привёл в решённое состояние раньше конца — хвост не нужен
+        for j, st in enumerate(states):
+            if is_solved(st):
+                states, moves = states[:j + 1], moves[:j]
+                break
+    return moves
@@ -6,14 +6,27 @@
 #!/usr/bin/env python3
 import os
 import json
+import time
+import logging
+import threading
 import psycopg2
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import numpy as np
 
 import torch
 from ai_functions.water_sort_env import WaterSortEnvFixed, DiscreteActionWrapper
 from ai_functions.dqn_agent       import MaskedDQNAgent
+from ai_functions.runtime         import AI_RUNTIME, SUFFIXES, exported_path, load_compiled_agent
+from ai_functions.quantize        import AI_QUANTIZE, is_approved, quantize_agent
+from ai_functions                 import distill, universal_policy
+from ai_functions.rollout         import play
+from ai_functions.solution_optimizer import (
+    OPTIMIZE_SOLUTIONS, LIVE_WINDOW, LIVE_MAX_EXPANSIONS, shorten
+)
+from ai_functions                 import metrics, trajectories, level_codec
+
+logger = logging.getLogger(__name__)
 
 # Настройки подключения к БД из env
 DB_CFG = {
@@ -48,11 +61,31 @@ def create_env(
 def load_agent(
     model_name: str,
     env: DiscreteActionWrapper,
-    N: int
+    N: int,
+    runtime: str = AI_RUNTIME,
+    quantize: bool = AI_QUANTIZE,
+    student: bool = distill.AI_STUDENT,
+    universal: bool = universal_policy.AI_UNIVERSAL
 ) -> MaskedDQNAgent:
     """
     Загружает DQN‑агента, используя env для определения размеров входа/выхода.
+    universal=True берёт общую для всех конфигураций сеть (universal_policy.py),
+    если она прошла проверку на этой конфигурации или своей модели нет.
+    student=True берёт маленькую сеть‑ученика, если она прошла проверку distill.py.
+    При runtime torchscript/onnx берётся экспортированная сеть (см. runtime.py),
+    если её нет — откатываемся на обычную eager‑модель.
+    quantize=True включает int8‑квантизацию, если модель прошла проверку quantize.py.
     """
+    if universal and universal_policy.covers(model_name):
+        return universal_policy.load_view(N, env.unwrapped.max_layers)
+    if student and distill.is_approved(model_name):
+        return distill.load_student(model_name)
+
+    if runtime in SUFFIXES:
+        if exported_path(model_name, runtime).exists():
+            return load_compiled_agent(model_name, runtime)
+        print(f"[solver] Нет {runtime}-экспорта для {model_name}, используем eager")
+
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     model_path = Path(__file__).parent / "ai_models" / f"{model_name}.pth"
     if not model_path.exists():
@@ -71,38 +104,80 @@ def load_agent(
     agent.load_state_dict(torch.load(model_path, map_location=device))
     agent.eval()
     agent.epsilon = 0
+    if quantize and is_approved(model_name):
+        quantize_agent(agent)
     return agent
 
-def solve_with_agent(
-    agent: MaskedDQNAgent,
+# Кэш загруженных агентов: (model_name, runtime, quantize, student, universal) → агент.
+# Для инференса агент не меняет состояния, поэтому его можно делить между запросами;
+# окружение же у каждого запроса своё (create_env дёшев).
+_AGENTS: Dict[Tuple[str, str, bool, bool, bool], MaskedDQNAgent] = {}
+_AGENTS_LOCK = threading.Lock()
+
+def get_agent(
+    model_name: str,
     env: DiscreteActionWrapper,
-    state: List[List[int]],
     N: int,
-    max_steps: int = 100
-) -> Optional[List[List[int]]]:
+    runtime: str = AI_RUNTIME,
+    quantize: bool = AI_QUANTIZE,
+    student: bool = distill.AI_STUDENT,
+    universal: bool = universal_policy.AI_UNIVERSAL
+) -> MaskedDQNAgent:
     """
-    Подсовывает в env уже готовое состояние и запускает агент.
+    load_agent с кэшированием в пределах процесса.
+    """
+    key = (model_name, runtime, quantize, student, universal)
+    agent = _AGENTS.get(key)
+    if agent is not None:
+        metrics.AGENT_CACHE.inc(model=model_name, result="hit")
+        return agent
+
+    with _AGENTS_LOCK:
+        agent = _AGENTS.get(key)
+        if agent is None:
+            metrics.AGENT_CACHE.inc(model=model_name, result="miss")
+            t0 = time.perf_counter()
+            agent = load_agent(model_name, env, N, runtime=runtime, quantize=quantize,
+                               student=student, universal=universal)
+            metrics.MODEL_LOAD_SECONDS.observe(time.perf_counter() - t0,
+                                               model=model_name, runtime=runtime)
+            _AGENTS[key] = agent
+        else:
+            metrics.AGENT_CACHE.inc(model=model_name, result="hit")
+    return agent
+
+def set_state(env: DiscreteActionWrapper, state: List[List[int]]) -> np.ndarray:
+    """
+    Подсовывает в env уже готовое состояние, возвращает первое (плоское) наблюдение.
     """
     # Разворачиваем raw env и вручную ставим state
     raw: WaterSortEnvFixed = env.env
     raw.state = np.array(state, dtype=int)
     raw.prev_state = raw._get_obs()  # чтобы wrapper.prev_state тоже был валиден
     raw.steps = 0
+    raw.prev_action = None
     raw.recent_states.clear()
+    return raw._get_obs().flatten()
 
-    # Получаем первое наблюдение
-    obs = raw._get_obs().flatten()
-    done = False
-    steps = 0
-    actions: List[List[int]] = []
-    while not done and steps < max_steps:
-        act = agent.sample_actions_masked(obs[None], env)[0]
-        actions.append([int(act // N), int(act % N)])
-        obs, _, done, truncated, _ = env.step(act)
-        steps += 1
-        if truncated:
-            break
+def solve_with_agent(
+    agent: MaskedDQNAgent,
+    env: DiscreteActionWrapper,
+    state: List[List[int]],
+    N: int,
+    max_steps: int = 100,
+    stats: Optional[Dict] = None
+) -> Optional[List[List[int]]]:
+    """
+    Подсовывает в env уже готовое состояние и запускает агент.
+    Если передан stats, в него пишутся "steps" и "outcome"
+    (solved | step_limit | no_moves | cycle | dead_end, см. rollout.py).
+    """
+    obs = set_state(env, state)
+    done, actions, outcome = play(agent, env, obs, N, env.env.max_layers, max_steps)
 
+    if stats is not None:
+        stats["steps"] = len(actions)
+        stats["outcome"] = outcome
     return actions if done else None
 
 def solve_level(
@@ -111,31 +186,55 @@ def solve_level(
     user_moves: int
 ) -> Dict:
     """
-    Решает уровень по двум сценариям:
+    Решает уровень по трём сценариям:
       - user_moves == 0: возвращаем готовый solution из БД.
-      - user_moves > 0: решаем уровнь через агента, используя create_env и load_agent.
+      - состояние лежит на пути сохранённого решения (trajectories.py):
+        возвращаем оставшийся хвост этого решения.
+      - иначе решаем уровнь через агента, используя create_env и load_agent.
     """
     conn = psycopg2.connect(**DB_CFG)
     cur  = conn.cursor()
 
     # Сценарий 1: возвращаем solution из БД, если пользователь не ходил
     if user_moves == 0:
-        cur.execute('SELECT solution FROM "Levels" WHERE id = %s', (level_id,))
+        if level_codec.has_blob_columns(cur):
+            cur.execute('SELECT solution_bin, CASE WHEN solution_bin IS NULL THEN solution END '
+                        'FROM "Levels" WHERE id = %s', (level_id,))
+        else:
+            cur.execute('SELECT NULL, solution FROM "Levels" WHERE id = %s', (level_id,))
         row = cur.fetchone()
         cur.close(); conn.close()
-        if row and row[0]:
-            sol = row[0]
+        sol = level_codec.solution_from_row(*row) if row else None
+        if sol:
+            metrics.SOLVE_OUTCOMES.inc(model="-", source="solve", outcome="stored")
             return {"solvable": True, "ai_steps": len(sol), "solution": sol}
         else:
+            metrics.SOLVE_OUTCOMES.inc(model="-", source="solve", outcome="unsolvable")
             return {"solvable": False, "ai_steps": 0, "solution": []}
 
-    # Сценарий 2: загружаем модель из level_format
+    # Сценарий 2: состояние есть в индексе траекторий — модель не нужна
+    try:
+        hit = trajectories.lookup(cur, state, level_id)
+    except psycopg2.Error:
+        conn.rollback()          # индекса ещё нет (не было ingest/backfill)
+        hit = None
+    if hit is not None:
+        cur.close(); conn.close()
+        suffix = hit[1]
+        metrics.SOLVE_OUTCOMES.inc(model="-", source="solve", outcome="trajectory")
+        return {"solvable": True, "ai_steps": len(suffix), "solution": suffix}
+
+    # Сценарий 3: загружаем модель из level_format
     cur.execute('SELECT level_format FROM "Levels" WHERE id = %s', (level_id,))
     row = cur.fetchone()
     cur.close(); conn.close()
-    if not row or not row[0]:
+    model_name = row[0] if row and row[0] else None
+    if model_name is None and universal_policy.AI_UNIVERSAL:
+        # общей сети формат не нужен — берём его из самого состояния
+        model_name = universal_policy.infer_model_name(state)
+    if model_name is None:
         return {"solvable": False, "ai_steps": 0, "solution": []}
-    model_name = row[0]
+    metrics.set_request_model(model_name)
 
     try:
         N, K, L = map(int, model_name.split("_")) # N-Число пробирок, K-сколько пустых, L - Число слоёв
@@ -145,13 +244,21 @@ def solve_level(
     # Создаём окружение и агента
     env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K)
     try:
-        agent = load_agent(model_name, env, N)
-        sol = solve_with_agent(agent, env, state, N)
+        agent = get_agent(model_name, env, N)
+        stats: Dict = {}
+        sol = solve_with_agent(agent, env, state, N, stats=stats)
+        metrics.ROLLOUT_STEPS.observe(stats["steps"], model=model_name, source="solve")
+        metrics.SOLVE_OUTCOMES.inc(model=model_name, source="solve", outcome=stats["outcome"])
         if sol is None:
             return {"solvable": False, "ai_steps": 0, "solution": []}
+        if OPTIMIZE_SOLUTIONS:
+            short = shorten(state, sol, LIVE_WINDOW, LIVE_MAX_EXPANSIONS)
+            metrics.SOLUTION_STEPS_SAVED.inc(len(sol) - len(short), model=model_name, source="solve")
+            sol = short
         return {"solvable": True, "ai_steps": len(sol), "solution": sol}
-    except Exception as e:
-        print(f"[solver] Error solving level {level_id}: {e}")
+    except Exception:
+        logger.exception("[solver] Error solving level %s", level_id)
+        metrics.ERRORS.inc(where="solve_level", model=model_name)
         return {"solvable": False, "ai_steps": 0, "solution": []}
 
 # # CLI для отладки
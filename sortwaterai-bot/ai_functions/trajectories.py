@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/trajectories.py
+"""
+Индекс состояний вдоль сохранённых решений уровней.
+
+Для каждого уровня с solution в таблице "LevelTrajectories" лежит по строке
+на каждое состояние пути до решения: (level_id, state_hash, step), где
+step — сколько ходов решения уже сделано. Если игрок стоит в одном из этих
+состояний (прошёл начало решения или пришёл туда сам), ответ на solve/hint —
+просто хвост solution[step:], без загрузки модели и прогона агента.
+
+Индекс заполняется при добавлении уровней (add_ai_level.run_ingest);
+для уже существующих уровней:
+  python -m ai_functions.trajectories backfill
+"""
+import os
+import sys
+import json
+import argparse
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from ai_functions.solution_optimizer import replay
+from ai_functions import level_codec
+from ai_functions.hashing import fingerprint, state_hash   # noqa: F401 — реэкспорт
+
+DB_CFG = {
+    "dbname":   os.getenv("POSTGRES_DB"),
+    "user":     os.getenv("POSTGRES_USER"),
+    "password": os.getenv("POSTGRES_PASSWORD"),
+    "host":     os.getenv("POSTGRES_HOST", "localhost"),
+    "port":     int(os.getenv("POSTGRES_PORT", 5432)),
+}
+
+
+def ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS "LevelTrajectories" (
+            level_id   INTEGER  NOT NULL REFERENCES "Levels"(id) ON DELETE CASCADE,
+            state_hash CHAR(40) NOT NULL,
+            step       SMALLINT NOT NULL,
+            PRIMARY KEY (level_id, step)
+        )
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS "LevelTrajectories_state_hash"
+        ON "LevelTrajectories" (state_hash)
+    """)
+
+
+def trajectory_rows(level_id: int, state, solution) -> List[Tuple[int, str, int]]:
+    """
+    (level_id, state_hash, step) для каждого состояния пути, кроме финального
+    (из решённого подсказывать нечего).
+    """
+    states = replay(state, solution)
+    return [(level_id, state_hash(st), step) for step, st in enumerate(states[:-1])]
+
+
+def index_levels(cur, levels: Iterable[Tuple[int, Sequence, Sequence]]) -> int:
+    """
+    levels — (level_id, state, solution). Возвращает число вставленных строк.
+    """
+    rows = []
+    for level_id, state, solution in levels:
+        if not solution:
+            continue
+        try:
+            rows.extend(trajectory_rows(level_id, state, solution))
+        except ValueError as e:
+            print(f"⚠️  Level {level_id}: {e}", file=sys.stderr)
+    if rows:
+        execute_values(cur, """
+            INSERT INTO "LevelTrajectories" (level_id, state_hash, step)
+            VALUES %s ON CONFLICT DO NOTHING
+        """, rows)
+    return len(rows)
+
+
+def lookup(cur, state: Sequence[Sequence[int]],
+           level_id: Optional[int] = None) -> Optional[Tuple[int, List[List[int]]]]:
+    """
+    Кратчайший известный хвост решения из state: (level_id, ходы) или None.
+    Состояние — это состояние, поэтому подходит путь любого уровня;
+    при равной длине предпочитаем текущий уровень.
+    """
+    if level_codec.has_blob_columns(cur):
+        # после миграции (level_codec.py) JSON нужен только строкам без solution_bin
+        cur.execute("""
+            SELECT t.level_id, t.step, l.solution_bin,
+                   CASE WHEN l.solution_bin IS NULL THEN l.solution END
+            FROM "LevelTrajectories" t
+            JOIN "Levels" l ON l.id = t.level_id
+            WHERE t.state_hash = %s
+            ORDER BY coalesce(octet_length(l.solution_bin), jsonb_array_length(l.solution)) - t.step,
+                     (t.level_id = %s) DESC
+            LIMIT 1
+        """, (state_hash(state), level_id))
+    else:
+        cur.execute("""
+            SELECT t.level_id, t.step, NULL, l.solution
+            FROM "LevelTrajectories" t
+            JOIN "Levels" l ON l.id = t.level_id
+            WHERE t.state_hash = %s
+            ORDER BY jsonb_array_length(l.solution) - t.step, (t.level_id = %s) DESC
+            LIMIT 1
+        """, (state_hash(state), level_id))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    found_id, step, solution_bin, solution = row
+    return found_id, level_codec.solution_from_row(solution_bin, solution)[step:]
+
+
+def backfill(batch: int = 1000) -> int:
+    """
+    Индексирует все уровни с solution, которых ещё нет в индексе.
+    """
+    conn = psycopg2.connect(**DB_CFG)
+    cur = conn.cursor()
+    ensure_table(cur)
+    conn.commit()
+
+    total = 0
+    last_id = 0
+    while True:
+        cur.execute("""
+            SELECT l.id, l.level_data, l.solution
+            FROM "Levels" l
+            WHERE l.id > %s AND l.solution IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM "LevelTrajectories" t WHERE t.level_id = l.id)
+            ORDER BY l.id
+            LIMIT %s
+        """, (last_id, batch))
+        rows = cur.fetchall()
+        if not rows:
+            break
+        levels = []
+        for level_id, raw, solution in rows:
+            try:
+                levels.append((level_id, json.loads(raw)["state"], solution))
+            except (ValueError, KeyError, TypeError):
+                continue
+        total += index_levels(cur, levels)
+        conn.commit()
+        last_id = rows[-1][0]
+        print(f"… до id={last_id}: {total} состояний")
+
+    cur.close()
+    conn.close()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Индекс состояний вдоль решений уровней")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    bf = sub.add_parser("backfill", help="проиндексировать уровни, которых ещё нет в индексе")
+    bf.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.cmd == "backfill":
+        total = backfill(args.batch)
+        print(f"✅  Проиндексировано состояний: {total}")
+
+
+if __name__ == "__main__":
+    main()
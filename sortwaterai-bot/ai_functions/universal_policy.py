@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/universal_policy.py
+"""
+Одна сеть на все конфигурации N_K_L вместо отдельного .pth на каждую.
+
+Вход — состояние, дополненное до NMAX×LMAX (7×5) и закодированное one‑hot
+по клетке: канал 0 — пустой слой, 1+c — цвет c; у клеток‑заглушек все
+каналы нули. Короткие пробирки дополняются сверху (index 0 — верх), чтобы
+дно всегда было в последнем слое. Выход — Q по NMAX·NMAX ходам; ConfigView
+выбирает из них N·N ходов своей конфигурации и даёт тот же интерфейс, что
+MaskedDQNAgent (predict_qvalues / sample_actions_masked), так что rollout.play
+и solve_with_agent работают с ней без изменений.
+
+Сеть учится дистилляцией (distill.py) сразу от всех учителей ai_models/*.pth
+на смеси их состояний, с раундами DAgger по каждой конфигурации. Проверка —
+та же, что у учеников distill.py, но по каждой конфигурации отдельно: в
+ai_models/universal/manifest.json пишется отчёт и approved для каждой N_K_L.
+
+При AI_UNIVERSAL=1 solver.load_agent берёт общую сеть для одобренных
+конфигураций и для тех, у которых нет своего .pth; solve_level тогда
+решает и уровни без level_format (N и L берутся из формы state).
+Сеть загружается один раз на процесс и делится всеми конфигурациями.
+
+Пример:
+  python -m ai_functions.universal_policy train --levels 500
+  python -m ai_functions.universal_policy check 7_2_4 7_2_5
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from ai_functions.dqn_agent import MaskedDQNAgent, masked_actions
+from ai_functions import distill
+
+MODELS_DIR     = Path(__file__).parent / "ai_models"
+UNIVERSAL_DIR  = MODELS_DIR / "universal"
+UNIVERSAL_PATH = UNIVERSAL_DIR / "policy.pth"
+MANIFEST_PATH  = UNIVERSAL_DIR / "manifest.json"
+
+AI_UNIVERSAL = os.getenv("AI_UNIVERSAL", "0") == "1"
+
+NMAX, LMAX = 7, 5
+CHANNELS   = NMAX                # пусто + до NMAX-1 цветов
+INPUT_DIM  = NMAX * LMAX * CHANNELS
+ACTIONS    = NMAX * NMAX
+
+DEFAULT_ARCH = [512, 256]
+
+
+def load_manifest() -> Dict:
+    if not MANIFEST_PATH.exists():
+        return {}
+    with open(MANIFEST_PATH, "r") as fp:
+        return json.load(fp)
+
+
+def fits(N: int, L: int) -> bool:
+    return N <= NMAX and L <= LMAX
+
+
+def infer_model_name(state: Sequence[Sequence[int]]) -> str:
+    """
+    N_K_L по самому состоянию: K — пробирок сверх числа цветов.
+    """
+    N, L = len(state), len(state[0])
+    colors = {c for tube in state for c in tube if c >= 0}
+    return f"{N}_{N - len(colors)}_{L}"
+
+
+def covers(model_name: str) -> bool:
+    """
+    Общая сеть обслуживает конфигурацию, если прошла на ней проверку
+    или своей модели у конфигурации нет вовсе.
+    """
+    N, K, L = map(int, model_name.split("_"))
+    if not fits(N, L) or not UNIVERSAL_PATH.exists():
+        return False
+    report = load_manifest().get("configs", {}).get(model_name)
+    if report is not None:
+        return bool(report.get("approved"))
+    return not (MODELS_DIR / f"{model_name}.pth").exists()
+
+
+# ------------------------- encoding --------------------------------------
+def encode(obs: np.ndarray, N: int, L: int) -> np.ndarray:
+    """
+    (B, N*L) наблюдений → (B, INPUT_DIM) one‑hot с дополнением до NMAX×LMAX.
+    """
+    x = np.asarray(obs).reshape(-1, N, L).astype(np.int64)
+    out = np.zeros((x.shape[0], NMAX, LMAX, CHANNELS), dtype=np.float32)
+    b, n, l = np.indices(x.shape)
+    out[b, n, l + (LMAX - L), np.where(x < 0, 0, x + 1)] = 1.0
+    return out.reshape(x.shape[0], INPUT_DIM)
+
+
+def action_index(N: int) -> np.ndarray:
+    """
+    Для хода a = fr*N+to конфигурации — его номер fr*NMAX+to в выходе сети.
+    """
+    fr, to = np.divmod(np.arange(N * N), N)
+    return fr * NMAX + to
+
+
+class ConfigView:
+    """
+    Общая сеть, видимая как агент конкретной конфигурации N×L.
+    """
+
+    def __init__(self, net: MaskedDQNAgent, N: int, L: int):
+        self.net, self.N, self.L = net, N, L
+        self.q_net = net.q_net
+        self._idx = action_index(N)
+        self.epsilon = 0
+
+    def eval(self):
+        return self
+
+    def predict_qvalues(self, obs: np.ndarray) -> np.ndarray:
+        return self.net.predict_qvalues(encode(obs, self.N, self.L))[:, self._idx]
+
+    def sample_actions_masked(self, obs: np.ndarray, env) -> np.ndarray:
+        return masked_actions(self.predict_qvalues(obs), obs, env, self.epsilon)
+
+
+def build_net(arch: List[int], device="cpu") -> MaskedDQNAgent:
+    agent = MaskedDQNAgent(state_dim=INPUT_DIM, action_dim=ACTIONS, net_arch=arch, device=device)
+    agent.epsilon = 0
+    return agent
+
+
+_shared: Optional[MaskedDQNAgent] = None
+_shared_lock = threading.Lock()
+
+
+def shared_net() -> MaskedDQNAgent:
+    """
+    Общая сеть, загруженная один раз на процесс.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            net = build_net(load_manifest().get("arch", DEFAULT_ARCH))
+            net.load_state_dict(torch.load(UNIVERSAL_PATH, map_location="cpu"))
+            net.eval()
+            _shared = net
+    return _shared
+
+
+def load_view(N: int, L: int) -> ConfigView:
+    return ConfigView(shared_net(), N, L)
+
+
+# ------------------------- training --------------------------------------
+def _pad_targets(teacher_q: np.ndarray, masks: np.ndarray, N: int) -> Tuple[np.ndarray, np.ndarray]:
+    idx = action_index(N)
+    q = np.zeros((len(teacher_q), ACTIONS), dtype=np.float32)
+    m = np.zeros((len(masks), ACTIONS), dtype=bool)
+    q[:, idx] = teacher_q
+    m[:, idx] = masks
+    return q, m
+
+
+def train(models: List[str], arch: List[int], n_levels: int = 500, rounds: int = 2,
+          epsilon: float = 0.1, epochs: int = 10, batch_size: int = 256, tau: float = 0.1,
+          lr: float = 1e-3, max_steps: int = 100, seed: int = 0) -> MaskedDQNAgent:
+    from ai_functions.solver     import create_env, load_agent
+    from ai_functions.level_sets import parse_model_name, seeded_levels
+
+    torch.manual_seed(seed)
+    net = build_net(arch)
+    net.optimizer = torch.optim.Adam(net.q_net.parameters(), lr=lr)
+    rng = random.Random(seed)
+
+    setups = []
+    for name in models:
+        N, K, L = parse_model_name(name)
+        env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K, max_steps=max_steps)
+        teacher = load_agent(name, env, N, runtime="eager", quantize=False,
+                             student=False, universal=False)
+        levels = seeded_levels(name, n_levels, distill.TRAIN_SEED + seed)
+        setups.append((name, N, L, env, teacher, levels))
+
+    X = np.empty((0, INPUT_DIM), dtype=np.float32)
+    TQ = np.empty((0, ACTIONS), dtype=np.float32)
+    M = np.empty((0, ACTIONS), dtype=bool)
+    for r in range(rounds + 1):
+        for name, N, L, env, teacher, levels in setups:
+            policy = teacher if r == 0 else ConfigView(net, N, L)
+            obs, masks = distill.collect(policy, env, N, levels, epsilon, max_steps, rng)
+            if not len(obs):
+                continue
+            q, m = _pad_targets(teacher.predict_qvalues(obs).astype(np.float32), masks, N)
+            X, TQ, M = np.concatenate([X, encode(obs, N, L)]), np.concatenate([TQ, q]), np.concatenate([M, m])
+        loss = distill.train(net, X, TQ, M, epochs, batch_size, tau, seed + r)
+        print(f"  раунд {r}: состояний {len(X)}, loss {loss:.4f}")
+    return net
+
+
+def check(models: List[str], net: MaskedDQNAgent, n_levels: int = 500, seed: int = 0,
+          max_solve_drop: float = 0.01, max_step_increase: float = 0.05) -> Dict[str, Dict]:
+    """
+    Проверка общей сети против модели каждой конфигурации (distill.check_student).
+    """
+    reports = {}
+    for name in models:
+        N, K, L = map(int, name.split("_"))
+        report = distill.check_student(name, ConfigView(net, N, L), n_levels, seed,
+                                       max_solve_drop, max_step_increase)
+        report.pop("arch", None)
+        reports[name] = report
+        mark = "✅" if report["approved"] else "🚫"
+        print(f'{mark} {name:>6}: solve {report["teacher_solve_rate"]:.3f}→{report["student_solve_rate"]:.3f}  '
+              f'steps {report["teacher_mean_steps"]:.2f}→{report["student_mean_steps"]:.2f}  '
+              f'move {report["teacher_move_us"]:.0f}→{report["student_move_us"]:.0f} µs')
+    return reports
+
+
+def load_all_seconds(models: List[str]) -> Tuple[float, float]:
+    """
+    Время загрузки всех моделей конфигураций против одной общей сети.
+    """
+    from ai_functions.solver import create_env, load_agent
+
+    t0 = time.perf_counter()
+    for name in models:
+        N, K, L = map(int, name.split("_"))
+        env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K)
+        load_agent(name, env, N, runtime="eager", quantize=False, student=False, universal=False)
+    per_config = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    net = build_net(load_manifest().get("arch", DEFAULT_ARCH))
+    net.load_state_dict(torch.load(UNIVERSAL_PATH, map_location="cpu"))
+    return per_config, time.perf_counter() - t0
+
+
+def summarize(models: List[str], reports: Dict[str, Dict], net: MaskedDQNAgent):
+    per_config_params = sum(r["teacher_params"] for r in reports.values())
+    per_config_s, universal_s = load_all_seconds(models)
+    approved = [m for m, r in reports.items() if r["approved"]]
+    print(f"\nпараметры: {per_config_params} в {len(reports)} моделях → {distill.param_count(net)} в одной; "
+          f"загрузка всех: {per_config_s:.2f}s → {universal_s:.2f}s; "
+          f"одобрено конфигураций: {len(approved)}/{len(reports)}")
+    return {"per_config_params": per_config_params, "universal_params": distill.param_count(net),
+            "per_config_load_seconds": per_config_s, "universal_load_seconds": universal_s}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Общая сеть для всех конфигураций N_K_L")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for cmd in ("train", "check"):
+        p = sub.add_parser(cmd, help="обучить и проверить" if cmd == "train" else "проверить сохранённую")
+        p.add_argument("models", nargs="*", help="N_K_L (по умолчанию все ai_models/*.pth)")
+        p.add_argument("--eval-levels", type=int, default=500)
+        p.add_argument("--seed", type=int, default=0)
+        p.add_argument("--max-solve-drop", type=float, default=0.01)
+        p.add_argument("--max-step-increase", type=float, default=0.05)
+        if cmd == "train":
+            p.add_argument("--arch", type=int, nargs="+", default=DEFAULT_ARCH)
+            p.add_argument("--levels", type=int, default=500, help="уровней на конфигурацию")
+            p.add_argument("--rounds", type=int, default=2)
+            p.add_argument("--epochs", type=int, default=10)
+            p.add_argument("--tau", type=float, default=0.1)
+    args = parser.parse_args()
+
+    models = args.models or sorted(p.stem for p in MODELS_DIR.glob("*.pth"))
+    for name in models:
+        N, K, L = map(int, name.split("_"))
+        if not fits(N, L):
+            print(f"{name} не помещается в {NMAX}×{LMAX}", file=sys.stderr)
+            return
+
+    manifest = load_manifest()
+    if args.cmd == "train":
+        t0 = time.perf_counter()
+        net = train(models, args.arch, args.levels, args.rounds, epochs=args.epochs,
+                    tau=args.tau, seed=args.seed)
+        UNIVERSAL_DIR.mkdir(parents=True, exist_ok=True)
+        torch.save(net.state_dict(), UNIVERSAL_PATH)
+        manifest = {"arch": args.arch, "nmax": NMAX, "lmax": LMAX,
+                    "train_seconds": round(time.perf_counter() - t0, 1), "configs": {}}
+    else:
+        if not UNIVERSAL_PATH.exists():
+            print(f"Нет {UNIVERSAL_PATH}, сначала train", file=sys.stderr)
+            return
+        net = shared_net()
+
+    reports = check(models, net, args.eval_levels, args.seed,
+                    args.max_solve_drop, args.max_step_increase)
+    manifest.setdefault("configs", {}).update(reports)
+    manifest["summary"] = summarize(models, reports, net)
+    with open(MANIFEST_PATH, "w") as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
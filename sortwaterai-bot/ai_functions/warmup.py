@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# sortwaterai-bot/ai_functions/warmup.py
+"""
+Прогрев AI‑сервиса: загрузка агентов всех моделей ai_models/*.pth в кэш
+solver.get_agent и по одному прогону каждого.
+
+api.py импортирует solver (а с ним torch и gymnasium) только при первом
+запросе, поэтому сервис поднимается и отвечает на /health сразу, а модели
+грузятся в фоне (start()). /ready отдаёт status() и становится 200, когда
+прогрев закончился. serve.py вызывает preload() синхронно в родителе
+до fork — воркеры получают уже прогретый кэш.
+
+AI_WARMUP=0 отключает фоновый прогрев (модели грузятся по первому запросу).
+"""
+import os
+import sys
+import time
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+MODELS_DIR = Path(__file__).parent / "ai_models"
+
+AI_WARMUP = os.getenv("AI_WARMUP", "1") == "1"
+
+_state: Dict = {"started": False, "done": False, "loaded": [], "total": 0,
+                "error": None, "seconds": None}
+_lock = threading.Lock()
+
+
+def model_names() -> List[str]:
+    names = []
+    for path in sorted(MODELS_DIR.glob("*.pth")):
+        try:
+            N, K, L = map(int, path.stem.split("_"))
+        except ValueError:
+            continue
+        names.append(path.stem)
+    return names
+
+
+def preload() -> List[str]:
+    """
+    Загружает и прогревает агентов всех моделей. Возвращает их имена.
+    """
+    from ai_functions.solver import create_env, get_agent
+
+    names = model_names()
+    t0 = time.perf_counter()
+    with _lock:
+        _state.update(started=True, total=len(names))
+    for name in names:
+        N, K, L = map(int, name.split("_"))
+        env = create_env(num_tubes=N, num_colors=N-K, max_layers=L, num_empty=K)
+        agent = get_agent(name, env, N)
+        obs, _ = env.reset()
+        agent.predict_qvalues(obs[None])
+        with _lock:
+            _state["loaded"].append(name)
+    with _lock:
+        _state.update(done=True, seconds=round(time.perf_counter() - t0, 3))
+    return names
+
+
+def _run():
+    try:
+        preload()
+    except Exception as e:
+        with _lock:
+            _state["error"] = str(e)
+        print(f"❌ Warmup: {e}", file=sys.stderr)
+
+
+def start() -> bool:
+    """
+    Запускает прогрев в фоновом потоке (один раз за процесс).
+    """
+    with _lock:
+        if _state["started"]:
+            return False
+        _state["started"] = True
+    threading.Thread(target=_run, name="warmup", daemon=True).start()
+    return True
+
+
+def is_ready() -> bool:
+    return _state["done"]
+
+
+def status() -> Dict:
+    with _lock:
+        return {**_state, "loaded": len(_state["loaded"])}
@@ -87,6 +87,8 @@ class WaterSortEnvFixed(gym.Env):
 
         self.recent_states = deque(maxlen=10)
 
+        self.scramble_solution = None  # решение уровня, полученного обратным перемешиванием
+
     def reset(self, seed=None, options=None, previous=False):
         """
         Сброс окружения (начало нового эпизода).
@@ -98,6 +100,10 @@ class WaterSortEnvFixed(gym.Env):
           3) Случайно генерируем какую-то расстановку цветов
              (можно усложнить логику, чтобы гарантировать выполнимость).
           4) Возвращаем текущий observation и пустой словарь info.
+
+        options={"scramble_depth": d} вместо случайной раскладки строит уровень
+        обратными переливаниями от решённого состояния (см. scramble.py):
+        такой уровень решаем, а решение сохраняется в self.scramble_solution.
         """
         super().reset(seed=seed)
 
@@ -107,8 +113,17 @@ class WaterSortEnvFixed(gym.Env):
         max_tries = 100
         num_attempts = 0
 
+        scramble_depth = (options or {}).get("scramble_depth")
+        self.scramble_solution = None
+
         if previous and (self.prev_state is not None):
           self.state = self.prev_state.copy()
+        elif scramble_depth:
+          from ai_functions.scramble import scramble
+          state, self.scramble_solution = scramble(
+              self.num_tubes, self.num_empty, self.max_layers, int(scramble_depth), self.np_random
+          )
+          self.state = np.array(state, dtype=int)
         else:
           while True:
             # Создаём пустую матрицу (N,K)
@@ -13,6 +13,8 @@ from aiogram import Bot, Dispatcher, executor, types
 from dotenv import load_dotenv
 import httpx
 
+from delete_data_progress import delete_progress
+
 # ─── Конфиг ────────────────────────────────────────────────────────────────
 load_dotenv()
 TOKEN     = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -68,7 +70,9 @@ async def cmd_delete(msg: types.Message):
             if not row:
                 return await msg.reply("Аккаунт не найден.")
             user_id = row[0]
-            cur.execute('DELETE FROM "Progress" WHERE "userId"=%s', (user_id,))
+            # прогресс — пачками по id, как delete_data_progress.py, но в одной
+            # транзакции с удалением пользователя (её коммитит with conn)
+            delete_progress(user_id=user_id, conn=conn, commit=False)
             cur.execute('DELETE FROM "Users"    WHERE id=%s',      (user_id,))
             await msg.reply("Ваши данные удалены.")
     except Exception:
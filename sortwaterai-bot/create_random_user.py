@@ -1,82 +1,224 @@
+#!/usr/bin/env python3
+"""
+Генератор синтетических пользователей и прогресса для нагрузочных тестов.
+
+Пользователи и их Progress пишутся через COPY пачками по --batch
+пользователей (каждая пачка — своя транзакция), так что миллионы строк
+грузятся за минуты. Всё, кроме id, определяется --seed: тот же seed на той же
+таблице Levels даёт те же данные.
+
+Прогресс повторяет то, как играют в приложении: уровни идут подряд по id,
+пользователь прошёл первые k (k — экспоненциальное распределение со средним
+--mean-levels, хвост длинный), а на уровне k+1 у него строка in_progress
+с начальным состоянием уровня. Доля --ai-share пройденных уровней
+решена подсказкой AI (solvedByAI). Имена — <prefix><id>, чтобы синтетических
+пользователей было легко найти и удалить.
+
+  python create_random_user.py --users 1000000 --seed 1
+  python create_random_user.py --users 0 --bench          # только замерить запросы
+"""
+import io
 import os
-import random
-import string
+import csv
 import json
-from datetime import datetime
+import time
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
 import psycopg2
 from dotenv import load_dotenv
 
 load_dotenv()
 
+PREFIX = "load_"
+
+USER_COLUMNS = ("id", "username", "telegram_id", "coins", "last_daily_reward",
+                "score", "createdAt", "updatedAt")
+PROGRESS_COLUMNS = ("userId", "levelId", "status", "state", "moves", "solvedByAI",
+                    "createdAt", "updatedAt")
+
+# Запросы backend: лидерборд (leaderboardController) и текущий уровень (getProgressByUser)
+BENCH_QUERIES = {
+    "leaderboard": """
+        SELECT p."userId", count(p.status) AS "completedCount", u.username
+        FROM "Progress" p LEFT JOIN "Users" u ON u.id = p."userId"
+        WHERE p.status = 'completed'
+        GROUP BY p."userId", u.id
+        ORDER BY "completedCount" DESC
+    """,
+    "current_progress": """
+        SELECT * FROM "Progress"
+        WHERE "userId" = %s AND status = 'in_progress'
+        ORDER BY "updatedAt" DESC LIMIT 1
+    """,
+}
+
+
 def get_db_config():
     """Загружаем параметры подключения к БД из .env."""
     return {
-        "dbname": os.getenv("POSTGRES_DB"),
-        "user": os.getenv("POSTGRES_USER"),
+        "dbname":   os.getenv("POSTGRES_DB"),
+        "user":     os.getenv("POSTGRES_USER"),
         "password": os.getenv("POSTGRES_PASSWORD"),
-        "host": "localhost",
-        "port": int(os.getenv("POSTGRES_PORT", 5432))
+        "host":     os.getenv("POSTGRES_HOST", "localhost"),
+        "port":     int(os.getenv("POSTGRES_PORT", 5432)),
     }
 
-def generate_random_username(length=8):
-    """Создает имя пользователя вида User_xxxx, где xxxx - случайные буквы/цифры."""
-    chars = string.ascii_lowercase + string.digits
-    return "User_" + "".join(random.choice(chars) for _ in range(length))
-
-def generate_random_telegram_id():
-    """Формирует случайное число в заданном диапазоне для имитации telegram_id."""
-    return str(random.randint(10_000_000, 99_999_999))
-
-def create_test_users_and_progress(num_users=20):
-    db_config = get_db_config()
-    conn = psycopg2.connect(**db_config)
-    cursor = conn.cursor()
-
-    created_user_ids = []
-    now = datetime.utcnow()
-
-    # 1) Создаем N пользователей
-    for _ in range(num_users):
-        username = generate_random_username()
-        telegram_id = generate_random_telegram_id()
-        coins = 0
-        last_daily_reward = None
-
-        cursor.execute(
-            """
-            INSERT INTO "Users" 
-            ("username", "telegram_id", "coins", "last_daily_reward", "createdAt", "updatedAt")
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING "id"
-            """,
-            (username, telegram_id, coins, last_daily_reward, now, now)
-        )
-        new_user_id = cursor.fetchone()[0]
-        created_user_ids.append(new_user_id)
-
-    # 2) Для каждого пользователя создаём запись в таблице Progress со статусом "completed" для levelId=1
-    example_state = {"state": [[0, 0, 0, 0], [-1, -1, -1, -1]]}  # Просто пример состояния
-    for user_id in created_user_ids:
-        cursor.execute(
-            """
-            INSERT INTO "Progress"
-            ("userId", "levelId", "status", "state", "createdAt", "updatedAt")
-            VALUES (%s, 1, 'completed', %s, %s, %s)
-            """,
-            (
-                user_id,
-                json.dumps(example_state),
-                now,
-                now
-            )
-        )
 
+def load_levels(cur) -> List[Tuple[int, int, str, str]]:
+    """
+    Уровни по порядку id: (id, ai_steps, начальное состояние JSON, решённое состояние JSON).
+    """
+    cur.execute('SELECT id, ai_steps, level_data FROM "Levels" ORDER BY id')
+    levels = []
+    for level_id, ai_steps, raw in cur.fetchall():
+        try:
+            state = json.loads(raw)["state"]
+        except (ValueError, TypeError, KeyError):
+            continue
+        L = len(state[0])
+        colors = sorted({c for tube in state for c in tube if c != -1})
+        solved = [[c] * L for c in colors] + [[-1] * L] * (len(state) - len(colors))
+        levels.append((level_id, ai_steps or 0, json.dumps(state), json.dumps(solved)))
+    return levels
+
+
+def reserve_ids(cur, count: int) -> List[int]:
+    """
+    count значений из последовательности "Users".id (без гонок с приложением).
+    """
+    cur.execute("""SELECT nextval(pg_get_serial_sequence('"Users"', 'id'))
+                   FROM generate_series(1, %s)""", (count,))
+    return [r[0] for r in cur.fetchall()]
+
+
+def generate_batch(rng: random.Random, ids: List[int], levels, now: datetime, days: int,
+                   mean_levels: float, ai_share: float, prefix: str) -> Tuple[io.StringIO, io.StringIO, int]:
+    """
+    CSV для COPY: пользователи ids и их Progress. Возвращает (users, progress, строк progress).
+    """
+    users, progress = io.StringIO(), io.StringIO()
+    uw, pw = csv.writer(users), csv.writer(progress)
+    rows = 0
+    for user_id in ids:
+        created = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        active = timedelta(seconds=(now - created).total_seconds() * rng.random())
+        completed = min(len(levels), int(rng.expovariate(1 / mean_levels))) if levels else 0
+
+        trophies = [int(rng.expovariate(1 / (1 + completed / 20))) for _ in range(3)]
+        score = {"🏆": trophies[0], "🎖️": trophies[1], "🥉": trophies[2]}
+        reward = created + active if rng.random() < 0.5 else None
+        uw.writerow((user_id, f"{prefix}{user_id}", str(rng.randint(10_000_000, 9_999_999_999)),
+                     rng.randint(0, 50 * (completed + 1)), reward,
+                     json.dumps(score, ensure_ascii=False), created, created + active))
+
+        t = created
+        step = active / (completed + 1)
+        for level_id, ai_steps, _, solved in levels[:completed]:
+            t += step
+            by_ai = rng.random() < ai_share
+            moves = ai_steps + (0 if by_ai else int(rng.expovariate(1 / (1 + ai_steps / 2))))
+            pw.writerow((user_id, level_id, "completed", solved, moves, by_ai, t - step, t))
+            rows += 1
+        if completed < len(levels):
+            level_id, _, state, _ = levels[completed]
+            pw.writerow((user_id, level_id, "in_progress", state, 0, False, created + active,
+                         created + active))
+            rows += 1
+    users.seek(0)
+    progress.seek(0)
+    return users, progress, rows
+
+
+def copy_rows(cur, table: str, columns, data: io.StringIO):
+    cols = ", ".join(f'"{c}"' for c in columns)
+    cur.copy_expert(f'COPY "{table}" ({cols}) FROM STDIN WITH (FORMAT csv)', data)
+
+
+def create_test_users_and_progress(num_users: int = 20, seed: int = 0, batch: int = 10_000,
+                                   mean_levels: float = 15, ai_share: float = 0.1,
+                                   days: int = 180, prefix: str = PREFIX) -> Tuple[int, int]:
+    """
+    Создаёт num_users пользователей с прогрессом. Возвращает (пользователей, строк Progress).
+    """
+    conn = psycopg2.connect(**get_db_config())
+    cur = conn.cursor()
+    levels = load_levels(cur)
+    rng = random.Random(seed)
+    # фиксированная «текущая» дата — иначе один seed давал бы разные createdAt
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(days=days)
+
+    users = progress = 0
+    t0 = time.perf_counter()
+    for start in range(0, num_users, batch):
+        n = min(batch, num_users - start)
+        ids = reserve_ids(cur, n)
+        user_csv, progress_csv, rows = generate_batch(rng, ids, levels, now, days,
+                                                      mean_levels, ai_share, prefix)
+        copy_rows(cur, "Users", USER_COLUMNS, user_csv)
+        copy_rows(cur, "Progress", PROGRESS_COLUMNS, progress_csv)
+        conn.commit()
+        users += n
+        progress += rows
+        rate = users / (time.perf_counter() - t0)
+        print(f"… {users}/{num_users} пользователей, Progress: {progress} ({rate:,.0f} польз./с)")
+
+    cur.execute('ANALYZE "Users"')
+    cur.execute('ANALYZE "Progress"')
     conn.commit()
-    cursor.close()
+    cur.close()
     conn.close()
+    return users, progress
 
-    print(f"✅ Создано {num_users} пользователей, у каждого progress по levelId=1 со статусом 'completed'.")
 
-if __name__ == "__main__":
-    create_test_users_and_progress(num_users=20)
+def bench(repeat: int = 5, seed: int = 0):
+    """
+    Время запросов backend на текущих данных (медиана repeat прогонов).
+    """
+    conn = psycopg2.connect(**get_db_config())
+    cur = conn.cursor()
+    cur.execute('SELECT min(id), max(id) FROM "Users"')
+    lo, hi = cur.fetchone()
+    if lo is None:
+        print("Таблица Users пуста.")
+        return
+    rng = random.Random(seed)
+    for name, query in BENCH_QUERIES.items():
+        times = []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            cur.execute(query, (rng.randint(lo, hi),) if "%s" in query else None)
+            cur.fetchall()
+            times.append(time.perf_counter() - t)
+        print(f"{name:>16}: {sorted(times)[len(times) // 2] * 1e3:.1f} ms")
+    cur.close()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические Users / Progress через COPY")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch", type=int, default=10_000, help="пользователей на COPY")
+    parser.add_argument("--mean-levels", type=float, default=15, help="в среднем пройдено уровней")
+    parser.add_argument("--ai-share", type=float, default=0.1, help="доля уровней, решённых AI")
+    parser.add_argument("--days", type=int, default=180, help="за сколько дней регистрации")
+    parser.add_argument("--prefix", default=PREFIX, help="префикс имён пользователей")
+    parser.add_argument("--bench", action="store_true", help="замерить запросы backend")
+    args = parser.parse_args()
 
+    if args.users:
+        t0 = time.perf_counter()
+        users, progress = create_test_users_and_progress(
+            args.users, args.seed, args.batch, args.mean_levels, args.ai_share,
+            args.days, args.prefix)
+        print(f"✅ Создано {users} пользователей, строк Progress: {progress} "
+              f"за {time.perf_counter() - t0:.1f}s")
+    if args.bench:
+        bench(seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
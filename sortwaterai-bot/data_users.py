@@ -1,39 +1,9 @@
-import os
-import psycopg2
-from dotenv import load_dotenv
+#!/usr/bin/env python3
+# Оставлен для совместимости: то же, что python export_data.py users [опции]
+# (потоковая выгрузка серверным курсором вместо fetchall всей таблицы).
+import sys
 
-load_dotenv()
-
-def get_db_config():
-    return {
-        "dbname": os.getenv("POSTGRES_DB"),
-        "user": os.getenv("POSTGRES_USER"),
-        "password": os.getenv("POSTGRES_PASSWORD"),
-        "host": "localhost",
-        "port": int(os.getenv("POSTGRES_PORT", 5432))
-    }
-
-def main():
-    db_config = get_db_config()
-
-    try:
-        conn = psycopg2.connect(**db_config)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM "Users"')
-        rows = cursor.fetchall()
-
-        if not rows:
-            print("Таблица Users пуста.")
-        else:
-            for row in rows:
-                print(row)
-
-        cursor.close()
-        conn.close()
-
-    except Exception as e:
-        print("Ошибка при подключении/чтении таблицы Users:", e)
+from export_data import main
 
 if __name__ == "__main__":
-    main()
+    main(["users"] + sys.argv[1:])
@@ -1,65 +1,153 @@
 #!/usr/bin/env python3
+"""
+Удаление записей Progress пачками, с архивом.
+
+Вместо одного DELETE на всю таблицу (долгая блокировка, раздутая таблица)
+строки удаляются диапазонами id по --batch строк, каждый диапазон — своя
+транзакция, между ними можно делать паузу (--pause). Перед удалением строки
+можно скопировать в таблицу‑архив (--archive-table, создаётся по образцу
+Progress) или дописать в NDJSON‑файл (--archive-file) — в той же транзакции,
+что и DELETE, так что в архив попадает ровно удалённое.
+
+  # прогресс конкретного пользователя
+  python delete_data_progress.py --user-id 42
+  # прогресс уровня 7 у всех, с архивом в таблицу
+  python delete_data_progress.py --level-id 7 --archive-table ProgressArchive
+  # удалить ВСЕ записи, по 10000 строк с паузой 0.2 с
+  python delete_data_progress.py --all --batch 10000 --pause 0.2 --archive-file progress.ndjson
+"""
 import os
+import sys
+import time
 import argparse
+from typing import Optional
+
 import psycopg2
+from psycopg2 import sql
 from dotenv import load_dotenv
 
 load_dotenv()
 
+BATCH = 5000
+
+
 def get_db_config():
     return {
         "dbname":   os.getenv("POSTGRES_DB"),
         "user":     os.getenv("POSTGRES_USER"),
         "password": os.getenv("POSTGRES_PASSWORD"),
-        "host":     "localhost",
+        "host":     os.getenv("POSTGRES_HOST", "localhost"),
         "port":     int(os.getenv("POSTGRES_PORT", 5432)),
     }
 
-def delete_progress(user_id=None, level_id=None):
-    where_clauses = []
-    params = []
 
+def delete_progress(user_id=None, level_id=None, batch: int = BATCH, pause: float = 0.0,
+                    archive_table: Optional[str] = None, archive_file: Optional[str] = None,
+                    conn=None, verbose: bool = False, commit: bool = True) -> int:
+    """
+    Удаляет записи Progress (все или по userId / levelId) пачками по id.
+    Возвращает число удалённых строк. Если conn не передан — открывает своё
+    соединение; каждая пачка коммитится отдельно. commit=False (только с conn) —
+    транзакцией владеет вызывающий: пачки те же, но без commit / rollback,
+    и всё удалённое коммитится (или откатывается) вместе с остальной его работой.
+    """
+    if not commit and conn is None:
+        raise ValueError("commit=False — только с переданным conn")
+    if archive_table and archive_file:
+        raise ValueError("Архив — либо таблица, либо файл")
+    filters, params = [sql.SQL("TRUE")], []
     if user_id is not None:
-        where_clauses.append('userId = %s')
+        filters.append(sql.SQL('"userId" = %s'))
         params.append(user_id)
     if level_id is not None:
-        where_clauses.append('levelId = %s')
+        filters.append(sql.SQL('"levelId" = %s'))
         params.append(level_id)
+    where = sql.SQL(" AND ").join(filters)
 
-    where_sql = (" WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
+    # верхняя граница следующего диапазона: id batch‑й подходящей строки после last_id
+    next_bound = sql.SQL("""
+        SELECT max(id) FROM (
+            SELECT id FROM "Progress" WHERE id > %s AND {} ORDER BY id LIMIT %s
+        ) AS chunk
+    """).format(where)
+    delete = sql.SQL('DELETE FROM "Progress" AS p WHERE id > %s AND id <= %s AND {}').format(where)
+    if archive_table:
+        delete = sql.SQL("WITH gone AS ({} RETURNING p.*) INSERT INTO {} SELECT * FROM gone").format(
+            delete, sql.Identifier(archive_table))
+    elif archive_file:
+        delete += sql.SQL(" RETURNING row_to_json(p)::text")
 
-    sql = f'DELETE FROM "Progress"{where_sql};'
-
-    cfg = get_db_config()
-    with psycopg2.connect(**cfg) as conn:
+    own = conn is None
+    if own:
+        conn = psycopg2.connect(**get_db_config())
+    out = open(archive_file, "a", encoding="utf-8") if archive_file else None
+    total = 0
+    t0 = time.perf_counter()
+    try:
         with conn.cursor() as cur:
-            cur.execute(sql, params)
-            deleted = cur.rowcount
-        conn.commit()
+            if archive_table:
+                cur.execute(sql.SQL('CREATE TABLE IF NOT EXISTS {} (LIKE "Progress" INCLUDING DEFAULTS)')
+                            .format(sql.Identifier(archive_table)))
+                if commit:
+                    conn.commit()
+            last_id = 0
+            while True:
+                cur.execute(next_bound, [last_id, *params, batch])
+                hi = cur.fetchone()[0]
+                if hi is None:
+                    break
+                cur.execute(delete, [last_id, hi, *params])
+                deleted = cur.rowcount
+                if out:
+                    out.writelines(row[0] + "\n" for row in cur.fetchall())
+                    out.flush()
+                    os.fsync(out.fileno())    # архив на диске раньше, чем удаление закоммичено
+                if commit:
+                    conn.commit()
+                total += deleted
+                last_id = hi
+                if verbose:
+                    rate = total / max(time.perf_counter() - t0, 1e-9)
+                    print(f"… до id={hi}: удалено {total} ({rate:,.0f} строк/с)")
+                if pause:
+                    time.sleep(pause)
+    except Exception:
+        if commit:
+            conn.rollback()
+        raise
+    finally:
+        if out:
+            out.close()
+        if own:
+            conn.close()
+    return total
 
-    return deleted
 
 def main():
-    parser = argparse.ArgumentParser(description="Удалить записи из Progress")
+    parser = argparse.ArgumentParser(description="Удалить записи из Progress пачками")
     parser.add_argument("--user-id",  type=int, help="ID пользователя")
     parser.add_argument("--level-id", type=int, help="ID уровня")
+    parser.add_argument("--all", action="store_true", help="без фильтров — удалить все записи")
+    parser.add_argument("--batch", type=int, default=BATCH, help="строк на транзакцию")
+    parser.add_argument("--pause", type=float, default=0.0, help="пауза между пачками, с")
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument("--archive-table", help="скопировать удаляемое в эту таблицу")
+    archive.add_argument("--archive-file", help="дописать удаляемое в NDJSON‑файл")
     args = parser.parse_args()
 
-    deleted = delete_progress(args.user_id, args.level_id)
-    print(f"Удалено записей: {deleted}")
+    if args.user_id is None and args.level_id is None and not args.all:
+        parser.error("укажите --user-id / --level-id или явно --all")
 
-if __name__ == "__main__":
-    main()
+    t0 = time.perf_counter()
+    try:
+        deleted = delete_progress(args.user_id, args.level_id, args.batch, args.pause,
+                                  args.archive_table, args.archive_file, verbose=True)
+    except psycopg2.Error as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    dt = time.perf_counter() - t0
+    print(f"Удалено записей: {deleted} за {dt:.1f}s ({deleted / max(dt, 1e-9):,.0f} строк/с)")
 
 
-# # удалить ВСЕ записи
-# python clear_progress.py
-#
-# # удалить прогресс конкретного пользователя
-# python clear_progress.py --user-id 42
-#
-# # удалить прогресс конкретного уровня для всех пользователей
-# python clear_progress.py --level-id 7
-#
-# # удалить прогресс уровня 3 пользователя 42
-# python clear_progress.py --user-id 42 --level-id 3
\ No newline at end of file
+if __name__ == "__main__":
+    main()
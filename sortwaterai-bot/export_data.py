@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Выгрузка таблиц Levels / Users / Progress без загрузки таблицы в память.
+
+Строки читаются именованным (серверным) курсором пачками по --fetch и сразу
+пишутся в вывод, так что память не зависит от размера таблицы. Фильтры —
+диапазон id и диапазон "createdAt".
+
+  python export_data.py levels                               # NDJSON в stdout
+  python export_data.py progress --format csv --out progress.csv --since 2025-01-01
+  python export_data.py users --from-id 1000 --to-id 2000 --columns id,telegram_id,coins
+  python export_data.py progress --format parquet --out progress.parquet   # нужен pyarrow
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import psycopg2
+from psycopg2 import sql
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TABLES = {
+    "levels":   "Levels",
+    "users":    "Users",
+    "progress": "Progress",
+}
+FORMATS = ("ndjson", "csv", "parquet")
+FETCH = 5000
+
+# OID типов PostgreSQL → типы колонок parquet (остальное пишется строкой)
+_PG_BOOL, _PG_BYTEA = 16, 17
+_PG_INTS = {20, 21, 23}
+_PG_FLOATS = {700, 701, 1700}
+_PG_TIMESTAMP, _PG_TIMESTAMPTZ, _PG_DATE = 1114, 1184, 1082
+
+
+def get_db_config():
+    return {
+        "dbname":   os.getenv("POSTGRES_DB"),
+        "user":     os.getenv("POSTGRES_USER"),
+        "password": os.getenv("POSTGRES_PASSWORD"),
+        "host":     os.getenv("POSTGRES_HOST", "localhost"),
+        "port":     int(os.getenv("POSTGRES_PORT", 5432)),
+    }
+
+
+def build_query(table: str, columns: Optional[Sequence[str]] = None,
+                from_id: Optional[int] = None, to_id: Optional[int] = None,
+                since: Optional[str] = None, until: Optional[str] = None,
+                limit: Optional[int] = None) -> Tuple[sql.Composed, List]:
+    """
+    SELECT по таблице с фильтрами; границы id включительно, since ≤ "createdAt" < until.
+    """
+    where, params = [], []
+    if from_id is not None:
+        where.append(sql.SQL("id >= %s"))
+        params.append(from_id)
+    if to_id is not None:
+        where.append(sql.SQL("id <= %s"))
+        params.append(to_id)
+    if since is not None:
+        where.append(sql.SQL('"createdAt" >= %s'))
+        params.append(since)
+    if until is not None:
+        where.append(sql.SQL('"createdAt" < %s'))
+        params.append(until)
+
+    cols = sql.SQL(", ").join(map(sql.Identifier, columns)) if columns else sql.SQL("*")
+    query = sql.SQL("SELECT {} FROM {}").format(cols, sql.Identifier(TABLES[table]))
+    if where:
+        query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(where)
+    query += sql.SQL(" ORDER BY id")
+    if limit is not None:
+        query += sql.SQL(" LIMIT %s")
+        params.append(limit)
+    return query, params
+
+
+def stream_rows(conn, query, params, fetch: int = FETCH) -> Iterator[Tuple[List, List[Tuple]]]:
+    """
+    Отдаёт (description, пачка строк) из именованного курсора, пачки не больше fetch.
+    """
+    with conn.cursor(name="export_data") as cur:
+        cur.itersize = fetch
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(fetch)
+            if not rows:
+                break
+            yield cur.description, rows
+
+
+def _plain(value):
+    """
+    Значение для CSV / NDJSON: даты — ISO, bytea — \\x‑hex как в psql.
+    """
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (memoryview, bytes)):
+        return "\\x" + bytes(value).hex()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _text(value):
+    value = _plain(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+class NdjsonWriter:
+    def __init__(self, fp):
+        self.fp = fp
+
+    def write(self, description, rows):
+        names = [d.name for d in description]
+        for row in rows:
+            self.fp.write(json.dumps(dict(zip(names, map(_plain, row))), ensure_ascii=False))
+            self.fp.write("\n")
+
+    def close(self):
+        self.fp.flush()
+
+
+class CsvWriter:
+    def __init__(self, fp):
+        self.fp = fp
+        self.writer = csv.writer(fp)
+        self.header = False
+
+    def write(self, description, rows):
+        if not self.header:
+            self.writer.writerow([d.name for d in description])
+            self.header = True
+        self.writer.writerows([_text(v) for v in row] for row in rows)
+
+    def close(self):
+        self.fp.flush()
+
+
+class ParquetWriter:
+    """
+    Одна row group на пачку; схема — по типам колонок из описания курсора.
+    """
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Для --format parquet нужен pyarrow (pip install pyarrow)") from e
+        self.pa, self.pq = pa, pq
+        self.path = path
+        self.writer = None
+        self.schema = None
+
+    def _type(self, type_code):
+        pa = self.pa
+        if type_code == _PG_BOOL:
+            return pa.bool_()
+        if type_code in _PG_INTS:
+            return pa.int64()
+        if type_code in _PG_FLOATS:
+            return pa.float64()
+        if type_code == _PG_TIMESTAMP:
+            return pa.timestamp("us")
+        if type_code == _PG_TIMESTAMPTZ:
+            return pa.timestamp("us", tz="UTC")
+        if type_code == _PG_DATE:
+            return pa.date32()
+        if type_code == _PG_BYTEA:
+            return pa.binary()
+        return pa.string()
+
+    def write(self, description, rows):
+        pa = self.pa
+        if self.writer is None:
+            self.schema = pa.schema([(d.name, self._type(d.type_code)) for d in description])
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        arrays = []
+        for i, field in enumerate(self.schema):
+            column = [row[i] for row in rows]
+            if pa.types.is_string(field.type):
+                column = [None if v is None else str(_text(v)) for v in column]
+            elif pa.types.is_binary(field.type):
+                column = [None if v is None else bytes(v) for v in column]
+            elif pa.types.is_floating(field.type):
+                column = [None if v is None else float(v) for v in column]
+            arrays.append(pa.array(column, type=field.type))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def export(table: str, fmt: str = "ndjson", out: Optional[str] = None, fetch: int = FETCH,
+           **filters) -> int:
+    """
+    Выгружает таблицу в out (None — stdout; для parquet файл обязателен).
+    Возвращает число строк.
+    """
+    if fmt == "parquet":
+        if not out:
+            raise RuntimeError("Для --format parquet нужен --out")
+        writer = ParquetWriter(out)
+        fp = None
+    else:
+        fp = open(out, "w", newline="", encoding="utf-8") if out else sys.stdout
+        writer = NdjsonWriter(fp) if fmt == "ndjson" else CsvWriter(fp)
+
+    query, params = build_query(table, **filters)
+    total = 0
+    conn = psycopg2.connect(**get_db_config())
+    try:
+        for description, rows in stream_rows(conn, query, params, fetch):
+            writer.write(description, rows)
+            total += len(rows)
+    finally:
+        conn.close()
+        writer.close()
+        if fp is not None and fp is not sys.stdout:
+            fp.close()
+    return total
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Потоковая выгрузка таблиц БД")
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("--format", default="ndjson", choices=FORMATS)
+    parser.add_argument("--out", help="файл (по умолчанию stdout)")
+    parser.add_argument("--columns", help="через запятую, по умолчанию все")
+    parser.add_argument("--from-id", type=int)
+    parser.add_argument("--to-id", type=int)
+    parser.add_argument("--since", help='"createdAt" >= (дата или ISO‑время)')
+    parser.add_argument("--until", help='"createdAt" < (дата или ISO‑время)')
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--fetch", type=int, default=FETCH, help="строк за один FETCH")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    try:
+        total = export(
+            args.table, args.format, args.out, args.fetch,
+            columns=args.columns.split(",") if args.columns else None,
+            from_id=args.from_id, to_id=args.to_id,
+            since=args.since, until=args.until, limit=args.limit,
+        )
+    except (RuntimeError, psycopg2.Error) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ {TABLES[args.table]}: {total} строк → {args.out or 'stdout'} "
+          f"за {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()